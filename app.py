@@ -1,16 +1,27 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash
-import matplotlib.image as mpimg
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, Response, abort, send_file
+from flask import g, before_render_template, template_rendered
 import sqlite3
-import joblib
-import pandas as pd
-
-import matplotlib
-matplotlib.use('Agg')
-
-import matplotlib.pyplot as plt
 import os
+import math
 import datetime
 
+from db import get_db_connection
+from migrations import run_migrations, LATEST_VERSION
+from dataset_store import dataset_store
+from feature_encoder import build_feature_encoder, crop_dict, season_dict, state_dict
+from model_registry import ModelRegistry, MODEL_DIR
+from prediction_cache import PredictionCache, SQLiteCacheBackend
+from inference_engine import MAX_STDERR_RATIO
+from jobs import JobQueue, JobQueueFull, fail_interrupted, DONE
+from exporter import EXPORT_FORMATS, ExportError, check_format, export_query, stream_export, write_export
+from graph_cache import GraphCache
+from pagination import EMPTY_PAGE, page_size
+from repository import get_repository, refresh_repository
+from plotting import crop_counts_png
+from batch_predict import BatchError, read_batch, validate_batch, score_batch, save_batch, stream_results
+from metrics import metrics
+from profiler import profiler, collapse_pstats, MODES as PROFILER_MODES
+
 app = Flask(__name__)
 app.secret_key = "your_secret_key"
 
@@ -30,112 +41,159 @@ def safe_format(value, format_str='%.2f'):
         return str(value) if value else 'N/A'
 
 # ---------- DATABASE CONNECTION ----------
-def get_db_connection():
-    """Safe SQLite connection with timeout + row factory."""
-    conn = sqlite3.connect("database.db", timeout=10, check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    return conn
+# Pooled per-thread connections (WAL, busy_timeout); see db.py
 
 
 # ---------- DATABASE SETUP ----------
 def init_db():
-    with get_db_connection() as conn:
-        c = conn.cursor()
+    """Create or upgrade the schema (see migrations.py)."""
+    conn = get_db_connection()
+    applied = run_migrations(conn)
+    refresh_repository(conn)
+    interrupted = fail_interrupted(conn)
+    if interrupted:
+        print(f"DEBUG: Marked {interrupted} interrupted background job(s) as failed")
+    conn.close()
+    print(f"✅ Database initialized successfully (schema version {LATEST_VERSION}, applied {applied or 'none'}).")
+
+
+# Run at import so every entry point (python app.py, flask run, gunicorn
+# workers) gets the latest schema; run_migrations() is safe to race
+init_db()
+
+
+# ---------- MODEL REGISTRY ----------
+# Artifacts load on the first prediction, not at import. Set CROP_MODEL_PRELOAD=1
+# to load them up front (e.g. in a preforking server's master process, so the
+# workers share the loaded pages copy-on-write). CROP_MODEL_COMPACT=1 serves
+# the pruned engine written by compact_model.py when the model dir has one.
+MODEL_ROOT = os.path.abspath(os.environ.get("CROP_MODEL_DIR", MODEL_DIR))
+
+model_registry = ModelRegistry(
+    model_dir=MODEL_ROOT,
+    encoder_factory=build_feature_encoder,
+    compact=os.environ.get("CROP_MODEL_COMPACT") == "1"
+)
+if os.environ.get("CROP_MODEL_PRELOAD") == "1":
+    model_registry.warm_up()
+
+# ---------- LATENCY BUDGETS ----------
+# Milliseconds allowed for forest evaluation. Both paths use the whole
+# forest unless the request passes budget_ms; budgeted answers may stop
+# early and are saved with the number of trees they used.
+FORM_BUDGET_MS = None
+BATCH_BUDGET_MS = None
+MAX_BUDGET_MS = 60_000
+
+
+def latency_budget(raw, default):
+    """Parse a budget_ms request value, falling back to ``default``."""
+    if raw in (None, ""):
+        return default
+    try:
+        return max(1.0, min(float(raw), MAX_BUDGET_MS))
+    except ValueError:
+        return default
 
-        # ---------- USERS TABLE ----------
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                firstname TEXT NOT NULL,
-                lastname TEXT NOT NULL, 
-                email TEXT UNIQUE NOT NULL,
-                password TEXT NOT NULL
-            )
-        """)
-
-        # ---------- USER SESSIONS TABLE ----------
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS user_sessions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                login_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                logout_time TIMESTAMP,
-                FOREIGN KEY(user_id) REFERENCES users(id)
-            )
-        """)
-
-        # ---------- PREDICTIONS TABLE ----------
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS predictions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER,
-                year INTEGER,
-                crop TEXT,
-                season TEXT,
-                state TEXT,
-                area REAL,
-                production REAL,
-                annual_rainfall REAL,
-                fertilizer REAL,
-                pesticide REAL,
-                yield_value REAL,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY(user_id) REFERENCES users(id)
-            )
-        """)
-        
-        # Add year column if it doesn't exist (for existing databases)
-        try:
-            c.execute("ALTER TABLE predictions ADD COLUMN year INTEGER")
-        except sqlite3.OperationalError:
-            pass  # Column already exists
 
-        conn.commit()
-        print("✅ Database initialized successfully with 'timestamp' and 'year' in predictions table.")
+# ---------- BACKGROUND JOBS ----------
+# Batches above this size are always scored on the job queue
+SYNC_BATCH_MAX_ROWS = 5000
 
+job_queue = JobQueue()
 
-# Run the setup when file executes
-if __name__ == "__main__":
-    init_db()
-
-
-# ---------- LOAD MODEL ----------
-loaded_model = joblib.load('models/random_forest_crop_yield.joblib')
-loaded_pt = joblib.load('models/power_transformer_crop_yield.joblib')
-feature_names = joblib.load('models/crop_yield_feature_names.joblib')
-
-# ---------- DICTIONARIES ----------
-crop_dict = {
-    'Arecanut': 0, 'Arhar/Tur': 1, 'Bajra': 2, 'Banana': 3, 'Barley': 4,
-    'Black pepper': 5, 'Cardamom': 6, 'Cashewnut': 7, 'Castor seed': 8,
-    'Coconut ': 9, 'Coriander': 10, 'Cotton(lint)': 11, 'Cowpea(Lobia)': 12,
-    'Dry chillies': 13, 'Garlic': 14, 'Ginger': 15, 'Gram': 16, 'Groundnut': 17,
-    'Guar seed': 18, 'Horse-gram': 19, 'Jowar': 20, 'Jute': 21, 'Khesari': 22,
-    'Linseed': 23, 'Maize': 24, 'Masoor': 25, 'Mesta': 26, 'Moong(Green Gram)': 27,
-    'Moth': 28, 'Niger seed': 29, 'Oilseeds total': 30, 'Onion': 31,
-    'Other  Rabi pulses': 32, 'Other Cereals': 33, 'Other Kharif pulses': 34,
-    'Other Summer Pulses': 35, 'Peas & beans (Pulses)': 36, 'Potato': 37,
-    'Ragi': 38, 'Rapeseed &Mustard': 39, 'Rice': 40, 'Safflower': 41,
-    'Sannhamp': 42, 'Sesamum': 43, 'Small millets': 44, 'Soyabean': 45,
-    'Sugarcane': 46, 'Sunflower': 47, 'Sweet potato': 48, 'Tapioca': 49,
-    'Tobacco': 50, 'Turmeric': 51, 'Urad': 52, 'Wheat': 53, 'other oilseeds': 54
-}
-
-season_dict = {
-    'Autumn     ': 0, 'Kharif     ': 1, 'Rabi       ': 2,
-    'Summer     ': 3, 'Whole Year ': 4, 'Winter     ': 5
-}
-
-state_dict = {
-    'Andhra Pradesh': 0, 'Arunachal Pradesh': 1, 'Assam': 2, 'Bihar': 3,
-    'Chhattisgarh': 4, 'Delhi': 5, 'Goa': 6, 'Gujarat': 7, 'Haryana': 8,
-    'Himachal Pradesh': 9, 'Jammu and Kashmir': 10, 'Jharkhand': 11,
-    'Karnataka': 12, 'Kerala': 13, 'Madhya Pradesh': 14, 'Maharashtra': 15,
-    'Manipur': 16, 'Meghalaya': 17, 'Mizoram': 18, 'Nagaland': 19, 'Odisha': 20,
-    'Puducherry': 21, 'Punjab': 22, 'Sikkim': 23, 'Tamil Nadu': 24,
-    'Telangana': 25, 'Tripura': 26, 'Uttar Pradesh': 27, 'Uttarakhand': 28,
-    'West Bengal': 29
-}
+# ---------- PREDICTION CACHE ----------
+# CROP_PREDICTION_CACHE=sqlite also shares results between worker processes
+prediction_cache = PredictionCache(
+    backend=SQLiteCacheBackend() if os.environ.get("CROP_PREDICTION_CACHE") == "sqlite" else None
+)
+model_registry.add_listener(prediction_cache.on_model_swapped)
+
+# ---------- FEATURE GRAPH CACHE ----------
+graph_cache = GraphCache()
+dataset_store.add_listener(graph_cache.on_dataset_loaded)
+
+# ---------- REQUEST METRICS ----------
+# Every request is timed per route; stages inside a route are timed with
+# metrics.stage()/metrics.timer(). Scraped from /metrics (Prometheus text).
+# Set CROP_METRICS_TOKEN to require "Authorization: Bearer <token>".
+METRICS_TOKEN = os.environ.get("CROP_METRICS_TOKEN")
+
+
+@app.before_request
+def start_request_metrics():
+    metrics.begin_request(request.endpoint)
+
+
+@app.after_request
+def record_request_metrics(response):
+    metrics.end_request(request.method, response.status_code)
+    return response
+
+
+def _template_started(sender, template, context, **extra):
+    g.template_timer = metrics.timer("template")
+
+
+def _template_finished(sender, template, context, **extra):
+    timer = g.pop("template_timer", None)
+    if timer is not None:
+        timer.stop()
+
+
+before_render_template.connect(_template_started, app)
+template_rendered.connect(_template_finished, app)
+
+
+@app.route("/metrics")
+def metrics_endpoint():
+    if METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {METRICS_TOKEN}":
+        abort(403)
+    return Response(metrics.prometheus(), mimetype="text/plain; version=0.0.4")
+
+# ---------- REQUEST PROFILER ----------
+# Off by default. An admin can profile one request with ?profile=1, or use
+# /admin/profiles to profile the next N requests or a sampled fraction.
+# CROP_PROFILE_FRACTION / CROP_PROFILE_MODE / CROP_PROFILE_ROUTES turn
+# sampling on at startup. Captures land in profiles/ (see profiler.py).
+PROFILER_EXCLUDED = {"static", "metrics_endpoint", "admin_profiles", "admin_profile_download"}
+
+if os.environ.get("CROP_PROFILE_FRACTION"):
+    profiler.enable(
+        fraction=float(os.environ["CROP_PROFILE_FRACTION"]),
+        mode=os.environ.get("CROP_PROFILE_MODE", "sample"),
+        routes=[r for r in os.environ.get("CROP_PROFILE_ROUTES", "").split(",") if r]
+    )
+
+
+@app.before_request
+def start_request_profile():
+    if request.endpoint in PROFILER_EXCLUDED:
+        return
+    # ?profile=1 uses the configured mode; ?profile=cprofile / ?profile=sample pick one
+    requested = request.args.get("profile")
+    mode = None
+    if requested and session.get("admin"):
+        mode = requested if requested in PROFILER_MODES else None
+    elif not profiler.should_profile(request.endpoint):
+        return
+    g.profile_capture = profiler.start(request.endpoint, request.method, request.full_path.rstrip("?"), mode)
+
+
+@app.after_request
+def record_profile_status(response):
+    g.profile_status = response.status_code
+    return response
+
+
+@app.teardown_request
+def finish_request_profile(exc):
+    capture = g.pop("profile_capture", None)
+    if capture is not None:
+        try:
+            profiler.finish(capture, g.pop("profile_status", 500))
+        except OSError as e:
+            print(f"DEBUG: Could not save profile: {e}")
 
 # ---------- ROUTES ----------
 @app.route("/")
@@ -149,14 +207,13 @@ def login():
         email = request.form["email"].strip().lower()
         password = request.form["password"].strip()
 
-        conn = sqlite3.connect("database.db")
-        conn.row_factory = sqlite3.Row
+        conn = get_db_connection()
         c = conn.cursor()
         c.execute("SELECT * FROM users WHERE email = ?", (email,))
         user = c.fetchone()
-        conn.close()
 
         if not user:
+            conn.close()
             flash("No account found. Please sign up first.")
             return redirect(url_for("signup"))
 
@@ -164,8 +221,6 @@ def login():
         if stored_password == password:
             session["user"] = email
             # Record login session
-            conn = get_db_connection()
-            c = conn.cursor()
             c.execute("""
                 INSERT INTO user_sessions (user_id, login_time)
                 VALUES (?, CURRENT_TIMESTAMP)
@@ -175,6 +230,7 @@ def login():
             flash("Login successful!")
             return redirect(url_for("prediction"))
         else:
+            conn.close()
             flash("Incorrect password.")
             return redirect(url_for("login"))
 
@@ -195,7 +251,7 @@ def signup():
             return redirect(url_for("signup"))
 
         try:
-            conn = sqlite3.connect("database.db")
+            conn = get_db_connection()
             c = conn.cursor()
             c.execute(
                 "INSERT INTO users (firstname, lastname, email, password) VALUES (?, ?, ?, ?)",
@@ -206,6 +262,7 @@ def signup():
             flash("Account created successfully. Please log in.")
             return redirect(url_for("login"))
         except sqlite3.IntegrityError:
+            conn.close()
             flash("Email already exists!")
             return redirect(url_for("signup"))
 
@@ -219,35 +276,38 @@ def prediction():
         return redirect(url_for("login"))
 
     prediction_result = None
+    prediction_detail = None
     selected_x = None
     selected_y = None
 
     # ----------------- Get logged-in user info -----------------
     user_email = session["user"]
-    conn = get_db_connection()
-    user_data = conn.execute(
-        "SELECT firstname, lastname, email FROM users WHERE email = ?",
-        (user_email,)
-    ).fetchone()
-    conn.close()
+    with metrics.stage("user_lookup"):
+        conn = get_db_connection()
+        user_data = conn.execute(
+            "SELECT firstname, lastname, email FROM users WHERE email = ?",
+            (user_email,)
+        ).fetchone()
+        conn.close()
 
     if user_data:
         user_name = f"{user_data['firstname']} {user_data['lastname']}"
     else:
         user_name = "Unknown User"
 
-    # ----------------- Load dataset -----------------
-    df = pd.read_csv("C:\\Users\\Sinan\\Desktop\\Projects\\Indian_crop_production_prediction1\\crop_yield.csv")
-    df.columns = df.columns.str.strip()
+    # ----------------- Load dataset (shared, read-only) -----------------
+    with metrics.stage("dataset_load"):
+        dataset = dataset_store.snapshot()
 
-    categorical_cols = df.select_dtypes(include=['object']).columns.tolist()
-    numerical_cols = df.select_dtypes(include=['int64', 'float64']).columns.tolist()
+    categorical_cols = dataset.categorical_cols
+    numerical_cols = dataset.numerical_cols
 
     # ----------------- POST request handling -----------------
     if request.method == "POST":
         # ----- Prediction -----
         if "predict" in request.form:
             try:
+                validation = metrics.timer("validation")
                 # Validate year first
                 try:
                     year = int(request.form.get('year', 0))
@@ -338,40 +398,44 @@ def prediction():
                 crop = request.form['crop']
                 season = request.form['season']
                 state = request.form['state']
-
-                # Prepare input data
-                input_data = pd.DataFrame({
-                    'Area': [area],
-                    'Production': [production],
-                    'Annual_Rainfall': [annual_rainfall],
-                    'Fertilizer': [fertilizer],
-                    'Pesticide': [pesticide],
-                    'Crop': [crop],
-                    'Season': [season],
-                    'State': [state]
-                })
-
-                # One-hot encode to match training features
-                input_data = pd.get_dummies(input_data, columns=['Crop','Season','State'], drop_first=True)
-                for col in feature_names:
-                    if col not in input_data.columns:
-                        input_data[col] = 0
-                input_data = input_data[feature_names]
-
-                # Predict
-                x_test_transformed = loaded_pt.transform(input_data)
-                result = loaded_model.predict(x_test_transformed)
-                prediction_result = result[0]
+                validation.stop()
+
+                # One-hot encode to match training features, then predict within
+                # the latency budget (repeated inputs come from the prediction cache;
+                # the engine records its transform and forest stages)
+                with metrics.stage("model_load"):
+                    bundle = model_registry.current()
+                with metrics.stage("encode"):
+                    input_row = bundle.encoder.encode(area, production, annual_rainfall, fertilizer,
+                                                      pesticide, crop, season, state)
+                budget_ms = latency_budget(request.form.get("budget_ms"), FORM_BUDGET_MS)
+                with metrics.stage("predict"):
+                    bounded = prediction_cache.predict(
+                        bundle, input_row, budget_ms=budget_ms,
+                        # The early-exit rule is part of the opt-in budget
+                        max_stderr_ratio=MAX_STDERR_RATIO if budget_ms is not None else 0.0
+                    )
+                prediction_result = float(bounded.mean[0])
+                trees_used = int(bounded.trees_used[0])
+                trees_used = trees_used if trees_used < bounded.n_trees else None
+                if math.isfinite(bounded.stderr[0]):
+                    prediction_detail = {
+                        "ci_low": float(bounded.ci_low[0]),
+                        "ci_high": float(bounded.ci_high[0]),
+                        "trees_used": int(bounded.trees_used[0]),
+                        "n_trees": bounded.n_trees,
+                    }
 
                 # Save prediction to DB
+                db_insert = metrics.timer("db_insert")
                 conn = get_db_connection()
                 c = conn.cursor()
                 try:
                     c.execute("""
                         INSERT INTO predictions 
-                        (user_id, year, crop, season, state, area, production, annual_rainfall, fertilizer, pesticide, yield_value)
-                        VALUES ((SELECT id FROM users WHERE email = ?), ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """, (user_email, year, crop, season, state, area, production, annual_rainfall, fertilizer, pesticide, prediction_result))
+                        (user_id, year, crop, season, state, area, production, annual_rainfall, fertilizer, pesticide, yield_value, trees_used)
+                        VALUES ((SELECT id FROM users WHERE email = ?), ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """, (user_email, year, crop, season, state, area, production, annual_rainfall, fertilizer, pesticide, prediction_result, trees_used))
                     conn.commit()
                     print(f"DEBUG: Prediction saved successfully for user {user_email}")
                 except sqlite3.OperationalError as db_error:
@@ -396,6 +460,7 @@ def prediction():
                     flash(f"Error saving prediction: {e}", "danger")
                 finally:
                     conn.close()
+                    db_insert.stop()
 
             except Exception as e:
                 flash(f"Prediction error: {e}", "danger")
@@ -405,24 +470,10 @@ def prediction():
             selected_x = request.form.get("x_axis")
             selected_y = request.form.get("y_axis")
 
-            if selected_x in df.columns and selected_y in df.columns:
-                plt.figure(figsize=(10, 6))
-                if os.path.exists("static/crop_bg.png"):
-                    img = mpimg.imread("static/crop_bg.png")
-                    plt.imshow(img, extent=[-0.5, len(df[selected_x])-0.5,
-                                            df[selected_y].min()*0.9,
-                                            df[selected_y].max()*1.1],
-                               aspect='auto', alpha=0.2)
-
-                grouped_df = df.groupby(selected_x)[selected_y].mean().reset_index()
-                plt.bar(grouped_df[selected_x], grouped_df[selected_y], color='green')
-                plt.xticks(rotation=45, ha='right')
-                plt.xlabel(selected_x)
-                plt.ylabel(selected_y)
-                plt.title(f"{selected_y} vs {selected_x}")
-                plt.tight_layout()
-                plt.savefig("static/feature_plot.png")
-                plt.close()
+            # Aggregates are precomputed; the image itself is served by feature_graph()
+            if not graph_cache.has_pair(selected_x, selected_y):
+                flash("Please choose a categorical X-axis and a numerical Y-axis.", "danger")
+                selected_x = selected_y = None
 
     # ----------------- Render template -----------------
     return render_template(
@@ -431,6 +482,7 @@ def prediction():
         season_dict=season_dict,
         state_dict=state_dict,
         prediction_result=prediction_result,
+        prediction_detail=prediction_detail,
         x_options=categorical_cols,
         y_options=numerical_cols,
         selected_x=selected_x,
@@ -439,6 +491,131 @@ def prediction():
         email=user_email    # <-- user email for template
     )
 
+# ---------- FEATURE GRAPH IMAGE ----------
+@app.route("/prediction/graph.png")
+def feature_graph():
+    if "user" not in session:
+        return redirect(url_for("login"))
+
+    with metrics.stage("dataset_load"):
+        dataset_store.snapshot()  # reloads and invalidates the cache if the CSV changed
+    try:
+        with metrics.stage("graph_render"):
+            png = graph_cache.png(request.args.get("x"), request.args.get("y"))
+    except KeyError:
+        abort(404)
+    return Response(png, mimetype="image/png")
+
+# ---------- BATCH PREDICTION API ----------
+@app.route("/api/predict/batch", methods=["POST"])
+def predict_batch():
+    """Score many rows (JSON list or CSV upload) in one call and stream the results."""
+    if "user" not in session:
+        return jsonify({"error": "Please log in first."}), 401
+
+    try:
+        frame, fmt = read_batch(request)
+        frame = validate_batch(frame, crop_dict, season_dict, state_dict)
+    except BatchError as e:
+        return jsonify({"error": str(e), "rows": e.errors}), 400
+    except ValueError as e:
+        return jsonify({"error": f"Could not parse batch: {e}"}), 400
+
+    fmt = request.args.get("format", fmt)
+    if fmt not in ("csv", "json"):
+        return jsonify({"error": "format must be 'csv' or 'json'."}), 400
+
+    budget_ms = latency_budget(request.args.get("budget_ms"), BATCH_BUDGET_MS)
+    conn = get_db_connection()
+    user = conn.execute("SELECT id FROM users WHERE email = ?", (session["user"],)).fetchone()
+    conn.close()
+    params = {"format": fmt, "budget_ms": budget_ms, "user_id": user["id"] if user else None}
+
+    # Large batches (or ?async=1) are scored on the job queue; poll the status URL
+    if request.args.get("async") == "1" or len(frame) > SYNC_BATCH_MAX_ROWS:
+        try:
+            job_id = job_queue.submit("batch_predict", params, payload=frame, owner=session["user"])
+        except JobQueueFull as e:
+            return jsonify({"error": str(e)}), 429
+        return job_accepted(job_id)
+
+    try:
+        yields, extra = score_batch_job(params, frame)
+    except sqlite3.Error as e:
+        print(f"DEBUG: Error saving batch predictions: {e}")
+        return jsonify({"error": f"Error saving predictions: {e}"}), 500
+    mimetype = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    return Response(stream_results(frame, yields, fmt, extra), mimetype=mimetype)
+
+
+def score_batch_job(params, frame):
+    """Score and save a validated batch; returns ``(yields, extra columns)``."""
+    bundle = model_registry.current()
+    yields, extra = score_batch(frame, bundle.encoder, bundle.engine, budget_ms=params["budget_ms"])
+    save_batch(get_db_connection(), params["user_id"], frame, yields,
+               extra.get("trees_used"), bundle.engine.n_trees)
+    print(f"DEBUG: Batch of {len(frame)} predictions saved for user {params['user_id']}")
+    return yields, extra
+
+
+def run_batch_job(params, frame, out):
+    yields, extra = score_batch_job(params, frame)
+    for chunk in stream_results(frame, yields, params["format"], extra):
+        out.write(chunk.encode("utf-8"))
+    return "text/csv" if params["format"] == "csv" else "application/x-ndjson"
+
+
+def run_crop_graph_job(params, payload, out):
+    crop_data = get_repository().crop_counts(get_db_connection(), limit=params.get("limit", 10))
+    if not crop_data:
+        raise ValueError("No predictions recorded yet.")
+    out.write(crop_counts_png([row[0] for row in crop_data], [row[1] for row in crop_data]))
+    return "image/png"
+
+
+job_queue.register("batch_predict", run_batch_job, lane="cpu")
+job_queue.register("crop_graph", run_crop_graph_job, lane="cpu")
+
+# ---------- JOB STATUS API ----------
+def job_accepted(job_id):
+    """202 response pointing at the status and result URLs of a queued job."""
+    response = jsonify({
+        "job_id": job_id,
+        "status": "queued",
+        "status_url": url_for("job_status", job_id=job_id),
+        "result_url": url_for("job_result", job_id=job_id),
+    })
+    response.status_code = 202
+    response.headers["Location"] = url_for("job_status", job_id=job_id)
+    return response
+
+
+def visible_job(job_id):
+    """The job if the current user (or any admin) may see it, else abort(404)."""
+    job = job_queue.status(job_id)
+    if job is None:
+        abort(404)
+    if session.get("admin") or (job["owner"] and job["owner"] == session.get("user")):
+        return job
+    abort(404)
+
+
+@app.route("/api/jobs/<job_id>")
+def job_status(job_id):
+    job = visible_job(job_id)
+    job.pop("result_path")
+    if job["status"] == DONE:
+        job["result_url"] = url_for("job_result", job_id=job_id)
+    return jsonify(job)
+
+
+@app.route("/api/jobs/<job_id>/result")
+def job_result(job_id):
+    job = visible_job(job_id)
+    if job["status"] != DONE:
+        return jsonify({"error": f"Job is {job['status']}.", "status": job["status"]}), 409
+    return send_file(os.path.abspath(job["result_path"]), mimetype=job["result_mimetype"])
+
 # About Page----------------------------
 @app.route("/about")
 def about():
@@ -464,6 +641,16 @@ def admin_login():
     return render_template("admin_login.html")
 
 # ---------- ADMIN DASHBOARD ----------
+ADMIN_FILTERS = ("crop", "state", "season", "user")
+
+
+def admin_page_url(**overrides):
+    """URL of the admin dashboard with the current filters/cursors, updated."""
+    args = request.args.to_dict()
+    args.update(overrides)
+    return url_for("admin", **{key: value for key, value in args.items() if value})
+
+
 @app.route("/admin")
 def admin():
     # Check if admin is authenticated
@@ -471,174 +658,224 @@ def admin():
         flash("Please login as admin to access this page.", "error")
         return redirect(url_for("admin_login"))
     
+    filters = {key: request.args.get(key, "").strip() for key in ADMIN_FILTERS}
+    filters["user"] = filters["user"].lower()
+    user_filter = {"user": filters["user"]}
+    limit = page_size(request.args.get("limit"))
+    repo = get_repository()
+
     try:
         conn = get_db_connection()
         
         # Get only users who have made predictions (entered prediction dashboard)
+        users_page = EMPTY_PAGE
+        users_total = 0
         try:
-            users_data = conn.execute("""
-                SELECT 
-                    u.id,
-                    u.firstname,
-                    u.lastname,
-                    u.email,
-                    COUNT(DISTINCT us.id) as visit_count,
-                    MAX(us.login_time) as last_login,
-                    COUNT(DISTINCT p.id) as prediction_count
-                FROM users u
-                INNER JOIN predictions p ON u.id = p.user_id
-                LEFT JOIN user_sessions us ON u.id = us.user_id
-                GROUP BY u.id, u.firstname, u.lastname, u.email
-                ORDER BY u.id
-            """).fetchall()
+            with metrics.stage("users_query"):
+                users_page = repo.users_with_predictions.page(
+                    conn, user_filter, after=request.args.get("users_after"),
+                    before=request.args.get("users_before"), limit=limit)
+                users_total = repo.users_with_predictions.count(conn, user_filter)
         except Exception as e:
             print(f"Error fetching users: {e}")
-            users_data = []
         
-        # Get all predictions with user details
-        predictions_data = []
+        # Get one page of predictions with user details
+        predictions_page = EMPTY_PAGE
+        predictions_total = 0
         try:
-            # First check if predictions table exists and has data
-            c = conn.cursor()
-            c.execute("SELECT COUNT(*) FROM predictions")
-            prediction_count = c.fetchone()[0]
-            print(f"DEBUG: Total predictions in database: {prediction_count}")
-            
-            if prediction_count > 0:
-                # Check which columns exist
-                c.execute("PRAGMA table_info(predictions)")
-                columns_info = c.fetchall()
-                column_names = [col[1] for col in columns_info]
-                print(f"DEBUG: Available columns: {column_names}")
-                
-                has_year = "year" in column_names
-                has_timestamp = "timestamp" in column_names
-                
-                # Build query based on available columns
-                select_fields = [
-                    "p.id",
-                    "u.firstname || ' ' || u.lastname as user_name",
-                    "u.email"
-                ]
-                
-                if has_year:
-                    select_fields.append("p.year")
-                else:
-                    select_fields.append("NULL as year")
-                
-                select_fields.extend([
-                    "p.crop", "p.season", "p.state", "p.area", "p.production",
-                    "p.annual_rainfall", "p.fertilizer", "p.pesticide", "p.yield_value"
-                ])
-                
-                if has_timestamp:
-                    select_fields.append("p.timestamp")
-                else:
-                    select_fields.append("NULL as timestamp")
-                
-                # Build the query
-                query = f"""
-                    SELECT {', '.join(select_fields)}
-                    FROM predictions p
-                    JOIN users u ON p.user_id = u.id
-                """
-                
-                # Add ORDER BY
-                if has_timestamp:
-                    query += " ORDER BY p.timestamp DESC"
-                else:
-                    query += " ORDER BY p.id DESC"
-                
-                print(f"DEBUG: Executing query: {query[:100]}...")
-                predictions_data = conn.execute(query).fetchall()
-                print(f"DEBUG: Successfully fetched {len(predictions_data)} predictions")
-            else:
-                print("DEBUG: No predictions found in database")
-                
+            with metrics.stage("predictions_query"):
+                predictions_page = repo.predictions.page(
+                    conn, filters, after=request.args.get("pred_after"),
+                    before=request.args.get("pred_before"), limit=limit)
+                predictions_total = repo.count_predictions(conn, filters)
+            print(f"DEBUG: Fetched {len(predictions_page.rows)} of {predictions_total} predictions")
         except Exception as e:
             print(f"Error fetching predictions: {e}")
             import traceback
             traceback.print_exc()
-            predictions_data = []
         
-        # Get all user sessions
+        # Get one page of user sessions
+        sessions_page = EMPTY_PAGE
+        sessions_total = 0
         try:
-            sessions_data = conn.execute("""
-                SELECT 
-                    us.id,
-                    u.firstname || ' ' || u.lastname as user_name,
-                    u.email,
-                    us.login_time,
-                    us.logout_time,
-                    CASE 
-                        WHEN us.logout_time IS NULL THEN 'Active'
-                        ELSE 'Completed'
-                    END as status
-                FROM user_sessions us
-                JOIN users u ON us.user_id = u.id
-                ORDER BY us.login_time DESC
-            """).fetchall()
+            with metrics.stage("sessions_query"):
+                sessions_page = repo.sessions.page(
+                    conn, user_filter, after=request.args.get("sess_after"),
+                    before=request.args.get("sess_before"), limit=limit)
+                sessions_total = repo.count_sessions(conn, user_filter)
         except Exception as e:
             print(f"Error fetching sessions: {e}")
-            sessions_data = []
         
-        # Generate crop prediction graph
-        crop_graph_path = None
-        try:
-            if prediction_count > 0:
-                # Get crop prediction counts
-                crop_counts_query = """
-                    SELECT crop, COUNT(*) as count
-                    FROM predictions
-                    GROUP BY crop
-                    ORDER BY count DESC
-                    LIMIT 10
-                """
-                crop_data = conn.execute(crop_counts_query).fetchall()
-                
-                if crop_data:
-                    crops = [row[0] for row in crop_data]
-                    counts = [row[1] for row in crop_data]
-                    
-                    # Create the graph
-                    plt.figure(figsize=(12, 6))
-                    colors = plt.cm.Set3(range(len(crops)))
-                    bars = plt.barh(crops, counts, color=colors)
-                    
-                    # Add value labels on bars
-                    for i, (crop, count) in enumerate(zip(crops, counts)):
-                        plt.text(count, i, f' {count}', va='center', fontweight='bold')
-                    
-                    plt.xlabel('Number of Predictions', fontsize=12, fontweight='bold')
-                    plt.ylabel('Crop', fontsize=12, fontweight='bold')
-                    plt.title('Most Predicted Crops (Top 10)', fontsize=14, fontweight='bold', pad=20)
-                    plt.gca().invert_yaxis()  # Show highest at top
-                    plt.tight_layout()
-                    
-                    # Save the graph
-                    crop_graph_path = "most_predicted_crops.png"
-                    graph_full_path = os.path.join("static", crop_graph_path)
-                    plt.savefig(graph_full_path, dpi=100, bbox_inches='tight')
-                    plt.close()
-                    print(f"DEBUG: Crop prediction graph saved to {graph_full_path}")
-        except Exception as e:
-            print(f"Error generating crop graph: {e}")
-            import traceback
-            traceback.print_exc()
+        # Crop prediction graph is rendered in memory by admin_crop_graph()
+        crop_graph_path = url_for("admin_crop_graph") if repo.has_predictions(conn) else None
         
         conn.close()
         
         return render_template(
             "admin.html",
-            users=users_data or [],
-            predictions=predictions_data or [],
-            sessions=sessions_data or [],
+            users=users_page.rows,
+            predictions=predictions_page.rows,
+            sessions=sessions_page.rows,
+            users_page=users_page,
+            predictions_page=predictions_page,
+            sessions_page=sessions_page,
+            users_total=users_total,
+            predictions_total=predictions_total,
+            sessions_total=sessions_total,
+            filters=filters,
+            crop_options=crop_dict.keys(),
+            season_options=season_dict.keys(),
+            state_options=state_dict.keys(),
+            page_url=admin_page_url,
             crop_graph_path=crop_graph_path
         )
     except Exception as e:
         flash(f"Error loading admin dashboard: {str(e)}", "danger")
         return redirect(url_for("prediction"))
 
+# ---------- ADMIN CROP GRAPH ----------
+@app.route("/admin/crop_graph.png")
+def admin_crop_graph():
+    if "admin" not in session or not session.get("admin"):
+        abort(403)
+
+    with metrics.stage("crop_counts_query"):
+        conn = get_db_connection()
+        crop_data = get_repository().crop_counts(conn, limit=10)
+        conn.close()
+
+    if not crop_data:
+        abort(404)
+    crops = [row[0] for row in crop_data]
+    counts = [row[1] for row in crop_data]
+    with metrics.stage("matplotlib_render"):
+        png = crop_counts_png(crops, counts)
+    return Response(png, mimetype="image/png")
+
+# ---------- ADMIN EXPORTS ----------
+def run_export_job(params, payload, out):
+    write_export(out, get_repository(), params["dataset"], params["format"], params["filters"],
+                 params["from"], params["to"])
+    return EXPORT_FORMATS[params["format"]]
+
+
+job_queue.register("export", run_export_job, lane="io")
+
+
+@app.route("/admin/export")
+def admin_export():
+    """Stream predictions, sessions or users-with-stats as CSV or Parquet."""
+    if "admin" not in session or not session.get("admin"):
+        abort(403)
+
+    dataset = request.args.get("dataset", "predictions")
+    fmt = request.args.get("format", "csv")
+    filters = {key: request.args.get(key, "").strip() for key in ADMIN_FILTERS}
+    filters["user"] = filters["user"].lower()
+    date_from, date_to = request.args.get("from"), request.args.get("to")
+
+    try:
+        if request.args.get("async") == "1":
+            check_format(fmt)
+            export_query(get_repository(), dataset, filters, date_from, date_to)
+            params = {"dataset": dataset, "format": fmt, "filters": filters, "from": date_from, "to": date_to}
+            return job_accepted(job_queue.submit("export", params, owner=session.get("admin_email")))
+        stream = stream_export(get_repository(), dataset, fmt, filters, date_from, date_to)
+    except ExportError as e:
+        return jsonify({"error": str(e)}), 400
+    except JobQueueFull as e:
+        return jsonify({"error": str(e)}), 429
+
+    print(f"DEBUG: Streaming {dataset} export as {fmt}")
+    return Response(stream, mimetype=EXPORT_FORMATS[fmt],
+                    headers={"Content-Disposition": f"attachment; filename={dataset}.{fmt}"})
+
+# ---------- ADMIN BACKGROUND JOBS ----------
+@app.route("/admin/jobs/crop_graph", methods=["POST"])
+def admin_crop_graph_job():
+    """Render the crop statistics graph on the job queue."""
+    if "admin" not in session or not session.get("admin"):
+        abort(403)
+    try:
+        job_id = job_queue.submit("crop_graph", {"limit": 10}, owner=session.get("admin_email"))
+    except JobQueueFull as e:
+        return jsonify({"error": str(e)}), 429
+    return job_accepted(job_id)
+
+# ---------- ADMIN MODEL REGISTRY ----------
+@app.route("/admin/models")
+def admin_models():
+    """Active model version and per-artifact load time / resident size."""
+    if "admin" not in session or not session.get("admin"):
+        abort(403)
+    info = model_registry.info()
+    info["prediction_cache"] = prediction_cache.stats()
+    info["latency"] = metrics.summary()
+    return jsonify(info)
+
+
+@app.route("/admin/models/reload", methods=["POST"])
+def admin_models_reload():
+    """Load a model version (default: the current model dir) and swap it in."""
+    if "admin" not in session or not session.get("admin"):
+        abort(403)
+
+    model_dir = request.form.get("model_dir") or None
+    if model_dir is not None:
+        # Only versions stored under the model root; joblib files are pickles
+        model_dir = os.path.abspath(os.path.join(MODEL_ROOT, model_dir))
+        if os.path.commonpath([MODEL_ROOT, model_dir]) != MODEL_ROOT:
+            return jsonify({"error": "model_dir must be inside the model directory."}), 400
+    try:
+        bundle = model_registry.swap(model_dir)
+    except (OSError, ValueError) as e:
+        print(f"DEBUG: Model reload failed: {e}")
+        return jsonify({"error": f"Could not load model: {e}"}), 400
+    print(f"DEBUG: Model swapped to version {bundle.version}")
+    return jsonify(model_registry.info())
+
+# ---------- ADMIN PROFILER ----------
+@app.route("/admin/profiles", methods=["GET", "POST"])
+def admin_profiles():
+    """Enable the profiler and list captured requests, slowest first."""
+    if "admin" not in session or not session.get("admin"):
+        flash("Please login as admin to access this page.", "error")
+        return redirect(url_for("admin_login"))
+
+    if request.method == "POST":
+        try:
+            profiler.enable(
+                count=int(request.form.get("count") or 0),
+                fraction=float(request.form.get("fraction") or 0),
+                mode=request.form.get("mode", "sample"),
+                routes=[r.strip() for r in request.form.get("routes", "").split(",") if r.strip()]
+            )
+        except ValueError as e:
+            flash(f"Invalid profiler settings: {e}", "error")
+        else:
+            flash("Profiler settings updated.", "success")
+        return redirect(url_for("admin_profiles"))
+
+    profiles = profiler.list()
+    for profile in profiles:
+        profile["created_at"] = datetime.datetime.fromtimestamp(profile["created"]).strftime("%Y-%m-%d %H:%M:%S")
+    return render_template("profiles.html", profiles=profiles, settings=profiler.settings(), modes=PROFILER_MODES)
+
+
+@app.route("/admin/profiles/<capture_id>/download")
+def admin_profile_download(capture_id):
+    """Collapsed stacks (default) or the raw capture file (?format=raw)."""
+    if "admin" not in session or not session.get("admin"):
+        abort(403)
+    found = profiler.get(capture_id)
+    if found is None:
+        abort(404)
+    meta, path = found
+    if request.args.get("format") == "raw" or path.endswith(".collapsed"):
+        return send_file(path, as_attachment=True, download_name=os.path.basename(path))
+    return Response(collapse_pstats(path), mimetype="text/plain",
+                    headers={"Content-Disposition": f"attachment; filename={meta['id']}.collapsed"})
+
 # ---------- LOGOUT ----------
 @app.route("/logout")
 def logout():
@@ -0,0 +1,175 @@
+import csv
+import io
+import json
+
+import numpy as np
+import pandas as pd
+
+from feature_encoder import NUMERIC_FIELDS, CATEGORY_FIELDS
+
+# Columns every uploaded row must provide (same names as the /prediction form)
+BATCH_COLUMNS = ["year"] + CATEGORY_FIELDS + NUMERIC_FIELDS
+
+# Output columns streamed back to the client
+RESULT_COLUMNS = BATCH_COLUMNS + ["yield_value"]
+
+# Extra output columns when the batch is scored in bounded-latency mode
+BOUNDED_COLUMNS = ["yield_ci_low", "yield_ci_high", "trees_used"]
+
+MAX_BATCH_ROWS = 100_000
+MIN_YEAR = 1997
+MAX_YEAR = 2030
+
+# Rows serialized per chunk of the streamed response
+STREAM_CHUNK_ROWS = 1000
+
+
+class BatchError(ValueError):
+    """Raised when an uploaded batch cannot be scored."""
+
+    def __init__(self, message, errors=None):
+        super().__init__(message)
+        self.errors = errors or []
+
+
+def read_batch(request):
+    """Parse a batch upload (JSON rows, CSV file or CSV body) into a DataFrame.
+
+    Returns ``(frame, fmt)`` where ``fmt`` is ``"json"`` or ``"csv"`` and is
+    used as the default response format.
+    """
+    if "file" in request.files:
+        upload = request.files["file"]
+        frame = pd.read_csv(upload.stream, dtype={c: str for c in CATEGORY_FIELDS})
+        fmt = "csv"
+    elif request.mimetype == "text/csv":
+        frame = pd.read_csv(io.BytesIO(request.get_data()), dtype={c: str for c in CATEGORY_FIELDS})
+        fmt = "csv"
+    elif request.is_json:
+        payload = request.get_json(silent=True)
+        rows = payload.get("rows") if isinstance(payload, dict) else payload
+        if not isinstance(rows, list):
+            raise BatchError("JSON body must be a list of rows or {\"rows\": [...]}.")
+        bad = [i for i, row in enumerate(rows) if not isinstance(row, dict)]
+        if bad:
+            raise BatchError(f"{len(bad)} invalid row(s) in batch.",
+                             [{"row": i, "error": "Row must be a JSON object."} for i in bad[:50]])
+        frame = pd.DataFrame.from_records(rows)
+        fmt = "json"
+    else:
+        raise BatchError("Upload a CSV file, a text/csv body or a JSON list of rows.")
+
+    frame.columns = [str(c).strip().lower() for c in frame.columns]
+    return frame, fmt
+
+
+def validate_batch(frame, crop_dict, season_dict, state_dict):
+    """Coerce column types and apply the same rules as the /prediction form.
+
+    Returns a clean frame with ``BATCH_COLUMNS`` or raises BatchError with a
+    list of per-row problems.
+    """
+    missing = [c for c in BATCH_COLUMNS if c not in frame.columns]
+    if missing:
+        raise BatchError(f"Missing columns: {', '.join(missing)}")
+    if len(frame) == 0:
+        raise BatchError("Batch contains no rows.")
+    if len(frame) > MAX_BATCH_ROWS:
+        raise BatchError(f"Batch too large: {len(frame)} rows (max {MAX_BATCH_ROWS}).")
+
+    frame = frame[BATCH_COLUMNS].copy()
+    errors = []
+
+    def report(mask, message):
+        for index in np.flatnonzero(mask.to_numpy())[:50]:
+            errors.append({"row": int(index), "error": message})
+
+    for col in ["year"] + NUMERIC_FIELDS:
+        frame[col] = pd.to_numeric(frame[col], errors="coerce")
+    # to_numeric accepts "inf"; NaN (unparseable) and +/-inf are both rejected here
+    finite = pd.Series(np.isfinite(frame[["year"] + NUMERIC_FIELDS].to_numpy(dtype=np.float64)).all(axis=1),
+                       index=frame.index)
+    report(~finite, "All numeric fields must be valid, finite numbers.")
+    year = frame["year"].where(finite)
+    report((year < MIN_YEAR) | (year > MAX_YEAR),
+           f"Year must be between {MIN_YEAR} and {MAX_YEAR}.")
+    report(finite & (year % 1 != 0), "Year must be a whole number.")
+    report((frame[NUMERIC_FIELDS] < 0).any(axis=1),
+           "Numeric fields cannot be negative.")
+
+    for col, known in (("crop", crop_dict), ("season", season_dict), ("state", state_dict)):
+        frame[col] = frame[col].astype(str)
+        report(~frame[col].isin(list(known)), f"Unknown {col}.")
+
+    if errors:
+        errors.sort(key=lambda e: e["row"])
+        raise BatchError(f"{len(errors)} invalid row(s) in batch.", errors)
+
+    frame["year"] = frame["year"].astype(np.int64)
+    return frame
+
+
+def score_batch(frame, encoder, engine, budget_ms=None):
+    """Encode all rows at once and score them with one engine call.
+
+    Returns ``(yields, extra)``. With a latency budget the forest is
+    evaluated in bounded mode and ``extra`` maps BOUNDED_COLUMNS to the
+    per-row confidence interval and number of trees used.
+    """
+    matrix = encoder.encode_batch(frame)
+    if budget_ms is None:
+        return engine.predict(matrix), {}
+    bounded = engine.predict_bounded(matrix, budget_ms=budget_ms)
+    return bounded.mean, dict(zip(BOUNDED_COLUMNS, (bounded.ci_low, bounded.ci_high, bounded.trees_used)))
+
+
+def save_batch(conn, user_id, frame, yields, trees_used=None, n_trees=None):
+    """Insert every scored row into predictions in a single transaction.
+
+    ``trees_used`` (bounded mode) is stored for rows that stopped before
+    ``n_trees``; whole-forest rows store NULL.
+    """
+    if trees_used is None:
+        partial = [None] * len(frame)
+    else:
+        partial = [int(t) if t < n_trees else None for t in trees_used.tolist()]
+    records = zip(
+        [user_id] * len(frame),
+        frame["year"].tolist(),
+        frame["crop"].tolist(),
+        frame["season"].tolist(),
+        frame["state"].tolist(),
+        *(frame[col].tolist() for col in NUMERIC_FIELDS),
+        yields.tolist(),
+        partial
+    )
+    with conn:
+        conn.executemany("""
+            INSERT INTO predictions
+            (user_id, year, crop, season, state, area, production, annual_rainfall, fertilizer, pesticide, yield_value,
+             trees_used)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, records)
+
+
+def stream_results(frame, yields, fmt, extra=None):
+    """Yield the scored rows as CSV or JSON-lines text, chunk by chunk."""
+    extra = extra or {}
+    names = RESULT_COLUMNS + list(extra)
+    columns = ([frame[col].tolist() for col in BATCH_COLUMNS] + [yields.tolist()]
+               + [values.tolist() for values in extra.values()])
+
+    if fmt == "csv":
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(names)
+        yield buffer.getvalue()
+
+    for start in range(0, len(frame), STREAM_CHUNK_ROWS):
+        stop = start + STREAM_CHUNK_ROWS
+        rows = zip(*(values[start:stop] for values in columns))
+        if fmt == "csv":
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(rows)
+            yield buffer.getvalue()
+        else:
+            yield "".join(json.dumps(dict(zip(names, row))) + "\n" for row in rows)
@@ -0,0 +1,116 @@
+"""Benchmark: cold load of the crop dataset from the CSV vs the columnar snapshot.
+
+Each measurement runs in a fresh interpreter (imports are done before the
+clock starts) and reports
+  * load ms:   CSV parse, or snapshot manifest check + memory-mapped columns
+  * first ms:  load plus a first aggregation touching every column page
+  * RSS MB:    resident memory growth over the load + aggregation
+  * peak MB:   peak RSS of the process
+The CSV can be repeated ``--scale`` times to see how both paths grow.
+
+Run from the repository root:
+    python benchmarks/bench_dataset_snapshot.py --runs 7 --scale 10
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def _resident_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+
+
+def child(mode, csv_path, snapshot_dir):
+    """Load once and print the measurements as JSON (runs in a subprocess)."""
+    import dataset_store
+    import snapshot
+
+    rss_before = _resident_mb()
+    start = time.perf_counter()
+    if mode == "csv":
+        df = dataset_store._parse_csv(csv_path)
+    else:
+        df = snapshot.read_snapshot(csv_path, snapshot_dir)
+        if df is None:
+            raise SystemExit("snapshot is missing or stale")
+    loaded = time.perf_counter()
+    df.groupby("Crop", observed=True)[["Area", "Production", "Yield"]].mean()
+    df[["Annual_Rainfall", "Fertilizer", "Pesticide", "Crop_Year"]].sum()
+    first = time.perf_counter()
+    print(json.dumps({
+        "rows": len(df),
+        "load_ms": (loaded - start) * 1000,
+        "first_ms": (first - start) * 1000,
+        "rss_mb": _resident_mb() - rss_before,
+        "peak_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }))
+
+
+def measure(mode, csv_path, snapshot_dir, runs):
+    results = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", mode,
+             "--csv", csv_path, "--snapshot-dir", snapshot_dir],
+            check=True, capture_output=True, text=True
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return {key: statistics.median(r[key] for r in results) for key in results[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes per path (median reported)")
+    parser.add_argument("--scale", type=int, default=1, help="repeat the CSV's rows this many times")
+    parser.add_argument("--child", choices=["csv", "snapshot"], help=argparse.SUPPRESS)
+    parser.add_argument("--csv", help=argparse.SUPPRESS)
+    parser.add_argument("--snapshot-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.csv, args.snapshot_dir)
+        return
+
+    from dataset_store import DATASET_PATH, build_snapshot
+
+    workdir = tempfile.mkdtemp(prefix="snapshot_bench_")
+    try:
+        csv_path = os.path.join(workdir, "crop_yield_extended.csv")
+        with open(DATASET_PATH) as src, open(csv_path, "w") as dst:
+            header = src.readline()
+            body = src.read()
+            if not body.endswith("\n"):
+                body += "\n"
+            dst.write(header + body * args.scale)
+        snapshot_dir = os.path.join(workdir, "dataset_snapshot")
+
+        start = time.perf_counter()
+        build_snapshot(csv_path, snapshot_dir)
+        build_seconds = time.perf_counter() - start
+        csv_mb = os.path.getsize(csv_path) / 1e6
+        snapshot_mb = sum(os.path.getsize(os.path.join(snapshot_dir, name))
+                          for name in os.listdir(snapshot_dir)) / 1e6
+        print(f"CSV {csv_mb:.1f} MB, snapshot {snapshot_mb:.1f} MB (built in {build_seconds:.2f}s)")
+
+        print(f"\n{'path':<10} {'rows':>9} {'load ms':>9} {'first ms':>9} {'RSS MB':>8} {'peak MB':>8}")
+        for mode in ("csv", "snapshot"):
+            r = measure(mode, csv_path, snapshot_dir, args.runs)
+            print(f"{mode:<10} {int(r['rows']):>9} {r['load_ms']:9.1f} {r['first_ms']:9.1f} "
+                  f"{r['rss_mb']:8.1f} {r['peak_mb']:8.1f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Benchmark the hot admin/logout queries before and after the index migration.
+
+Seeds a scratch database (1M predictions by default) at schema version 1,
+times each query and prints its EXPLAIN QUERY PLAN, then applies the
+remaining migrations and repeats.
+
+Run from the repository root:
+    python benchmarks/bench_db_indexes.py --predictions 1000000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from migrations import run_migrations  # noqa: E402
+
+CROPS = ["Rice", "Wheat", "Maize", "Cotton(lint)", "Sugarcane", "Jowar", "Bajra", "Gram", "Potato", "Onion"]
+SEASONS = ["Kharif     ", "Rabi       ", "Whole Year ", "Summer     "]
+STATES = ["Assam", "Bihar", "Kerala", "Punjab", "Odisha", "Gujarat", "Karnataka", "Tamil Nadu"]
+
+QUERIES = {
+    "logout: latest open session": ("""
+        SELECT us.id
+        FROM user_sessions us
+        JOIN users u ON us.user_id = u.id
+        WHERE u.email = ? AND us.logout_time IS NULL
+        ORDER BY us.login_time DESC
+        LIMIT 1
+    """, ("user7@example.com",)),
+    "admin: crop counts": ("""
+        SELECT crop, COUNT(*) as count
+        FROM predictions
+        GROUP BY crop
+        ORDER BY count DESC
+        LIMIT 10
+    """, ()),
+    "admin: latest predictions": ("""
+        SELECT p.id, u.email, p.crop, p.yield_value, p.timestamp
+        FROM predictions p
+        JOIN users u ON p.user_id = u.id
+        ORDER BY p.timestamp DESC
+        LIMIT 50
+    """, ()),
+    "admin: latest sessions": ("""
+        SELECT us.id, u.email, us.login_time, us.logout_time
+        FROM user_sessions us
+        JOIN users u ON us.user_id = u.id
+        ORDER BY us.login_time DESC
+        LIMIT 50
+    """, ()),
+    "user predictions": ("""
+        SELECT COUNT(*) FROM predictions WHERE user_id = ?
+    """, (7,)),
+}
+
+
+def seed(conn, users, sessions, predictions, seed_value=42):
+    """Fill a version-1 schema with synthetic users, sessions and predictions."""
+    rng = random.Random(seed_value)
+    start = time.perf_counter()
+
+    conn.executemany(
+        "INSERT INTO users (firstname, lastname, email, password) VALUES (?, ?, ?, ?)",
+        ((f"First{i}", f"Last{i}", f"user{i}@example.com", "secret") for i in range(1, users + 1))
+    )
+
+    def session_rows():
+        for _ in range(sessions):
+            # ~5% of sessions are still open (no logout_time)
+            yield (rng.randint(1, users), rng.randrange(0, 3650), int(rng.random() < 0.05))
+
+    conn.executemany("""
+        INSERT INTO user_sessions (user_id, login_time, logout_time)
+        SELECT ?, datetime('2015-01-01', '+' || d || ' days'),
+               CASE WHEN o THEN NULL ELSE datetime('2015-01-01', '+' || d || ' days', '+1 hour') END
+        FROM (SELECT ? AS d, ? AS o)
+    """, session_rows())
+
+    def prediction_rows():
+        for i in range(predictions):
+            yield (rng.randint(1, users), rng.randint(1997, 2030), rng.choice(CROPS),
+                   rng.choice(SEASONS), rng.choice(STATES), rng.uniform(1, 1e5), rng.uniform(1, 1e6),
+                   rng.uniform(300, 3000), rng.uniform(1, 1e7), rng.uniform(1, 1e5), rng.uniform(0, 10),
+                   i * 300)
+
+    conn.executemany("""
+        INSERT INTO predictions
+        (user_id, year, crop, season, state, area, production, annual_rainfall, fertilizer, pesticide, yield_value, timestamp)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, datetime('2015-01-01', '+' || ? || ' seconds'))
+    """, prediction_rows())
+    conn.commit()
+    print(f"Seeded {users} users, {sessions} sessions, {predictions} predictions "
+          f"in {time.perf_counter() - start:.1f}s")
+
+
+def run_queries(conn, label, repeat=3):
+    print(f"\n===== {label} =====")
+    for name, (sql, params) in QUERIES.items():
+        plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            conn.execute(sql, params).fetchall()
+            best = min(best, time.perf_counter() - start)
+        print(f"{name:<30} {best * 1000:10.2f} ms")
+        for step in plan:
+            print(f"    {step}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--sessions", type=int, default=50_000)
+    parser.add_argument("--predictions", type=int, default=1_000_000)
+    parser.add_argument("--db", help="scratch database path (default: temporary file)")
+    args = parser.parse_args()
+
+    path = args.db or os.path.join(tempfile.mkdtemp(prefix="crop_bench_"), "bench.db")
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+
+    run_migrations(conn, target=1)
+    seed(conn, args.users, args.sessions, args.predictions)
+    run_queries(conn, "schema version 1 (no secondary indexes)")
+
+    start = time.perf_counter()
+    run_migrations(conn)
+    print(f"\nApplied index migrations in {time.perf_counter() - start:.1f}s")
+    run_queries(conn, "latest schema")
+
+    conn.close()
+    print(f"\nDatabase: {path} ({os.path.getsize(path) / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Micro-benchmark: per-request feature encoding latency.
+
+Compares the original pd.get_dummies + column-fill loop from prediction()
+with the precompiled FeatureEncoder, and checks that the encoder produces
+exactly the training-time one-hot layout.
+
+Run from the repository root:
+    python benchmarks/bench_feature_encoder.py
+"""
+import os
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from feature_encoder import FeatureEncoder, crop_dict, season_dict, state_dict, build_feature_encoder  # noqa: E402
+from model_registry import ModelRegistry, MODEL_DIR  # noqa: E402
+
+# Loaded directly rather than via app, which migrates database.db on import
+model_registry = ModelRegistry(model_dir=os.environ.get("CROP_MODEL_DIR", MODEL_DIR),
+                               encoder_factory=build_feature_encoder)
+feature_names = model_registry.current().feature_names
+
+SAMPLE = dict(area=73814.0, production=56708.0, annual_rainfall=2051.4,
+              fertilizer=7024878.38, pesticide=22882.34,
+              crop="Rice", season="Kharif     ", state="Assam")
+
+
+def legacy_encode(area, production, annual_rainfall, fertilizer, pesticide, crop, season, state):
+    """The per-request encoding prediction() used before FeatureEncoder."""
+    input_data = pd.DataFrame({
+        'Area': [area],
+        'Production': [production],
+        'Annual_Rainfall': [annual_rainfall],
+        'Fertilizer': [fertilizer],
+        'Pesticide': [pesticide],
+        'Crop': [crop],
+        'Season': [season],
+        'State': [state]
+    })
+    input_data = pd.get_dummies(input_data, columns=['Crop', 'Season', 'State'], drop_first=True)
+    for col in feature_names:
+        if col not in input_data.columns:
+            input_data[col] = 0
+    return input_data[feature_names]
+
+
+def reference_encode(area, production, annual_rainfall, fertilizer, pesticide, crop, season, state):
+    """get_dummies with the full training levels, as the notebook encoded x."""
+    input_data = pd.DataFrame({
+        'Area': [area],
+        'Production': [production],
+        'Annual_Rainfall': [annual_rainfall],
+        'Fertilizer': [fertilizer],
+        'Pesticide': [pesticide],
+        'Crop': pd.Categorical([crop], categories=list(crop_dict)),
+        'Season': pd.Categorical([season], categories=list(season_dict)),
+        'State': pd.Categorical([state], categories=list(state_dict)),
+    })
+    input_data = pd.get_dummies(input_data, columns=['Crop', 'Season', 'State'], drop_first=True)
+    return input_data.reindex(columns=feature_names, fill_value=0)
+
+
+def check_equivalence(encoder):
+    """Compare encoder output with the reference for every category value."""
+    mismatches = 0
+    combos = 0
+    for crop in crop_dict:
+        for season in season_dict:
+            for state in list(state_dict)[:5]:
+                args = dict(SAMPLE, crop=crop, season=season, state=state)
+                expected = reference_encode(**args).to_numpy(dtype=np.float64)
+                actual = encoder.encode(**args)
+                combos += 1
+                if not np.array_equal(expected, actual):
+                    mismatches += 1
+    return combos, mismatches
+
+
+def main(number=200):
+    encoder = FeatureEncoder(feature_names, crop_dict, season_dict, state_dict)
+
+    combos, mismatches = check_equivalence(encoder)
+    print(f"Equivalence vs training layout: {combos - mismatches}/{combos} combinations identical")
+
+    legacy = legacy_encode(**SAMPLE).to_numpy(dtype=np.float64)
+    numeric = [dst for _, dst in encoder.numeric_slots]
+    print("Numeric slots identical to legacy path:",
+          np.array_equal(legacy[:, numeric], encoder.encode(**SAMPLE)[:, numeric]))
+
+    timings = {
+        "legacy get_dummies": lambda: legacy_encode(**SAMPLE),
+        "FeatureEncoder (ndarray)": lambda: encoder.encode(**SAMPLE),
+        "FeatureEncoder (DataFrame)": lambda: pd.DataFrame(encoder.encode(**SAMPLE), columns=feature_names),
+    }
+    print(f"\nPer-request encode latency ({number} iterations, best of 5):")
+    for label, fn in timings.items():
+        best = min(timeit.repeat(fn, number=number, repeat=5)) / number
+        print(f"  {label:<28} {best * 1e6:10.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Benchmark: compiled InferenceEngine vs the sklearn prediction() path.
+
+For batch sizes from 1 to 100k rows (sampled from the dataset and encoded
+with FeatureEncoder), times
+  * sklearn: DataFrame + PowerTransformer.transform + forest.predict
+  * engine:  InferenceEngine.predict (fused Yeo-Johnson + flat trees)
+and prints p50/p99 latency plus the largest absolute prediction difference.
+
+Run from the repository root:
+    python benchmarks/bench_inference_engine.py
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dataset_store import dataset_store  # noqa: E402
+from feature_encoder import build_feature_encoder  # noqa: E402
+from model_registry import ModelRegistry, MODEL_DIR  # noqa: E402
+
+BATCH_SIZES = [1, 10, 100, 1000, 10_000, 100_000]
+
+
+def sample_matrix(bundle, rows, seed=42):
+    """Encoded feature rows drawn (with replacement) from the dataset."""
+    df = dataset_store.snapshot().df.rename(columns=str.lower)
+    df = df.sample(n=rows, replace=True, random_state=seed).reset_index(drop=True)
+    for col in ("crop", "season", "state"):
+        df[col] = df[col].astype(str)
+    return bundle.encoder.encode_batch(df)
+
+
+def percentiles(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return np.percentile(samples, 50), np.percentile(samples, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=BATCH_SIZES)
+    parser.add_argument("--budget", type=float, default=3.0,
+                        help="approximate seconds spent timing each path per batch size")
+    args = parser.parse_args()
+
+    # Loaded directly rather than via app, which migrates database.db on import;
+    # the sklearn path needs the forest itself
+    model_registry = ModelRegistry(model_dir=os.environ.get("CROP_MODEL_DIR", MODEL_DIR),
+                                   encoder_factory=build_feature_encoder, keep_forest=True)
+    bundle = model_registry.current()
+    engine = bundle.engine
+    print(f"Engine: {engine.n_trees} trees, {len(engine.threshold)} nodes, "
+          f"max depth {engine.max_depth}, {engine.nbytes / 1e6:.1f} MB")
+
+    matrix = sample_matrix(bundle, max(args.sizes))
+
+    def sklearn_path(X):
+        frame = pd.DataFrame(X, columns=bundle.feature_names)
+        return bundle.model.predict(bundle.transformer.transform(frame))
+
+    print(f"\n{'rows':>8} {'path':<8} {'p50 ms':>10} {'p99 ms':>10} {'rows/s':>12}")
+    for size in args.sizes:
+        X = matrix[:size]
+        expected = sklearn_path(X)
+        diff = np.abs(engine.predict(X) - expected).max()
+
+        for label, fn in (("sklearn", lambda: sklearn_path(X)), ("engine", lambda: engine.predict(X))):
+            start = time.perf_counter()
+            fn()
+            once = time.perf_counter() - start
+            repeat = int(min(500, max(3, args.budget / max(once, 1e-6))))
+            p50, p99 = percentiles(fn, repeat)
+            print(f"{size:>8} {label:<8} {p50 * 1000:10.3f} {p99 * 1000:10.3f} {size / p50:12,.0f}")
+        print(f"{'':>8} max |engine - sklearn| = {diff:.3g}")
+
+
+if __name__ == "__main__":
+    main()
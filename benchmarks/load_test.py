@@ -0,0 +1,395 @@
+"""End-to-end load test of the Flask app, in-process or against a live server.
+
+Seeds a scratch database.db (users, sessions, predictions), then runs a
+weighted mix of scenarios from several client threads:
+    journey: signup -> login -> predict -> graph -> logout
+    admin:   admin dashboard and crop graph loads
+and reports requests/sec, per-step latency percentiles and database growth.
+Results can be saved as JSON and compared against an earlier run.
+
+Run from the repository root:
+    python benchmarks/load_test.py --target inprocess --iterations 200
+    python benchmarks/load_test.py --target server --concurrency 8 --json after.json --baseline before.json
+"""
+import argparse
+import contextlib
+import datetime
+import http.cookiejar
+import json
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from bench_db_indexes import CROPS, SEASONS, STATES, seed  # noqa: E402
+from migrations import run_migrations  # noqa: E402
+
+ADMIN_EMAIL = "sinankadukkuthi@gmail.com"
+ADMIN_PASSWORD = "Sinan@123"
+
+SCENARIOS = ("journey", "admin")
+DEFAULT_MIX = "journey=9,admin=1"
+PERCENTILES = (50, 90, 95, 99)
+
+DB_FILES = ("database.db", "database.db-wal")
+
+
+# ---------- CLIENTS ----------
+class TestClient:
+    """Flask test client; one per thread, cookies kept between requests."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None):
+        response = self.client.open(path, method=method, data=data)
+        response.close()
+        return response.status_code
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    # Every hop is timed as its own request, as with the test client
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpClient:
+    """urllib client with a cookie jar, for the live server."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect())
+
+    def request(self, method, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        req = urllib.request.Request(self.base_url + path, data=body, method=method)
+        try:
+            with self.opener.open(req, timeout=60) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+
+
+# ---------- SCENARIOS ----------
+class Recorder:
+    """Latencies per step, shared by the client threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def call(self, client, step, method, path, data=None, expect=(200, 302)):
+        start = time.perf_counter()
+        try:
+            status = client.request(method, path, data)
+        except OSError:
+            status = None
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.latency[step].append(elapsed)
+            if status not in expect:
+                self.errors[step] += 1
+        return status
+
+
+def prediction_form(rng):
+    return {
+        "predict": "1",
+        "year": rng.randint(1997, 2020),
+        "area": round(rng.uniform(1, 1e5), 2),
+        "production": round(rng.uniform(1, 1e6), 2),
+        "annual_rainfall": round(rng.uniform(300, 3000), 1),
+        "fertilizer": round(rng.uniform(1, 1e7), 2),
+        "pesticide": round(rng.uniform(1, 1e5), 2),
+        "crop": rng.choice(CROPS),
+        "season": rng.choice(SEASONS),
+        "state": rng.choice(STATES),
+    }
+
+
+def run_journey(client, recorder, rng, user_id):
+    email = f"load{user_id}@example.com"
+    account = {"firstname": "Load", "lastname": str(user_id), "email": email,
+               "password": "secret", "confirm": "secret"}
+    recorder.call(client, "signup_page", "GET", "/signup")
+    recorder.call(client, "signup", "POST", "/signup", account)
+    recorder.call(client, "login", "POST", "/login", {"email": email, "password": "secret"})
+    recorder.call(client, "prediction_page", "GET", "/prediction")
+    recorder.call(client, "predict", "POST", "/prediction", prediction_form(rng))
+    recorder.call(client, "graph_form", "POST", "/prediction",
+                  {"graph": "1", "x_axis": "Crop", "y_axis": "Yield"})
+    recorder.call(client, "graph_png", "GET", "/prediction/graph.png?x=Crop&y=Yield")
+    recorder.call(client, "logout", "GET", "/logout")
+
+
+def run_admin(client, recorder, rng, user_id):
+    if not getattr(client, "admin_logged_in", False):
+        recorder.call(client, "admin_login", "POST", "/admin/login",
+                      {"email": ADMIN_EMAIL, "password": ADMIN_PASSWORD})
+        client.admin_logged_in = True
+    recorder.call(client, "admin_dashboard", "GET", "/admin")
+    recorder.call(client, "admin_crop_graph", "GET", "/admin/crop_graph.png")
+
+
+RUNNERS = {"journey": run_journey, "admin": run_admin}
+
+
+def parse_mix(value):
+    """'journey=9,admin=1' -> {'journey': 9.0, 'admin': 1.0}"""
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"unknown scenario {name!r} (choose from {', '.join(SCENARIOS)})")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def drive(make_client, mix, iterations, concurrency, seed_value):
+    """Run ``iterations`` scenarios spread over ``concurrency`` threads."""
+    recorder = Recorder()
+    rng = random.Random(seed_value)
+    plan = rng.choices(list(mix), weights=list(mix.values()), k=iterations)
+    counts = {name: plan.count(name) for name in mix}
+    next_item = iter(enumerate(plan))
+    lock = threading.Lock()
+    run_tag = f"{os.getpid()}-{seed_value}"
+
+    def worker(index):
+        client = make_client()
+        worker_rng = random.Random(seed_value * 1000 + index)
+        while True:
+            with lock:
+                item = next(next_item, None)
+            if item is None:
+                return
+            number, scenario = item
+            RUNNERS[scenario](client, recorder, worker_rng, f"{run_tag}-{number}")
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder, time.perf_counter() - start, counts
+
+
+# ---------- DATABASE ----------
+def prepare_database(work_dir, users, sessions, predictions, seed_value):
+    """Seed a fresh work_dir/database.db and bring it to the latest schema."""
+    for name in DB_FILES + ("database.db-shm",):
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(os.path.join(work_dir, name))
+    conn = sqlite3.connect(os.path.join(work_dir, "database.db"))
+    conn.execute("PRAGMA journal_mode=WAL")
+    run_migrations(conn, target=1)
+    seed(conn, users, sessions, predictions, seed_value)
+    run_migrations(conn)   # backfills the summary tables in one pass
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+
+
+def database_state(work_dir):
+    path = os.path.join(work_dir, "database.db")
+    conn = sqlite3.connect(path)
+    rows = {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            for table in ("users", "user_sessions", "predictions")}
+    conn.close()
+    sizes = {name: os.path.getsize(os.path.join(work_dir, name))
+             for name in DB_FILES if os.path.exists(os.path.join(work_dir, name))}
+    # Until a checkpoint, new pages sit in the WAL file
+    return {"bytes": sum(sizes.values()), "wal_bytes": sizes.get("database.db-wal", 0), "rows": rows}
+
+
+# ---------- TARGETS ----------
+def run_inprocess(work_dir, args, mix):
+    """Drive the app through Flask's test client inside this process."""
+    os.chdir(work_dir)   # the app keeps database.db, job_results/ etc. in the working directory
+    with open(os.path.join(work_dir, "app.log"), "a") as log, contextlib.redirect_stdout(log):
+        import app
+        app.init_db()
+        make_client = lambda: TestClient(app.app)
+        return _measure(make_client, work_dir, args, mix)
+
+
+def run_server(work_dir, args, mix):
+    """Launch the app on a local port (threaded dev server) and drive it over HTTP."""
+    launch = ("import app; app.init_db(); "
+              f"app.app.run(host='127.0.0.1', port={args.port}, threaded=True, use_reloader=False)")
+    env = dict(os.environ, PYTHONPATH=REPO_DIR)
+    base_url = f"http://127.0.0.1:{args.port}"
+    with open(os.path.join(work_dir, "server.log"), "a") as log:
+        server = subprocess.Popen([sys.executable, "-c", launch], cwd=work_dir, env=env,
+                                  stdout=log, stderr=subprocess.STDOUT)
+        try:
+            _wait_for(base_url + "/login", server)
+            return _measure(lambda: HttpClient(base_url), work_dir, args, mix)
+        finally:
+            server.terminate()
+            server.wait(timeout=10)
+
+
+def _wait_for(url, server, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited with code {server.returncode}; see server.log")
+        try:
+            urllib.request.urlopen(url, timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server did not answer on {url} within {timeout}s")
+
+
+def _measure(make_client, work_dir, args, mix):
+    # Warm-up loads the model, dataset and graph caches; not counted
+    if args.warmup:
+        drive(make_client, {name: 1 for name in mix}, args.warmup * len(mix), 1, args.seed + 1)
+    before = database_state(work_dir)
+    recorder, wall, counts = drive(make_client, mix, args.iterations, args.concurrency, args.seed)
+    after = database_state(work_dir)
+    return summarize(recorder, wall, counts, before, after)
+
+
+# ---------- REPORT ----------
+def _percentile(sorted_values, p):
+    if not sorted_values:
+        return float("nan")
+    rank = (len(sorted_values) - 1) * p / 100
+    low = int(rank)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+
+def _describe(values, wall):
+    values = sorted(values)
+    stats = {"count": len(values), "rps": len(values) / wall if wall else 0.0,
+             "mean_ms": sum(values) / len(values) * 1000 if values else float("nan")}
+    for p in PERCENTILES:
+        stats[f"p{p}_ms"] = _percentile(values, p) * 1000
+    return stats
+
+
+def summarize(recorder, wall, counts, before, after):
+    every = [value for values in recorder.latency.values() for value in values]
+    return {
+        "wall_seconds": wall,
+        "scenarios": counts,
+        "overall": {**_describe(every, wall), "errors": sum(recorder.errors.values())},
+        "steps": {step: {**_describe(values, wall), "errors": recorder.errors.get(step, 0)}
+                  for step, values in sorted(recorder.latency.items())},
+        "database": {
+            "before": before,
+            "after": after,
+            "growth_bytes": after["bytes"] - before["bytes"],
+            "growth_rows": {table: after["rows"][table] - before["rows"][table] for table in after["rows"]},
+        },
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(target, result, baseline=None):
+    overall = result["overall"]
+    print(f"\n===== {target}: {overall['count']} requests in {result['wall_seconds']:.1f}s "
+          f"({overall['rps']:.1f} req/s, {overall['errors']} errors) =====")
+    print(f"{'step':<18} {'count':>6} {'errors':>6} {'mean ms':>8} " +
+          " ".join(f"{f'p{p} ms':>8}" for p in PERCENTILES) +
+          (f" {'p95 vs base':>12}" if baseline else ""))
+    rows = [("overall", overall)] + list(result["steps"].items())
+    for step, stats in rows:
+        line = (f"{step:<18} {stats['count']:>6} {stats['errors']:>6} {stats['mean_ms']:8.2f} " +
+                " ".join(f"{stats[f'p{p}_ms']:8.2f}" for p in PERCENTILES))
+        base = (baseline["overall"] if step == "overall" else baseline["steps"].get(step)) if baseline else None
+        if base:
+            line += f" {(stats['p95_ms'] / base['p95_ms'] - 1) * 100:+11.1f}%"
+        print(line)
+    if baseline:
+        print(f"Throughput vs baseline: {(overall['rps'] / baseline['overall']['rps'] - 1) * 100:+.1f}%")
+    db = result["database"]
+    print(f"Database: {db['before']['bytes'] / 1e6:.2f} MB -> {db['after']['bytes'] / 1e6:.2f} MB "
+          f"(+{db['growth_bytes'] / 1e3:.1f} kB, WAL {db['after']['wal_bytes'] / 1e6:.2f} MB; "
+          f"rows +{db['growth_rows']})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--target", choices=("inprocess", "server", "both"), default="inprocess")
+    parser.add_argument("--users", type=int, default=1000, help="seeded users")
+    parser.add_argument("--sessions", type=int, default=10_000, help="seeded login sessions")
+    parser.add_argument("--predictions", type=int, default=100_000, help="seeded predictions")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"scenario weights (default: {DEFAULT_MIX})")
+    parser.add_argument("--iterations", type=int, default=200, help="scenarios to run")
+    parser.add_argument("--concurrency", type=int, default=4, help="client threads")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed runs of each scenario first")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--port", type=int, default=5055, help="port for --target server")
+    parser.add_argument("--model-dir", default=os.path.join(REPO_DIR, "models"),
+                        help="trained artifacts the app should serve")
+    parser.add_argument("--work-dir", help="where to keep the scratch databases (default: a temp dir)")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="results JSON of an earlier run to compare against")
+    args = parser.parse_args()
+
+    os.environ["CROP_MODEL_DIR"] = os.path.abspath(args.model_dir)
+    work_root = os.path.abspath(args.work_dir or tempfile.mkdtemp(prefix="crop_load_"))
+    # The in-process target changes the working directory
+    args.json = args.json and os.path.abspath(args.json)
+    args.baseline = args.baseline and os.path.abspath(args.baseline)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["targets"]
+
+    # The in-process run changes directory, so the server goes first
+    targets = ["server", "inprocess"] if args.target == "both" else [args.target]
+    results = {}
+    for target in targets:
+        work_dir = os.path.join(work_root, target)
+        os.makedirs(work_dir, exist_ok=True)
+        prepare_database(work_dir, args.users, args.sessions, args.predictions, args.seed)
+        runner = run_server if target == "server" else run_inprocess
+        results[target] = runner(work_dir, args, args.mix)
+        print_report(target, results[target], baseline.get(target) if baseline else None)
+
+    print(f"\nScratch databases and app logs: {work_root}")
+    if args.json:
+        config = {key: value for key, value in vars(args).items() if key not in ("json", "baseline")}
+        report = {
+            "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": sys.version.split()[0],
+            "config": config,
+            "targets": results,
+        }
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.metrics import r2_score
+
+from inference_engine import InferenceEngine
+from model_registry import MODEL_DIR, MODEL_FILE, TRANSFORMER_FILE, FEATURES_FILE, COMPACT_FILE
+from outliers import IQR_COLUMNS
+from snapshot import file_sha256
+from train import DATASET_PATH, METADATA_FILE, SPLIT_SEED, TEST_SIZE, prepare
+
+# ---------- FOREST COMPACTION ----------
+# Shrinks the trained forest into a deployable InferenceEngine artifact:
+#   * keep only the first N trees (forest trees are exchangeable, so the
+#     first N are an unbiased random subset)
+#   * collapse every node deeper than max_depth, or trained on fewer than
+#     min_samples rows, into a leaf holding that node's mean target value
+#   * store thresholds and leaf values as float32 and node indices as int32
+# Thresholds are rounded *down* to float32. Trees compare float32 inputs,
+# and for a float32 x, x <= t holds exactly when x <= round_down32(t), so
+# the downcast does not change a single split decision.
+
+COMPACT_REPORT_FILE = "compact_report.json"
+
+# Repetitions when timing single-row and batch predictions
+LATENCY_REPEAT = 100
+BATCH_ROWS = 1000
+
+
+def _float32_floor(values):
+    """Largest float32 not greater than each float64 value."""
+    rounded = values.astype(np.float32)
+    above = rounded.astype(np.float64) > values
+    rounded[above] = np.nextafter(rounded[above], np.float32(-np.inf))
+    return rounded
+
+
+def _compact_tree(tree, max_depth=None, min_samples=None):
+    """Flat arrays for one pruned tree, with node 0 as its root."""
+    keep = []          # original node ids in new order
+    is_leaf = []
+    new_id = {}
+    queue = deque([(0, 0)])
+    while queue:
+        node, depth = queue.popleft()
+        new_id[node] = len(keep)
+        keep.append(node)
+        leaf = (tree.children_left[node] == -1
+                or (max_depth is not None and depth >= max_depth)
+                or (min_samples is not None and tree.n_node_samples[node] < min_samples))
+        is_leaf.append(leaf)
+        if not leaf:
+            queue.append((tree.children_left[node], depth + 1))
+            queue.append((tree.children_right[node], depth + 1))
+
+    keep = np.array(keep)
+    is_leaf = np.array(is_leaf)
+    own = np.arange(len(keep))
+    left = np.array([new_id.get(c, -1) for c in tree.children_left[keep]])
+    right = np.array([new_id.get(c, -1) for c in tree.children_right[keep]])
+    # Internal nodes of a regression tree hold the mean target of their rows
+    return {
+        "feature": np.where(is_leaf, 0, tree.feature[keep]),
+        "threshold": np.where(is_leaf, np.inf, tree.threshold[keep]),
+        "left": np.where(is_leaf, own, left),
+        "right": np.where(is_leaf, own, right),
+        "value": tree.value[keep, 0, 0],
+        "depth": _depth(is_leaf, left, right),
+    }
+
+
+def _depth(is_leaf, left, right):
+    depth = np.zeros(len(is_leaf), dtype=np.int64)
+    for node in range(len(is_leaf)):   # breadth-first order: parents come first
+        if not is_leaf[node]:
+            depth[left[node]] = depth[right[node]] = depth[node] + 1
+    return int(depth.max())
+
+
+def compact_forest(model, transformer, n_trees=None, max_depth=None, min_samples=None, feature_names=None):
+    """InferenceEngine for a pruned, float32 copy of ``model``."""
+    estimators = model.estimators_[:n_trees] if n_trees else model.estimators_
+    parts = {name: [] for name in ("feature", "threshold", "left", "right", "value")}
+    roots = []
+    deepest = 0
+    offset = 0
+    for estimator in estimators:
+        tree = _compact_tree(estimator.tree_, max_depth, min_samples)
+        roots.append(offset)
+        deepest = max(deepest, tree.pop("depth"))
+        for name in ("left", "right"):
+            tree[name] = tree[name] + offset
+        for name, values in tree.items():
+            parts[name].append(values)
+        offset += len(tree["value"])
+
+    scaler = transformer._scaler if transformer.standardize else None
+    return InferenceEngine(
+        lambdas=transformer.lambdas_,
+        mean=None if scaler is None else scaler.mean_,
+        scale=None if scaler is None else scaler.scale_,
+        feature=np.concatenate(parts["feature"]),
+        threshold=_float32_floor(np.concatenate(parts["threshold"])),
+        left=np.concatenate(parts["left"]),
+        right=np.concatenate(parts["right"]),
+        value=np.concatenate(parts["value"]).astype(np.float32),
+        roots=roots,
+        max_depth=deepest,
+        feature_names=feature_names
+    )
+
+
+def _median_ms(fn, repeat=LATENCY_REPEAT):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return float(np.median(samples) * 1000)
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def training_split(model_dir, data_path=DATASET_PATH):
+    """``prepare()`` arguments that rebuild the model's own held-out split.
+
+    Read from the training metadata. Models without metadata (the
+    notebook-trained forest) get the ``prepare()`` defaults with no outlier
+    filter, which is how the notebook split the data. Raises ValueError if
+    the dataset changed since training, since the split would differ.
+    """
+    metadata_path = os.path.join(model_dir, METADATA_FILE)
+    try:
+        with open(metadata_path) as f:
+            metadata = json.load(f)
+    except FileNotFoundError:
+        print(f"WARNING: No {METADATA_FILE} in {model_dir}; comparing on the default split "
+              f"(seed {SPLIT_SEED}, test size {TEST_SIZE}, no outlier filter)", file=sys.stderr)
+        return {"data_path": data_path, "filter_outliers": False,
+                "test_size": TEST_SIZE, "split_seed": SPLIT_SEED}
+    if metadata["data"]["sha256"] != file_sha256(data_path):
+        raise ValueError(f"{data_path} changed since the model was trained (sha256 mismatch)")
+    params = metadata["params"]
+    return {
+        "data_path": data_path,
+        "filter_outliers": params["filter_outliers"],
+        "iqr_columns": params.get("iqr_columns", IQR_COLUMNS),
+        "iqr_factor": params["iqr_factor"],
+        "sequential_outliers": params["sequential_outliers"],
+        "drop_columns": params["drop_columns"],
+        "test_size": params["test_size"],
+        "split_seed": params["split_seed"],
+    }
+
+
+def compare(model_dir, compact_path, data_path=DATASET_PATH):
+    """Held-out R², artifact size, load time and latency of both models."""
+    split = training_split(model_dir, data_path)
+    paths = {name: os.path.join(model_dir, name) for name in (MODEL_FILE, TRANSFORMER_FILE, FEATURES_FILE)}
+    (model, transformer), load_original = _timed(
+        lambda: (joblib.load(paths[MODEL_FILE]), joblib.load(paths[TRANSFORMER_FILE])))
+    feature_names = list(joblib.load(paths[FEATURES_FILE]))
+    compact, load_compact = _timed(lambda: InferenceEngine.load(compact_path))
+
+    _, x_test, _, y_test, _ = prepare(**split)
+    x_test = x_test.reindex(columns=feature_names, fill_value=0)
+    X = x_test.to_numpy(dtype=np.float64)
+
+    def original_predict(rows):
+        return model.predict(transformer.transform(pd.DataFrame(rows, columns=feature_names)))
+
+    original_pred = original_predict(X)
+    compact_pred = compact.predict(X)
+    batch = X[:BATCH_ROWS]
+    report = {
+        "test_rows": len(X),
+        "original": {
+            "trees": len(model.estimators_),
+            "nodes": int(sum(e.tree_.node_count for e in model.estimators_)),
+            "max_depth": int(max(e.tree_.max_depth for e in model.estimators_)),
+            "test_r2": float(r2_score(y_test, original_pred)),
+            "file_bytes": sum(os.path.getsize(p) for p in paths.values()),
+            "load_seconds": load_original,
+            "row_ms": _median_ms(lambda: original_predict(X[:1])),
+            "batch_ms": _median_ms(lambda: original_predict(batch), max(3, LATENCY_REPEAT // 10)),
+        },
+        "compact": {
+            "trees": compact.n_trees,
+            "nodes": len(compact.value),
+            "max_depth": compact.max_depth,
+            "test_r2": float(r2_score(y_test, compact_pred)),
+            "file_bytes": os.path.getsize(compact_path),
+            "load_seconds": load_compact,
+            "row_ms": _median_ms(lambda: compact.predict(X[:1])),
+            "batch_ms": _median_ms(lambda: compact.predict(batch), max(3, LATENCY_REPEAT // 10)),
+        },
+        "max_abs_prediction_diff": float(np.abs(compact_pred - original_pred).max()),
+        "split": {name: value for name, value in split.items() if name != "data_path"},
+    }
+    return report
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Prune and downcast the trained forest for serving.")
+    parser.add_argument("--model-dir", default=MODEL_DIR, help="directory with the trained joblib artifacts")
+    parser.add_argument("--output", help=f"compact artifact (default: MODEL_DIR/{COMPACT_FILE})")
+    parser.add_argument("--trees", type=int, help="keep the first N trees (default: all)")
+    parser.add_argument("--max-depth", type=int, help="collapse nodes below this depth into leaves")
+    parser.add_argument("--min-samples", type=int,
+                        help="collapse nodes trained on fewer than this many rows into leaves")
+    parser.add_argument("--data", default=DATASET_PATH,
+                        help="dataset the model was trained on (split settings come from its metadata, if any)")
+    parser.add_argument("--no-report", action="store_true", help="skip the comparison report")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    output = args.output or os.path.join(args.model_dir, COMPACT_FILE)
+
+    model = joblib.load(os.path.join(args.model_dir, MODEL_FILE))
+    transformer = joblib.load(os.path.join(args.model_dir, TRANSFORMER_FILE))
+    feature_names = list(joblib.load(os.path.join(args.model_dir, FEATURES_FILE)))
+    engine = compact_forest(model, transformer, args.trees, args.max_depth, args.min_samples, feature_names)
+    engine.save(output)
+    print(f"Wrote {output}: {engine.n_trees} trees, {len(engine.value)} nodes, "
+          f"max depth {engine.max_depth}, {os.path.getsize(output) / 1e6:.1f} MB")
+    if args.no_report:
+        return 0
+
+    try:
+        report = compare(args.model_dir, output, args.data)
+    except ValueError as e:
+        print(f"Not comparing: {e}", file=sys.stderr)
+        return 1
+    report["params"] = {"trees": args.trees, "max_depth": args.max_depth, "min_samples": args.min_samples}
+    report_path = os.path.join(os.path.dirname(os.path.abspath(output)), COMPACT_REPORT_FILE)
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\n{'':10} {'trees':>6} {'nodes':>9} {'depth':>5} {'test R2':>8} {'size MB':>8} "
+          f"{'load s':>7} {'row ms':>7} {'1k rows ms':>10}")
+    for label in ("original", "compact"):
+        r = report[label]
+        print(f"{label:10} {r['trees']:>6} {r['nodes']:>9} {r['max_depth']:>5} {r['test_r2']:8.4f} "
+              f"{r['file_bytes'] / 1e6:8.1f} {r['load_seconds']:7.3f} {r['row_ms']:7.3f} {r['batch_ms']:10.2f}")
+    print(f"Max |compact - original| on the held-out rows: {report['max_abs_prediction_diff']:.4g}")
+    print(f"Report written to {report_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
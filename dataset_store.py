@@ -0,0 +1,133 @@
+import os
+import threading
+import traceback
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from snapshot import read_snapshot, write_snapshot
+
+# ---------- DATASET LOCATION ----------
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATASET_PATH = os.path.join(BASE_DIR, "crop_yield_extended.csv")
+
+# Columnar copy of the CSV (see snapshot.py); rebuild with `python snapshot.py`
+SNAPSHOT_DIR = os.path.join(BASE_DIR, "dataset_snapshot")
+
+# Columns stored as pandas categoricals; every other column is numeric.
+CATEGORICAL_COLUMNS = ["Crop", "Season", "State"]
+INTEGER_COLUMNS = ["Crop_Year"]
+
+DatasetSnapshot = namedtuple(
+    "DatasetSnapshot",
+    ["df", "categorical_cols", "numerical_cols", "mtime", "version"]
+)
+
+
+def _parse_csv(path):
+    """Parse the crop CSV: categoricals, integer year, float64 measurements."""
+    df = pd.read_csv(path)
+    df.columns = df.columns.str.strip()
+
+    for col in df.columns:
+        if col in CATEGORICAL_COLUMNS:
+            df[col] = df[col].astype("category")
+        elif col in INTEGER_COLUMNS:
+            df[col] = df[col].astype(np.int16)
+        else:
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype(np.float64)
+    return df
+
+
+def build_snapshot(path=DATASET_PATH, snapshot_dir=SNAPSHOT_DIR):
+    """Parse the CSV once and store it as a columnar snapshot."""
+    return write_snapshot(_parse_csv(path), path, snapshot_dir)
+
+
+def load_dataset(path=DATASET_PATH, snapshot_dir=SNAPSHOT_DIR, mmap_mode="r"):
+    """Full-precision dataset frame, read from the snapshot when it is fresh.
+
+    Falls back to parsing the CSV if the snapshot is missing or was built
+    from a different version of the file. Returns ``(df, source)`` where
+    source is "snapshot" or "csv". With the default ``mmap_mode`` the
+    numeric columns are read-only views of the snapshot files; pass
+    ``mmap_mode=None`` for a frame that may be modified in place.
+    """
+    df = read_snapshot(path, snapshot_dir, mmap_mode=mmap_mode)
+    if df is not None:
+        return df, "snapshot"
+    print(f"DEBUG: No fresh snapshot in {snapshot_dir}, parsing {path} (run `python snapshot.py`)")
+    return _parse_csv(path), "csv"
+
+
+def _read_dataset(path, snapshot_dir=SNAPSHOT_DIR):
+    """Dataset frame with compact dtypes for the app."""
+    df, _ = load_dataset(path, snapshot_dir)
+    for col in df.columns:
+        if df[col].dtype == np.float64:
+            df[col] = df[col].astype(np.float32)
+    return df
+
+
+class DatasetStore:
+    """Process-wide, read-only view of the crop dataset.
+
+    The dataset is loaded once (from the columnar snapshot when it matches
+    the CSV, otherwise from the CSV itself) and kept in memory;
+    ``snapshot()`` reloads it only when the CSV's mtime changes. Snapshots are shared between
+    requests, so callers must treat ``snapshot.df`` as read-only.
+
+    Callbacks registered with ``add_listener()`` run with every newly loaded
+    snapshot, which lets derived caches rebuild themselves at load time.
+    """
+
+    def __init__(self, path=DATASET_PATH, snapshot_dir=SNAPSHOT_DIR):
+        self.path = path
+        self.snapshot_dir = snapshot_dir
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._version = 0
+        self._listeners = []
+
+    def add_listener(self, callback):
+        """Call ``callback(snapshot)`` whenever a new snapshot is loaded."""
+        self._listeners.append(callback)
+
+    def snapshot(self):
+        """Return the current snapshot, reloading if the file changed."""
+        mtime = os.stat(self.path).st_mtime
+        current = self._snapshot
+        if current is not None and current.mtime == mtime:
+            return current
+
+        with self._lock:
+            current = self._snapshot
+            if current is not None and current.mtime == mtime:
+                return current
+
+            df = _read_dataset(self.path, self.snapshot_dir)
+            categorical_cols = [c for c in df.columns if c in CATEGORICAL_COLUMNS]
+            numerical_cols = [c for c in df.columns if c not in CATEGORICAL_COLUMNS]
+            self._version += 1
+            self._snapshot = DatasetSnapshot(
+                df=df,
+                categorical_cols=categorical_cols,
+                numerical_cols=numerical_cols,
+                mtime=mtime,
+                version=self._version
+            )
+            print(f"DEBUG: Loaded dataset {self.path} ({len(df)} rows, version {self._version})")
+
+            for callback in self._listeners:
+                try:
+                    callback(self._snapshot)
+                except Exception as e:
+                    # Listeners must recover on their own (e.g. GraphCache rebuilds on next use)
+                    print(f"DEBUG: Dataset listener {callback!r} failed: {e}")
+                    traceback.print_exc()
+            return self._snapshot
+
+
+# Shared instance used by the Flask routes
+dataset_store = DatasetStore()
@@ -0,0 +1,119 @@
+import os
+import sqlite3
+import threading
+import weakref
+
+# ---------- DATABASE SETTINGS ----------
+DB_PATH = "database.db"
+BUSY_TIMEOUT_MS = 10000
+CACHE_SIZE_KIB = 16384  # page cache per connection (negative PRAGMA value = KiB)
+
+PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    f"PRAGMA cache_size=-{CACHE_SIZE_KIB}",
+    f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}",
+    "PRAGMA temp_store=MEMORY",
+]
+
+
+def connect(path=DB_PATH, factory=sqlite3.Connection):
+    """New connection with the standard pragmas and row factory (not pooled)."""
+    conn = sqlite3.connect(
+        path,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        check_same_thread=False,
+        factory=factory
+    )
+    conn.row_factory = sqlite3.Row
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+class PooledConnection(sqlite3.Connection):
+    """SQLite connection whose close() hands it back to the pool.
+
+    Routes keep calling ``conn.close()`` as before; any open transaction is
+    rolled back and the underlying connection stays open for the next
+    request on the same thread.
+    """
+
+    def close(self):
+        if self.in_transaction:
+            self.rollback()
+
+    def really_close(self):
+        super().close()
+
+
+class _Slot:
+    """A thread's pooled connection; closed when the thread's locals are freed."""
+
+    __slots__ = ("conn", "pid", "__weakref__")
+
+    def __init__(self, conn, pid):
+        self.conn = conn
+        self.pid = pid
+
+
+class ConnectionPool:
+    """One configured connection per live thread (and per process after a fork).
+
+    A connection is closed and dropped from the pool when the thread that
+    opened it exits, so thread-per-request servers don't leak descriptors.
+    """
+
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+
+    def _connect(self):
+        conn = connect(self.path, factory=PooledConnection)
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    def _release(self, conn, pid):
+        with self._lock:
+            if conn in self._connections:
+                self._connections.remove(conn)
+        # A connection inherited over fork is dropped, never closed: closing
+        # it in the child would release the parent's file locks
+        if os.getpid() == pid:
+            try:
+                conn.really_close()
+            except sqlite3.Error:
+                pass
+
+    def connection(self):
+        """Return this thread's pooled connection, creating it on first use."""
+        pid = os.getpid()
+        slot = getattr(self._local, "slot", None)
+        if slot is None or slot.pid != pid:
+            # Never reuse a connection inherited from the parent process
+            slot = _Slot(self._connect(), pid)
+            weakref.finalize(slot, self._release, slot.conn, pid)
+            self._local.slot = slot
+        return slot.conn
+
+    def close_all(self):
+        """Really close every connection opened by this pool."""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.really_close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
+
+
+pool = ConnectionPool()
+
+
+def get_db_connection():
+    """Pooled SQLite connection with WAL, busy timeout + row factory."""
+    return pool.connection()
@@ -0,0 +1,197 @@
+import csv
+import datetime
+import io
+
+from db import connect, DB_PATH
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is optional
+    pa = pq = None
+
+# ---------- STREAMING EXPORTS ----------
+# Rows are read with fetchmany() on a dedicated connection and written out
+# chunk by chunk, so memory use depends on EXPORT_CHUNK_ROWS, not on the
+# size of the table. Filters and date ranges are applied in SQL.
+
+EXPORT_CHUNK_ROWS = 5000
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# Dataset -> (repository query attribute, column used for date ranges)
+EXPORT_DATASETS = {
+    "predictions": ("predictions", "p.timestamp"),
+    "sessions": ("sessions", "us.login_time"),
+    "users": ("user_stats", None),
+}
+
+# Parquet column types; anything not listed (names, dates, ...) is a string
+PARQUET_INT_COLUMNS = {"id", "year", "visit_count", "prediction_count"}
+PARQUET_FLOAT_COLUMNS = {"area", "production", "annual_rainfall", "fertilizer", "pesticide", "yield_value"}
+
+
+class ExportError(ValueError):
+    """Raised for an unknown dataset/format or invalid filters."""
+
+
+def parse_date(raw, field):
+    """ISO date (YYYY-MM-DD) from a request/CLI value, or None if empty."""
+    if not raw:
+        return None
+    try:
+        return datetime.date.fromisoformat(raw.strip())
+    except ValueError:
+        raise ExportError(f"{field} must be a date in YYYY-MM-DD format.")
+
+
+def filtered_query(query, date_column, filters=None, date_from=None, date_to=None, after=None):
+    """SQL and parameters for every row of a KeysetQuery matching the filters.
+
+    ``date_from`` and ``date_to`` are inclusive ISO dates compared against
+    ``date_column`` (None if the query has no date). ``after`` is an
+    optional keyset cursor to continue from.
+    """
+    start = parse_date(date_from, "from")
+    end = parse_date(date_to, "to")
+    extra, extra_params = [], []
+    if start or end:
+        if date_column is None:
+            raise ExportError("Date filters are not available for this table.")
+        if start:
+            extra.append(f"{date_column} >= ?")
+            extra_params.append(start.isoformat())
+        if end:
+            extra.append(f"{date_column} < ?")
+            extra_params.append((end + datetime.timedelta(days=1)).isoformat())
+    return query.select(filters, extra, extra_params, after=after)
+
+
+def export_query(repo, dataset, filters=None, date_from=None, date_to=None):
+    """SQL and parameters selecting every row of ``dataset`` that matches."""
+    if dataset not in EXPORT_DATASETS:
+        raise ExportError(f"Unknown dataset: {dataset}. Choose from {', '.join(EXPORT_DATASETS)}.")
+    attribute, date_column = EXPORT_DATASETS[dataset]
+    if dataset == "predictions" and not repo.capabilities.has_timestamp:
+        date_column = None
+    return filtered_query(getattr(repo, attribute), date_column, filters, date_from, date_to)
+
+
+def iter_chunks(sql, params, chunk_rows=EXPORT_CHUNK_ROWS, path=DB_PATH):
+    """Yield ``(column names, rows)`` blocks of at most ``chunk_rows`` rows."""
+    conn = connect(path)
+    try:
+        cursor = conn.execute(sql, params)
+        columns = [description[0] for description in cursor.description]
+        rows = cursor.fetchmany(chunk_rows)
+        if not rows:
+            yield columns, []
+        while rows:
+            yield columns, rows
+            rows = cursor.fetchmany(chunk_rows)
+    finally:
+        conn.close()
+
+
+def csv_stream(chunks):
+    """CSV text, one piece per chunk (header first)."""
+    header_written = False
+    for columns, rows in chunks:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if not header_written:
+            writer.writerow(columns)
+            header_written = True
+        writer.writerows(rows)
+        yield buffer.getvalue().encode("utf-8")
+
+
+class _DrainSink(io.RawIOBase):
+    """Write-only file object whose contents are handed out as they arrive."""
+
+    def __init__(self):
+        self._pieces = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._pieces.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b"".join(self._pieces)
+        self._pieces = []
+        return data
+
+
+def _parquet_schema(columns):
+    fields = []
+    for name in columns:
+        if name in PARQUET_INT_COLUMNS:
+            fields.append(pa.field(name, pa.int64()))
+        elif name in PARQUET_FLOAT_COLUMNS:
+            fields.append(pa.field(name, pa.float64()))
+        else:
+            fields.append(pa.field(name, pa.string()))
+    return pa.schema(fields)
+
+
+def parquet_stream(chunks):
+    """Parquet bytes, one row group per chunk, flushed as each is written."""
+    sink = _DrainSink()
+    writer = None
+    schema = None
+    for columns, rows in chunks:
+        if writer is None:
+            schema = _parquet_schema(columns)
+            writer = pq.ParquetWriter(sink, schema)
+        values = list(zip(*rows)) if rows else [[] for _ in columns]
+        arrays = [
+            pa.array([None if v is None else str(v) for v in column], type=field.type)
+            if pa.types.is_string(field.type) else pa.array(column, type=field.type)
+            for field, column in zip(schema, values)
+        ]
+        writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+        yield sink.drain()
+    if writer is not None:
+        writer.close()
+        yield sink.drain()
+
+
+def check_format(fmt):
+    """Raise ExportError unless ``fmt`` can be written here."""
+    if fmt not in EXPORT_FORMATS:
+        raise ExportError(f"Unknown format: {fmt}. Choose from {', '.join(EXPORT_FORMATS)}.")
+    if fmt == "parquet" and pq is None:
+        raise ExportError("Parquet export requires the pyarrow package.")
+
+
+def stream_export(repo, dataset, fmt, filters=None, date_from=None, date_to=None,
+                  chunk_rows=EXPORT_CHUNK_ROWS, path=DB_PATH):
+    """Validate the request and return a generator of export bytes.
+
+    Raises ExportError up front (before any output) for bad arguments.
+    """
+    check_format(fmt)
+    sql, params = export_query(repo, dataset, filters, date_from, date_to)
+    chunks = iter_chunks(sql, params, chunk_rows, path)
+    return csv_stream(chunks) if fmt == "csv" else parquet_stream(chunks)
+
+
+def write_export(out, repo, dataset, fmt, filters=None, date_from=None, date_to=None,
+                 chunk_rows=EXPORT_CHUNK_ROWS, path=DB_PATH):
+    """Write an export to the binary file ``out``; returns the number of bytes."""
+    written = 0
+    for piece in stream_export(repo, dataset, fmt, filters, date_from, date_to, chunk_rows, path):
+        out.write(piece)
+        written += len(piece)
+    return written
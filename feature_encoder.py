@@ -0,0 +1,135 @@
+import numpy as np
+
+# Order of the numeric inputs accepted by FeatureEncoder.encode()
+NUMERIC_INPUTS = ["Area", "Production", "Annual_Rainfall", "Fertilizer", "Pesticide"]
+
+# Form / database field names for the same inputs, used by encode_batch()
+NUMERIC_FIELDS = ["area", "production", "annual_rainfall", "fertilizer", "pesticide"]
+CATEGORY_FIELDS = ["crop", "season", "state"]
+
+# ---------- DICTIONARIES ----------
+# Category values accepted by the form, batch uploads and the encoder
+crop_dict = {
+    'Arecanut': 0, 'Arhar/Tur': 1, 'Bajra': 2, 'Banana': 3, 'Barley': 4,
+    'Black pepper': 5, 'Cardamom': 6, 'Cashewnut': 7, 'Castor seed': 8,
+    'Coconut ': 9, 'Coriander': 10, 'Cotton(lint)': 11, 'Cowpea(Lobia)': 12,
+    'Dry chillies': 13, 'Garlic': 14, 'Ginger': 15, 'Gram': 16, 'Groundnut': 17,
+    'Guar seed': 18, 'Horse-gram': 19, 'Jowar': 20, 'Jute': 21, 'Khesari': 22,
+    'Linseed': 23, 'Maize': 24, 'Masoor': 25, 'Mesta': 26, 'Moong(Green Gram)': 27,
+    'Moth': 28, 'Niger seed': 29, 'Oilseeds total': 30, 'Onion': 31,
+    'Other  Rabi pulses': 32, 'Other Cereals': 33, 'Other Kharif pulses': 34,
+    'Other Summer Pulses': 35, 'Peas & beans (Pulses)': 36, 'Potato': 37,
+    'Ragi': 38, 'Rapeseed &Mustard': 39, 'Rice': 40, 'Safflower': 41,
+    'Sannhamp': 42, 'Sesamum': 43, 'Small millets': 44, 'Soyabean': 45,
+    'Sugarcane': 46, 'Sunflower': 47, 'Sweet potato': 48, 'Tapioca': 49,
+    'Tobacco': 50, 'Turmeric': 51, 'Urad': 52, 'Wheat': 53, 'other oilseeds': 54
+}
+
+season_dict = {
+    'Autumn     ': 0, 'Kharif     ': 1, 'Rabi       ': 2,
+    'Summer     ': 3, 'Whole Year ': 4, 'Winter     ': 5
+}
+
+state_dict = {
+    'Andhra Pradesh': 0, 'Arunachal Pradesh': 1, 'Assam': 2, 'Bihar': 3,
+    'Chhattisgarh': 4, 'Delhi': 5, 'Goa': 6, 'Gujarat': 7, 'Haryana': 8,
+    'Himachal Pradesh': 9, 'Jammu and Kashmir': 10, 'Jharkhand': 11,
+    'Karnataka': 12, 'Kerala': 13, 'Madhya Pradesh': 14, 'Maharashtra': 15,
+    'Manipur': 16, 'Meghalaya': 17, 'Mizoram': 18, 'Nagaland': 19, 'Odisha': 20,
+    'Puducherry': 21, 'Punjab': 22, 'Sikkim': 23, 'Tamil Nadu': 24,
+    'Telangana': 25, 'Tripura': 26, 'Uttar Pradesh': 27, 'Uttarakhand': 28,
+    'West Bengal': 29
+}
+
+
+class FeatureEncoder:
+    """Precompiled one-hot encoder for the crop yield model.
+
+    Built once from the training feature names. Each Crop/Season/State value
+    is resolved ahead of time to its column position (or to ``None`` for the
+    baseline level that ``get_dummies(drop_first=True)`` dropped during
+    training), so encoding a request is a copy of a zeroed template row plus
+    a handful of item assignments.
+    """
+
+    def __init__(self, feature_names, crop_dict, season_dict, state_dict):
+        self.feature_names = list(feature_names)
+        positions = {name: i for i, name in enumerate(self.feature_names)}
+
+        # Numeric inputs the model was trained on (Pesticide is accepted but unused)
+        self.numeric_slots = [
+            (NUMERIC_INPUTS.index(name), positions[name])
+            for name in NUMERIC_INPUTS if name in positions
+        ]
+
+        self.crop_positions = self._category_positions("Crop", crop_dict, positions)
+        self.season_positions = self._category_positions("Season", season_dict, positions)
+        self.state_positions = self._category_positions("State", state_dict, positions)
+
+        self._template = np.zeros((1, len(self.feature_names)), dtype=np.float64)
+
+    @staticmethod
+    def _category_positions(prefix, values, positions):
+        """Map every known category value to its dummy column index."""
+        return {value: positions.get(f"{prefix}_{value}") for value in values}
+
+    @staticmethod
+    def _lookup(kind, table, value):
+        try:
+            return table[value]
+        except KeyError:
+            raise ValueError(f"Unknown {kind}: {value!r}")
+
+    def encode(self, area, production, annual_rainfall, fertilizer, pesticide,
+               crop, season, state):
+        """Encode one form submission into a (1, n_features) float64 row."""
+        numeric = (area, production, annual_rainfall, fertilizer, pesticide)
+        row = self._template.copy()
+        values = row[0]
+
+        for src, dst in self.numeric_slots:
+            values[dst] = numeric[src]
+
+        for kind, table, value in (("crop", self.crop_positions, crop),
+                                   ("season", self.season_positions, season),
+                                   ("state", self.state_positions, state)):
+            position = self._lookup(kind, table, value)
+            if position is not None:
+                values[position] = 1.0
+        return row
+
+    def encode_batch(self, frame):
+        """Encode a frame of many rows into an (n_rows, n_features) matrix.
+
+        ``frame`` uses the form field names (``area`` ... ``pesticide``,
+        ``crop``, ``season``, ``state``). All rows are encoded in one
+        vectorized pass: numeric columns are copied into their slots and
+        each category column is mapped to dummy positions with a single
+        scatter assignment.
+        """
+        n_rows = len(frame)
+        matrix = np.zeros((n_rows, len(self.feature_names)), dtype=np.float64)
+
+        for src, dst in self.numeric_slots:
+            matrix[:, dst] = frame[NUMERIC_FIELDS[src]].to_numpy(dtype=np.float64)
+
+        rows = np.arange(n_rows)
+        for kind, table in (("crop", self.crop_positions),
+                            ("season", self.season_positions),
+                            ("state", self.state_positions)):
+            values = frame[kind]
+            unknown = ~values.isin(list(table))
+            if unknown.any():
+                raise ValueError(f"Unknown {kind}: {values[unknown].iloc[0]!r}")
+
+            # Baseline levels map to -1 and leave their row untouched
+            lookup = {value: (-1 if pos is None else pos) for value, pos in table.items()}
+            positions = values.map(lookup).to_numpy(dtype=np.int64)
+            hit = positions >= 0
+            matrix[rows[hit], positions[hit]] = 1.0
+        return matrix
+
+
+def build_feature_encoder(feature_names):
+    """Encoder for the model's features over the known category values."""
+    return FeatureEncoder(feature_names, crop_dict, season_dict, state_dict)
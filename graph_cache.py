@@ -0,0 +1,121 @@
+import os
+import threading
+import traceback
+from collections import OrderedDict, namedtuple
+
+import matplotlib.image as mpimg
+
+from plotting import feature_graph_png
+
+BACKGROUND_PATH = os.path.join("static", "crop_bg.png")
+
+# Per (x, y) pair: group labels, group means and the y range used for the background
+Aggregate = namedtuple("Aggregate", ["labels", "means", "y_min", "y_max"])
+
+
+def compute_aggregates(snapshot):
+    """Group-by mean of every numerical column over every categorical column."""
+    df = snapshot.df
+    aggregates = {}
+    for x in snapshot.categorical_cols:
+        grouped = df.groupby(x, observed=True)[snapshot.numerical_cols].mean()
+        labels = [str(label) for label in grouped.index]
+        for y in snapshot.numerical_cols:
+            aggregates[(x, y)] = Aggregate(
+                labels=labels,
+                means=grouped[y].to_numpy(),
+                y_min=float(df[y].min()),
+                y_max=float(df[y].max())
+            )
+    return aggregates
+
+
+class GraphCache:
+    """Precomputed feature-graph aggregates plus an LRU cache of rendered PNGs.
+
+    Aggregates for every categorical x numerical pair are rebuilt when the
+    dataset store loads a new snapshot, and the PNG cache is dropped at the
+    same time, so a repeated request for the same pair is a dict lookup.
+    If a rebuild fails the aggregates stay marked stale and the next access
+    retries it.
+    """
+
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self._aggregates = {}
+        self._version = None
+        self._snapshot = None   # set while the aggregates do not match it
+        self._pngs = OrderedDict()
+        self._background = None
+        self._background_loaded = False
+
+    def on_dataset_loaded(self, snapshot):
+        """Dataset store listener: invalidate everything, then recompute the aggregates."""
+        with self._lock:
+            self._aggregates = {}
+            self._version = None
+            self._snapshot = snapshot
+            self._pngs.clear()
+        self._rebuild()
+
+    def _rebuild(self):
+        with self._rebuild_lock:
+            snapshot = self._snapshot
+            if snapshot is None:
+                return
+            aggregates = compute_aggregates(snapshot)
+            with self._lock:
+                # A newer snapshot may have arrived meanwhile; it rebuilds itself
+                if self._snapshot is snapshot:
+                    self._aggregates = aggregates
+                    self._version = snapshot.version
+                    self._snapshot = None
+        print(f"DEBUG: Precomputed {len(aggregates)} graph aggregates for dataset version {snapshot.version}")
+
+    def has_pair(self, x, y):
+        if self._snapshot is not None:
+            try:
+                self._rebuild()
+            except Exception as e:
+                print(f"DEBUG: Graph aggregates rebuild failed: {e}")
+                traceback.print_exc()
+                return False
+        return (x, y) in self._aggregates
+
+    def png(self, x, y):
+        """Return the PNG bytes for the (x, y) graph, rendering on a cache miss."""
+        if self._snapshot is not None:
+            self._rebuild()   # a failure here is a server error, not a missing pair
+        with self._lock:
+            key = (self._version, x, y)
+            cached = self._pngs.get(key)
+            if cached is not None:
+                self._pngs.move_to_end(key)
+                return cached
+            aggregate = self._aggregates.get((x, y))
+
+        if aggregate is None:
+            raise KeyError(f"No aggregate for {y} vs {x}")
+
+        data = self._render(x, y, aggregate)
+        with self._lock:
+            if key[0] == self._version:
+                self._pngs[key] = data
+                self._pngs.move_to_end(key)
+                while len(self._pngs) > self.max_entries:
+                    self._pngs.popitem(last=False)
+        return data
+
+    def _load_background(self):
+        if not self._background_loaded:
+            if os.path.exists(BACKGROUND_PATH):
+                self._background = mpimg.imread(BACKGROUND_PATH)
+            self._background_loaded = True
+        return self._background
+
+    def _render(self, x, y, aggregate):
+        return feature_graph_png(x, y, aggregate.labels, aggregate.means,
+                                 aggregate.y_min, aggregate.y_max,
+                                 background=self._load_background())
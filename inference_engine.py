@@ -0,0 +1,348 @@
+import json
+import os
+import shutil
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from metrics import metrics
+
+# ---------- INFERENCE ENGINE ----------
+# The fitted PowerTransformer and RandomForestRegressor compiled into plain
+# NumPy arrays: one vectorized Yeo-Johnson + standardize step, then every
+# tree walked level by level over a single contiguous node table. This skips
+# sklearn's per-call input validation, joblib dispatch and Python loop over
+# estimators, which dominate the cost of scoring one form submission.
+
+# (rows x trees) node indices held in memory at once while traversing
+CHUNK_ELEMENTS = 1 << 20
+
+# Above this many rows sklearn's compiled tree code beats level-by-level
+# NumPy traversal, so large batches use the original forest when available
+FLAT_MAX_ROWS = 1000
+
+# Drop (row, tree) pairs that reached a leaf once per this many levels
+LEAF_CHECK_EVERY = 4
+
+# ---------- BOUNDED-LATENCY MODE ----------
+# Trees evaluated before the standard-error stopping rule may fire
+MIN_TREES = 8
+
+# Stop once every row's standard error is at most this fraction of its mean
+MAX_STDERR_RATIO = 0.01
+
+# Two-sided 95% normal interval
+CI_Z = 1.96
+
+# Arrays written by InferenceEngine.save()
+SAVED_ARRAYS = ("lambdas", "mean", "scale", "feature", "threshold", "left", "right", "value", "roots")
+
+# save_mapped(): one .npy per array (including the derived child table and
+# leaf mask) plus a JSON file for the scalars, so load_mapped() can
+# memory-map every node array instead of building private copies
+MAPPED_ARRAYS = SAVED_ARRAYS + ("children", "is_leaf")
+MAPPED_META_FILE = "engine.json"
+
+# Per row: running mean over the trees used, its standard error, the
+# confidence interval and how many trees were evaluated
+BoundedPrediction = namedtuple(
+    "BoundedPrediction", ["mean", "stderr", "ci_low", "ci_high", "trees_used", "n_trees", "elapsed_ms"]
+)
+
+
+def _float_dtype(array):
+    return np.float32 if np.asarray(array).dtype == np.float32 else np.float64
+
+
+class InferenceEngine:
+    """Fused Yeo-Johnson transform and random forest evaluator.
+
+    Leaves point to themselves (feature 0, threshold +inf), so walking a
+    fixed number of levels leaves every (row, tree) pair on its leaf.
+    Thresholds are compared against float32 inputs exactly like sklearn's
+    tree code, so predictions match ``model.predict`` up to summation order.
+    ``forest`` (the source sklearn model, optional) scores batches larger
+    than ``FLAT_MAX_ROWS`` after the fused transform.
+
+    Node indices are stored as int32. ``threshold`` and ``value`` keep
+    float32 when given float32 (compacted models, see compact_model.py)
+    and are float64 otherwise. ``feature_names`` is optional metadata
+    carried through ``save()``/``load()``.
+    """
+
+    def __init__(self, lambdas, mean, scale, feature, threshold, left, right, value, roots, max_depth,
+                 forest=None, feature_names=None, children=None, is_leaf=None):
+        self.lambdas = np.asarray(lambdas, dtype=np.float64)
+        self.mean = None if mean is None else np.asarray(mean, dtype=np.float64)
+        self.scale = None if scale is None else np.asarray(scale, dtype=np.float64)
+        self.feature = np.ascontiguousarray(feature, dtype=np.int32)
+        self.threshold = np.ascontiguousarray(threshold, dtype=_float_dtype(threshold))
+        self.left = np.ascontiguousarray(left, dtype=np.int32)
+        self.right = np.ascontiguousarray(right, dtype=np.int32)
+        self.value = np.ascontiguousarray(value, dtype=_float_dtype(value))
+        self.roots = np.ascontiguousarray(roots, dtype=np.int32)
+        self.max_depth = int(max_depth)
+        self.forest = forest
+        self.feature_names = None if feature_names is None else list(feature_names)
+
+        self.n_features = len(self.lambdas)
+        self.n_trees = len(self.roots)
+        self._is_leaf = self.left == np.arange(len(self.left)) if is_leaf is None else is_leaf
+        # children[2 * node] is the left child, children[2 * node + 1] the right
+        if children is None:
+            children = np.column_stack([self.left, self.right]).ravel()
+        self._children = np.ascontiguousarray(children, dtype=np.int32)
+
+        # Yeo-Johnson special cases, resolved once per feature
+        eps = np.finfo(np.float64).eps
+        self._lambda_zero = np.abs(self.lambdas) < eps
+        self._lambda_two = np.abs(self.lambdas - 2) <= eps
+        self._pos_lambda = np.where(self._lambda_zero, 1.0, self.lambdas)
+        self._neg_lambda = np.where(self._lambda_two, 1.0, 2 - self.lambdas)
+
+    @classmethod
+    def compile(cls, transformer, model):
+        """Build an engine from a fitted PowerTransformer and forest regressor."""
+        if transformer.method != "yeo-johnson":
+            raise ValueError(f"Unsupported power transform: {transformer.method}")
+        if getattr(model, "n_outputs_", 1) != 1:
+            raise ValueError("Only single-output forests are supported")
+
+        scaler = transformer._scaler if transformer.standardize else None
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            n = tree.node_count
+            own = np.arange(n)
+            leaf = tree.children_left == -1
+
+            features.append(np.where(leaf, 0, tree.feature))
+            thresholds.append(np.where(leaf, np.inf, tree.threshold))
+            lefts.append(np.where(leaf, own, tree.children_left) + offset)
+            rights.append(np.where(leaf, own, tree.children_right) + offset)
+            values.append(tree.value[:, 0, 0])
+            roots.append(offset)
+            max_depth = max(max_depth, tree.max_depth)
+            offset += n
+
+        return cls(
+            lambdas=transformer.lambdas_,
+            mean=None if scaler is None else scaler.mean_,
+            scale=None if scaler is None else scaler.scale_,
+            feature=np.concatenate(features),
+            threshold=np.concatenate(thresholds),
+            left=np.concatenate(lefts),
+            right=np.concatenate(rights),
+            value=np.concatenate(values),
+            roots=roots,
+            max_depth=max_depth,
+            forest=model
+        )
+
+    def save(self, path):
+        """Write the engine's arrays to an uncompressed .npz file."""
+        arrays = {name: getattr(self, name) for name in SAVED_ARRAYS if getattr(self, name) is not None}
+        if self.feature_names is not None:
+            arrays["feature_names"] = np.array(self.feature_names, dtype=str)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, max_depth=np.array(self.max_depth), **arrays)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        """Engine saved with ``save()`` (no sklearn forest attached)."""
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {name: data[name] if name in data else None for name in SAVED_ARRAYS}
+            feature_names = data["feature_names"].tolist() if "feature_names" in data else None
+            return cls(max_depth=int(data["max_depth"]), feature_names=feature_names, **arrays)
+
+    def save_mapped(self, directory):
+        """Write the arrays as .npy files for ``load_mapped()``; replaces nothing that exists."""
+        tmp = f"{directory}.tmp{os.getpid()}"
+        os.makedirs(tmp, exist_ok=True)
+        arrays = {name: getattr(self, name) for name in SAVED_ARRAYS}
+        arrays["children"], arrays["is_leaf"] = self._children, self._is_leaf
+        for name, array in arrays.items():
+            if array is not None:
+                np.save(os.path.join(tmp, f"{name}.npy"), np.ascontiguousarray(array))
+        with open(os.path.join(tmp, MAPPED_META_FILE), "w") as f:
+            json.dump({"max_depth": self.max_depth, "feature_names": self.feature_names}, f)
+        try:
+            os.replace(tmp, directory)
+        except OSError:
+            # Another worker wrote the same version first
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    @classmethod
+    def load_mapped(cls, directory, mmap_mode="r"):
+        """Engine whose node arrays are memory-mapped from ``save_mapped()`` output."""
+        with open(os.path.join(directory, MAPPED_META_FILE)) as f:
+            meta = json.load(f)
+        arrays = {}
+        for name in MAPPED_ARRAYS:
+            path = os.path.join(directory, f"{name}.npy")
+            arrays[name] = np.load(path, mmap_mode=mmap_mode) if os.path.exists(path) else None
+        return cls(max_depth=meta["max_depth"], feature_names=meta["feature_names"], **arrays)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.feature, self.threshold, self.left, self.right, self.value, self.roots,
+                                      self._children, self._is_leaf))
+
+    def transform(self, X):
+        """Yeo-Johnson with the fitted lambdas, then standardize (PowerTransformer.transform)."""
+        X = np.asarray(X, dtype=np.float64)
+        log1p_abs = np.log1p(np.abs(X))
+        with np.errstate(over="ignore", invalid="ignore"):
+            pos = np.where(self._lambda_zero, log1p_abs,
+                           np.expm1(self.lambdas * log1p_abs) / self._pos_lambda)
+            neg = np.where(self._lambda_two, -log1p_abs,
+                           -np.expm1((2 - self.lambdas) * log1p_abs) / self._neg_lambda)
+        out = np.where(X >= 0, pos, neg)
+        if self.mean is not None:
+            out -= self.mean
+            out /= self.scale
+        return out
+
+    def leaf_values(self, Z, trees=None):
+        """(rows, trees) leaf values for transformed rows ``Z``.
+
+        ``trees`` optionally selects a subset of tree indices (array or slice).
+        (row, tree) pairs that reach a leaf are dropped from the working set
+        every few levels, so deep but rare paths do not keep the whole batch
+        in the loop.
+        """
+        # sklearn trees compare float32 features against float64 thresholds
+        Z = np.ascontiguousarray(Z, dtype=np.float32)
+        roots = self.roots if trees is None else self.roots[trees]
+        n_rows, n_trees = len(Z), len(roots)
+        flat = Z.ravel()
+
+        # Tree-major order keeps consecutive lookups inside one tree's nodes
+        nodes = np.repeat(roots, n_rows)
+        active = np.arange(len(nodes), dtype=np.intp)
+        current = nodes.copy()
+        offsets = np.tile(np.arange(n_rows, dtype=np.intp) * Z.shape[1], n_trees)
+        for level in range(1, self.max_depth + 1):
+            go_right = ~(flat.take(offsets + self.feature.take(current)) <= self.threshold.take(current))
+            current = self._children.take(current * 2 + go_right)
+            if level % LEAF_CHECK_EVERY == 0:
+                done = self._is_leaf.take(current)
+                if done.any():
+                    nodes[active[done]] = current[done]
+                    keep = ~done
+                    active, current, offsets = active[keep], current[keep], offsets[keep]
+                    if not len(active):
+                        break
+        nodes[active] = current
+        return self.value.take(nodes).astype(np.float64, copy=False).reshape(n_trees, n_rows).T
+
+    def predict_transformed(self, Z):
+        Z = np.atleast_2d(Z)
+        if self.forest is not None and len(Z) > FLAT_MAX_ROWS:
+            return np.asarray(self.forest.predict(Z), dtype=np.float64).ravel()
+        chunk = max(1, CHUNK_ELEMENTS // self.n_trees)
+        out = np.empty(len(Z), dtype=np.float64)
+        for start in range(0, len(Z), chunk):
+            stop = start + chunk
+            out[start:stop] = self.leaf_values(Z[start:stop]).mean(axis=1)
+        return out
+
+    def predict(self, X):
+        """Yield for each row of the encoded (untransformed) feature matrix."""
+        with metrics.stage("transform"):
+            Z = self.transform(np.atleast_2d(X))
+        with metrics.stage("forest"):
+            return self.predict_transformed(Z)
+
+    def predict_bounded(self, X, budget_ms=None, max_stderr_ratio=MAX_STDERR_RATIO,
+                        min_trees=MIN_TREES, z=CI_Z):
+        """Evaluate trees incrementally until the estimate is tight or time runs out.
+
+        Trees are scored in growing blocks (``min_trees``, then doubling, but
+        never more than the remaining budget allows at the observed per-tree
+        cost) and merged into a running mean/variance per row (Chan et al.'s
+        parallel form of Welford's update). Evaluation stops when every row's standard
+        error is at most ``max_stderr_ratio`` of its mean (after ``min_trees``
+        trees; a ratio of 0 disables the rule), when ``budget_ms`` has elapsed,
+        or when the forest is exhausted. At least one block is always evaluated.
+        With neither a budget nor a ratio every tree is scored, and the mean is
+        the same value ``predict`` returns.
+        """
+        start = time.perf_counter()
+        deadline = None if budget_ms is None else start + budget_ms / 1000
+        with metrics.stage("transform"):
+            Z = self.transform(np.atleast_2d(X))
+        n_rows = len(Z)
+        forest_timer = metrics.timer("forest")
+
+        if deadline is None and max_stderr_ratio <= 0:
+            # Full forest, scored like predict_transformed so the means match
+            mean = np.empty(n_rows)
+            stderr = np.empty(n_rows)
+            chunk = max(1, CHUNK_ELEMENTS // self.n_trees)
+            for row in range(0, n_rows, chunk):
+                values = self.leaf_values(Z[row:row + chunk])
+                mean[row:row + chunk] = values.mean(axis=1)
+                if self.n_trees > 1:
+                    stderr[row:row + chunk] = values.std(axis=1, ddof=1) / np.sqrt(self.n_trees)
+            if self.n_trees == 1:
+                stderr[:] = np.inf
+            forest_timer.stop()
+            return BoundedPrediction(
+                mean=mean,
+                stderr=stderr,
+                ci_low=mean - z * stderr,
+                ci_high=mean + z * stderr,
+                trees_used=np.full(n_rows, self.n_trees),
+                n_trees=self.n_trees,
+                elapsed_ms=(time.perf_counter() - start) * 1000
+            )
+
+        count = 0
+        mean = np.zeros(n_rows)
+        m2 = np.zeros(n_rows)
+        block = max(1, min(min_trees, self.n_trees))
+        while count < self.n_trees:
+            stop = min(count + block, self.n_trees)
+            block_start = time.perf_counter()
+            values = self.leaf_values(Z, trees=slice(count, stop))
+            seconds_per_tree = (time.perf_counter() - block_start) / (stop - count)
+            size = stop - count
+            block_mean = values.mean(axis=1)
+            block_m2 = ((values - block_mean[:, None]) ** 2).sum(axis=1)
+            delta = block_mean - mean
+            total = count + size
+            mean += delta * (size / total)
+            m2 += block_m2 + delta ** 2 * (count * size / total)
+            count = total
+            block *= 2
+
+            if count >= self.n_trees:
+                break
+            if max_stderr_ratio > 0 and count >= min_trees and count > 1:
+                stderr = np.sqrt(m2 / (count - 1) / count)
+                if np.all(stderr <= max_stderr_ratio * np.abs(mean)):
+                    break
+            if deadline is not None:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                # Do not start a block that would clearly overrun the budget
+                block = max(1, min(block, int(remaining / max(seconds_per_tree, 1e-9))))
+
+        forest_timer.stop()
+        stderr = np.sqrt(m2 / (count - 1) / count) if count > 1 else np.full(n_rows, np.inf)
+        return BoundedPrediction(
+            mean=mean,
+            stderr=stderr,
+            ci_low=mean - z * stderr,
+            ci_high=mean + z * stderr,
+            trees_used=np.full(n_rows, count),
+            n_trees=self.n_trees,
+            elapsed_ms=(time.perf_counter() - start) * 1000
+        )
@@ -0,0 +1,195 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from db import get_db_connection
+
+# ---------- BACKGROUND JOBS ----------
+# Heavy work (batch scoring, report rendering, exports) runs on small thread
+# pools instead of the request thread. Each kind of job is assigned to a
+# lane; a lane's worker count caps how much of the CPU it can take, so a
+# burst of batch uploads cannot starve logins and page views. Job state is
+# kept in the jobs table (migration 6) so any worker process can answer a
+# status poll; results are files under JOB_RESULTS_DIR.
+
+JOB_RESULTS_DIR = "job_results"
+
+# Lane -> max concurrent jobs
+JOB_LANES = {
+    "cpu": max(1, (os.cpu_count() or 2) // 2),
+    "io": 2,
+}
+
+# Jobs waiting or running per lane before submit() refuses new work
+MAX_PENDING_PER_LANE = 32
+
+# Finished jobs (and their result files) are deleted after this long
+JOB_RESULT_TTL_SECONDS = 24 * 3600
+PRUNE_INTERVAL_SECONDS = 600
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+class JobQueueFull(RuntimeError):
+    """Raised when a lane already has MAX_PENDING_PER_LANE jobs."""
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+def fail_interrupted(conn):
+    """Mark jobs whose worker process no longer exists as failed."""
+    rows = conn.execute("SELECT id, pid FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)).fetchall()
+    dead = [(row[0],) for row in rows if row[1] is None or not _pid_alive(row[1])]
+    if dead:
+        with conn:
+            conn.executemany("""
+                UPDATE jobs SET status = 'failed', error = 'Interrupted by a server restart.',
+                    finished_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """, dead)
+    return len(dead)
+
+
+class JobQueue:
+    """Thread-pool job runner with state in SQLite.
+
+    Register a handler per job kind with ``register(kind, handler, lane)``.
+    A handler is called as ``handler(params, payload, out)`` on a pool
+    thread, writes its result to the binary file ``out`` and returns the
+    result's mimetype. ``payload`` is an in-memory object passed through
+    from ``submit()`` (e.g. a validated DataFrame) and is not persisted.
+    """
+
+    def __init__(self, results_dir=JOB_RESULTS_DIR, lanes=None):
+        self.results_dir = results_dir
+        self.lanes = dict(lanes or JOB_LANES)
+        self._handlers = {}
+        self._executors = {}
+        self._pending = {lane: 0 for lane in self.lanes}
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+
+    def register(self, kind, handler, lane="cpu"):
+        if lane not in self.lanes:
+            raise ValueError(f"Unknown job lane: {lane}")
+        self._handlers[kind] = (handler, lane)
+
+    def _executor(self, lane):
+        # Pools start lazily and are recreated after a fork
+        key = (lane, os.getpid())
+        with self._lock:
+            executor = self._executors.get(key)
+            if executor is None:
+                executor = self._executors[key] = ThreadPoolExecutor(
+                    max_workers=self.lanes[lane], thread_name_prefix=f"jobs-{lane}")
+        return executor
+
+    def submit(self, kind, params=None, payload=None, owner=None):
+        """Queue a job and return its id. Raises JobQueueFull when the lane is busy."""
+        handler, lane = self._handlers[kind]
+        with self._lock:
+            if self._pending[lane] >= MAX_PENDING_PER_LANE:
+                raise JobQueueFull(f"Too many {lane} jobs in progress, try again later.")
+            self._pending[lane] += 1
+
+        job_id = uuid.uuid4().hex
+        params = params or {}
+        try:
+            conn = get_db_connection()
+            with conn:
+                conn.execute(
+                    "INSERT INTO jobs (id, kind, owner, status, params, pid) VALUES (?, ?, ?, ?, ?, ?)",
+                    (job_id, kind, owner, QUEUED, json.dumps(params), os.getpid())
+                )
+            self._executor(lane).submit(self._run, job_id, handler, lane, params, payload)
+        except Exception:
+            with self._lock:
+                self._pending[lane] -= 1
+            raise
+
+        print(f"DEBUG: Queued {kind} job {job_id} on the {lane} lane")
+        self._maybe_prune(conn)
+        return job_id
+
+    def _run(self, job_id, handler, lane, params, payload):
+        conn = get_db_connection()
+        start = time.perf_counter()
+        os.makedirs(self.results_dir, exist_ok=True)
+        path = os.path.join(self.results_dir, job_id)
+        try:
+            with conn:
+                conn.execute("UPDATE jobs SET status = ?, started_at = CURRENT_TIMESTAMP WHERE id = ?",
+                             (RUNNING, job_id))
+            with open(path + ".part", "wb") as out:
+                mimetype = handler(params, payload, out)
+            os.replace(path + ".part", path)
+            with conn:
+                conn.execute("""
+                    UPDATE jobs SET status = ?, result_path = ?, result_mimetype = ?,
+                        finished_at = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                """, (DONE, path, mimetype, job_id))
+            print(f"DEBUG: Job {job_id} finished in {time.perf_counter() - start:.2f}s")
+        except Exception as e:
+            print(f"DEBUG: Job {job_id} failed: {e}")
+            if os.path.exists(path + ".part"):
+                os.remove(path + ".part")
+            try:
+                with conn:
+                    conn.execute("""
+                        UPDATE jobs SET status = ?, error = ?, finished_at = CURRENT_TIMESTAMP
+                        WHERE id = ?
+                    """, (FAILED, str(e), job_id))
+            except sqlite3.Error as db_error:
+                print(f"DEBUG: Could not record failure of job {job_id}: {db_error}")
+        finally:
+            with self._lock:
+                self._pending[lane] -= 1
+
+    def status(self, job_id):
+        """Job row as a dict, or None if there is no such job."""
+        row = get_db_connection().execute("""
+            SELECT id, kind, owner, status, params, error, result_path, result_mimetype,
+                   created_at, started_at, finished_at
+            FROM jobs WHERE id = ?
+        """, (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["params"] = json.loads(job["params"] or "{}")
+        return job
+
+    def _maybe_prune(self, conn):
+        now = time.time()
+        with self._lock:
+            if now - self._last_prune < PRUNE_INTERVAL_SECONDS:
+                return
+            self._last_prune = now
+        self.prune(conn)
+
+    def prune(self, conn=None, max_age_seconds=JOB_RESULT_TTL_SECONDS):
+        """Delete finished jobs older than ``max_age_seconds`` and their result files."""
+        conn = conn or get_db_connection()
+        cutoff = f"-{int(max_age_seconds)} seconds"
+        rows = conn.execute("""
+            SELECT id, result_path FROM jobs
+            WHERE status IN ('done', 'failed') AND finished_at < datetime('now', ?)
+        """, (cutoff,)).fetchall()
+        for row in rows:
+            if row[1] and os.path.exists(row[1]):
+                os.remove(row[1])
+        with conn:
+            conn.executemany("DELETE FROM jobs WHERE id = ?", [(row[0],) for row in rows])
+        return len(rows)
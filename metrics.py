@@ -0,0 +1,206 @@
+import threading
+import time
+from bisect import bisect_left
+
+# ---------- LATENCY METRICS ----------
+# Fixed-bucket histograms of request and per-stage durations, kept in
+# process memory and exposed in the Prometheus text format by /metrics.
+# An observation is a perf_counter_ns() difference, a bisect and a few
+# integer increments under a lock (a few microseconds), so the timers can
+# stay on in production. Each worker process keeps its own numbers.
+
+# Upper bucket bounds in seconds (a final +Inf bucket is implied)
+BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Stage timings recorded outside a request (e.g. background jobs)
+NO_ROUTE = "background"
+
+_local = threading.local()
+
+
+class Histogram:
+    """Cumulative fixed-bucket histogram of durations in seconds."""
+
+    __slots__ = ("counts", "count", "total")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+    def quantile(self, q):
+        """Estimate by linear interpolation inside the bucket (like histogram_quantile)."""
+        if not self.count:
+            return float("nan")
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                if i == len(BUCKETS):
+                    return BUCKETS[-1]
+                lower = BUCKETS[i - 1] if i else 0.0
+                return lower + (BUCKETS[i] - lower) * (rank - seen) / n
+            seen += n
+        return BUCKETS[-1]
+
+
+class Metrics:
+    """Request counters plus request and stage duration histograms."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}    # (route, method, status) -> count
+        self.latency = {}     # route -> Histogram
+        self.stages = {}      # (route, stage) -> Histogram
+
+    # ----- request scope -----
+    def begin_request(self, route):
+        """Label later stage timings in this thread with ``route``."""
+        _local.route = route or "unknown"
+        _local.start = time.perf_counter_ns()
+
+    def end_request(self, method, status):
+        route = getattr(_local, "route", None)
+        start = getattr(_local, "start", None)
+        if route is None or start is None:
+            return
+        seconds = (time.perf_counter_ns() - start) / 1e9
+        with self._lock:
+            key = (route, method, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            histogram = self.latency.get(route)
+            if histogram is None:
+                histogram = self.latency[route] = Histogram()
+            histogram.observe(seconds)
+        _local.route = _local.start = None
+
+    # ----- stages -----
+    def observe(self, stage, seconds, route=None):
+        key = (route or getattr(_local, "route", None) or NO_ROUTE, stage)
+        with self._lock:
+            histogram = self.stages.get(key)
+            if histogram is None:
+                histogram = self.stages[key] = Histogram()
+            histogram.observe(seconds)
+
+    def stage(self, name):
+        """``with metrics.stage(name):`` times the block as a stage of the current route."""
+        return _Timer(self, name)
+
+    def timer(self, name):
+        """Stopwatch for stages with early exits: call ``.stop()`` on the success path."""
+        return _Timer(self, name)
+
+    # ----- export -----
+    def snapshot(self):
+        with self._lock:
+            requests = dict(self.requests)
+            latency = {k: _copy(h) for k, h in self.latency.items()}
+            stages = {k: _copy(h) for k, h in self.stages.items()}
+        return requests, latency, stages
+
+    def summary(self):
+        """Per-route counts and p50/p95/p99 in milliseconds (for the admin pages)."""
+        _, latency, stages = self.snapshot()
+        describe = lambda h: {"count": h.count, **{f"p{int(q * 100)}_ms": round(h.quantile(q) * 1000, 3)
+                                                     for q in QUANTILES}}
+        return {
+            "routes": {route: describe(h) for route, h in sorted(latency.items())},
+            "stages": {f"{route}:{stage}": describe(h) for (route, stage), h in sorted(stages.items())},
+        }
+
+    def prometheus(self):
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        requests, latency, stages = self.snapshot()
+        lines = [
+            "# HELP crop_requests_total HTTP requests by route, method and status.",
+            "# TYPE crop_requests_total counter",
+        ]
+        for (route, method, status), count in sorted(requests.items()):
+            lines.append(f'crop_requests_total{{route="{_escape(route)}",method="{method}",'
+                         f'status="{status}"}} {count}')
+
+        lines += [
+            "# HELP crop_request_duration_seconds Request latency by route.",
+            "# TYPE crop_request_duration_seconds histogram",
+        ]
+        for route, histogram in sorted(latency.items()):
+            lines += _histogram_lines("crop_request_duration_seconds", f'route="{_escape(route)}"', histogram)
+
+        lines += [
+            "# HELP crop_request_latency_seconds Estimated request latency quantiles by route.",
+            "# TYPE crop_request_latency_seconds summary",
+        ]
+        for route, histogram in sorted(latency.items()):
+            labels = f'route="{_escape(route)}"'
+            for q in QUANTILES:
+                lines.append(f'crop_request_latency_seconds{{{labels},quantile="{q}"}} '
+                             f'{histogram.quantile(q):.6g}')
+            lines.append(f"crop_request_latency_seconds_sum{{{labels}}} {histogram.total:.6g}")
+            lines.append(f"crop_request_latency_seconds_count{{{labels}}} {histogram.count}")
+
+        lines += [
+            "# HELP crop_stage_duration_seconds Time spent in each stage of a route.",
+            "# TYPE crop_stage_duration_seconds histogram",
+        ]
+        for (route, stage), histogram in sorted(stages.items()):
+            lines += _histogram_lines("crop_stage_duration_seconds",
+                                      f'route="{_escape(route)}",stage="{_escape(stage)}"', histogram)
+        return "\n".join(lines) + "\n"
+
+
+class _Timer:
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+        self.start = time.perf_counter_ns()
+
+    def stop(self):
+        self.metrics.observe(self.name, (time.perf_counter_ns() - self.start) / 1e9)
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def _copy(histogram):
+    copy = Histogram()
+    copy.counts = list(histogram.counts)
+    copy.count = histogram.count
+    copy.total = histogram.total
+    return copy
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _histogram_lines(name, labels, histogram):
+    lines = []
+    cumulative = 0
+    for bound, count in zip(BUCKETS, histogram.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+    lines.append(f"{name}_sum{{{labels}}} {histogram.total:.6g}")
+    lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+    return lines
+
+
+# Shared instance used by the app and the modules it calls
+metrics = Metrics()
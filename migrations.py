@@ -0,0 +1,312 @@
+# ---------- SCHEMA MIGRATIONS ----------
+# Each migration runs once, inside its own transaction, and bumps
+# PRAGMA user_version to its number. Never edit a migration that has
+# shipped; append a new one instead.
+
+
+def _columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def _baseline(conn):
+    """Tables created by the original init_db(), plus columns added later."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            firstname TEXT NOT NULL,
+            lastname TEXT NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL
+        )
+    """)
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS user_sessions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            login_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            logout_time TIMESTAMP,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+    """)
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS predictions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            year INTEGER,
+            crop TEXT,
+            season TEXT,
+            state TEXT,
+            area REAL,
+            production REAL,
+            annual_rainfall REAL,
+            fertilizer REAL,
+            pesticide REAL,
+            yield_value REAL,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+    """)
+
+    columns = _columns(conn, "predictions")
+    if "year" not in columns:
+        conn.execute("ALTER TABLE predictions ADD COLUMN year INTEGER")
+
+    # Older databases recorded the time in created_at. SQLite cannot add a
+    # column with a CURRENT_TIMESTAMP default, so backfill it and let a
+    # trigger stamp new rows.
+    if "timestamp" not in columns:
+        conn.execute("ALTER TABLE predictions ADD COLUMN timestamp TIMESTAMP")
+        if "created_at" in columns:
+            conn.execute("UPDATE predictions SET timestamp = created_at")
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS predictions_default_timestamp
+            AFTER INSERT ON predictions
+            WHEN NEW.timestamp IS NULL
+            BEGIN
+                UPDATE predictions SET timestamp = CURRENT_TIMESTAMP WHERE id = NEW.id;
+            END
+        """)
+
+
+def _hot_path_indexes(conn):
+    """Indexes for the admin dashboard, logout and crop statistics queries."""
+    # Predictions per user (admin user stats join), newest first
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_predictions_user_timestamp ON predictions(user_id, timestamp)")
+    # Prediction history ordered by time
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_predictions_timestamp ON predictions(timestamp, id)")
+    # GROUP BY crop counts, answered from the index alone
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_predictions_crop ON predictions(crop)")
+    # logout(): the user's latest open session
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_user_sessions_user_open ON user_sessions(user_id, logout_time, login_time)")
+    # Session history ordered by login time
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_user_sessions_login_time ON user_sessions(login_time, id)")
+    conn.execute("ANALYZE")
+
+
+def _admin_filter_indexes(conn):
+    """Indexes for the paginated admin dashboard filters (newest first)."""
+    # Filtered prediction pages; (crop, timestamp) also covers GROUP BY crop
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_predictions_crop_timestamp ON predictions(crop, timestamp)")
+    conn.execute("DROP INDEX IF EXISTS idx_predictions_crop")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_predictions_state_timestamp ON predictions(state, timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_predictions_season_timestamp ON predictions(season, timestamp)")
+    # Sessions filtered by user; also answers per-user visit count / last login
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_user_sessions_user_login ON user_sessions(user_id, login_time)")
+    conn.execute("ANALYZE")
+
+
+def _summary_tables(conn):
+    """Admin statistics kept up to date by triggers instead of GROUP BY scans."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS crop_prediction_counts (
+            crop TEXT PRIMARY KEY,
+            prediction_count INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_crop_prediction_counts_count ON crop_prediction_counts(prediction_count)")
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS user_stats (
+            user_id INTEGER PRIMARY KEY,
+            visit_count INTEGER NOT NULL DEFAULT 0,
+            prediction_count INTEGER NOT NULL DEFAULT 0,
+            last_login TIMESTAMP,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+    """)
+
+    # ----- predictions -> crop_prediction_counts, user_stats.prediction_count -----
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS predictions_stats_insert
+        AFTER INSERT ON predictions
+        BEGIN
+            INSERT INTO crop_prediction_counts (crop, prediction_count) VALUES (NEW.crop, 1)
+            ON CONFLICT(crop) DO UPDATE SET prediction_count = prediction_count + 1;
+            INSERT INTO user_stats (user_id, prediction_count)
+            SELECT NEW.user_id, 1 WHERE NEW.user_id IS NOT NULL
+            ON CONFLICT(user_id) DO UPDATE SET prediction_count = prediction_count + 1;
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS predictions_stats_delete
+        AFTER DELETE ON predictions
+        BEGIN
+            UPDATE crop_prediction_counts SET prediction_count = prediction_count - 1 WHERE crop = OLD.crop;
+            UPDATE user_stats SET prediction_count = prediction_count - 1 WHERE user_id = OLD.user_id;
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS predictions_stats_update
+        AFTER UPDATE OF crop, user_id ON predictions
+        BEGIN
+            UPDATE crop_prediction_counts SET prediction_count = prediction_count - 1 WHERE crop = OLD.crop;
+            INSERT INTO crop_prediction_counts (crop, prediction_count) VALUES (NEW.crop, 1)
+            ON CONFLICT(crop) DO UPDATE SET prediction_count = prediction_count + 1;
+            UPDATE user_stats SET prediction_count = prediction_count - 1 WHERE user_id = OLD.user_id;
+            INSERT INTO user_stats (user_id, prediction_count)
+            SELECT NEW.user_id, 1 WHERE NEW.user_id IS NOT NULL
+            ON CONFLICT(user_id) DO UPDATE SET prediction_count = prediction_count + 1;
+        END
+    """)
+
+    # ----- user_sessions -> user_stats.visit_count / last_login -----
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS user_sessions_stats_insert
+        AFTER INSERT ON user_sessions
+        BEGIN
+            INSERT INTO user_stats (user_id, visit_count, last_login)
+            SELECT NEW.user_id, 1, NEW.login_time WHERE NEW.user_id IS NOT NULL
+            ON CONFLICT(user_id) DO UPDATE SET
+                visit_count = visit_count + 1,
+                last_login = CASE
+                    WHEN last_login IS NULL OR excluded.last_login > last_login THEN excluded.last_login
+                    ELSE last_login
+                END;
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS user_sessions_stats_delete
+        AFTER DELETE ON user_sessions
+        BEGIN
+            UPDATE user_stats SET
+                visit_count = visit_count - 1,
+                last_login = (SELECT MAX(login_time) FROM user_sessions WHERE user_id = OLD.user_id)
+            WHERE user_id = OLD.user_id;
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS users_stats_delete
+        AFTER DELETE ON users
+        BEGIN
+            DELETE FROM user_stats WHERE user_id = OLD.id;
+        END
+    """)
+
+    # ----- Backfill from existing history -----
+    conn.execute("DELETE FROM crop_prediction_counts")
+    conn.execute("""
+        INSERT INTO crop_prediction_counts (crop, prediction_count)
+        SELECT crop, COUNT(*) FROM predictions GROUP BY crop
+    """)
+    conn.execute("DELETE FROM user_stats")
+    conn.execute("""
+        INSERT INTO user_stats (user_id, visit_count, prediction_count, last_login)
+        SELECT
+            u.id,
+            (SELECT COUNT(*) FROM user_sessions us WHERE us.user_id = u.id),
+            (SELECT COUNT(*) FROM predictions p WHERE p.user_id = u.id),
+            (SELECT MAX(us.login_time) FROM user_sessions us WHERE us.user_id = u.id)
+        FROM users u
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_user_stats_prediction_count ON user_stats(prediction_count, user_id)")
+
+
+def _prediction_cache(conn):
+    """Prediction results shared between workers (see prediction_cache.py)."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS prediction_cache (
+            model_version TEXT NOT NULL,
+            feature_key BLOB NOT NULL,
+            yield_value REAL NOT NULL,
+            PRIMARY KEY (model_version, feature_key)
+        )
+    """)
+
+
+def _jobs(conn):
+    """Background job state shared by all workers (see jobs.py)."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            owner TEXT,
+            status TEXT NOT NULL DEFAULT 'queued',
+            params TEXT,
+            pid INTEGER,
+            result_path TEXT,
+            result_mimetype TEXT,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+    """)
+    # Restart recovery (queued/running) and pruning (finished, oldest first)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_finished ON jobs(status, finished_at)")
+
+
+def _prediction_trees_used(conn):
+    """Number of trees behind a budgeted (partial-forest) prediction; NULL = whole forest."""
+    if "trees_used" not in _columns(conn, "predictions"):
+        conn.execute("ALTER TABLE predictions ADD COLUMN trees_used INTEGER")
+
+
+def _backfill_prediction_timestamps(conn):
+    """Replace NULL prediction timestamps so keyset paging can compare them.
+
+    A NULL sort key never satisfies ``(timestamp, id) < (?, ?)``, which cut
+    admin pages short. Legacy rows get '' (still oldest, as NULL sorted),
+    and the trigger keeps new rows from storing NULL.
+    """
+    if "timestamp" not in _columns(conn, "predictions"):
+        return
+    conn.execute("UPDATE predictions SET timestamp = '' WHERE timestamp IS NULL")
+    # Same trigger as the baseline adds to databases that lacked the column
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS predictions_default_timestamp
+        AFTER INSERT ON predictions
+        WHEN NEW.timestamp IS NULL
+        BEGIN
+            UPDATE predictions SET timestamp = CURRENT_TIMESTAMP WHERE id = NEW.id;
+        END
+    """)
+
+
+MIGRATIONS = [
+    (1, "baseline schema", _baseline),
+    (2, "indexes for hot query paths", _hot_path_indexes),
+    (3, "indexes for admin dashboard filters", _admin_filter_indexes),
+    (4, "trigger-maintained admin statistics tables", _summary_tables),
+    (5, "shared prediction cache table", _prediction_cache),
+    (6, "background jobs table", _jobs),
+    (7, "trees_used column for partial-forest predictions", _prediction_trees_used),
+    (8, "backfill NULL prediction timestamps", _backfill_prediction_timestamps),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def run_migrations(conn, target=None):
+    """Apply every pending migration up to ``target`` (default: latest).
+
+    Returns the list of applied migration numbers. Each migration holds a
+    write lock for its duration, so concurrent workers starting up apply
+    it exactly once.
+    """
+    target = LATEST_VERSION if target is None else target
+    applied = []
+    for version, description, migrate in MIGRATIONS:
+        if version > target:
+            break
+        if schema_version(conn) >= version:
+            continue
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Another process may have applied it while we waited for the lock
+            if schema_version(conn) < version:
+                migrate(conn)
+                conn.execute(f"PRAGMA user_version = {version}")
+                applied.append(version)
+                print(f"DEBUG: Applied migration {version}: {description}")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    return applied
@@ -0,0 +1,262 @@
+import hashlib
+import os
+import shutil
+import threading
+import time
+
+import joblib
+import numpy as np
+
+from inference_engine import InferenceEngine
+
+# ---------- MODEL ARTIFACTS ----------
+MODEL_DIR = "models"
+MODEL_FILE = "random_forest_crop_yield.joblib"
+TRANSFORMER_FILE = "power_transformer_crop_yield.joblib"
+FEATURES_FILE = "crop_yield_feature_names.joblib"
+
+# Pruned float32 engine written by compact_model.py, served when the
+# registry is created with compact=True
+COMPACT_FILE = "compact_forest.npz"
+
+# Compiled engines of full models, cached per artifact version under the
+# model directory. Workers memory-map the node arrays from there, so the
+# engine is shared through the page cache like the joblib artifacts.
+ENGINE_CACHE_DIR = "engine_cache"
+
+# joblib memory-maps the numpy arrays it stored uncompressed, so forked
+# workers read them through the shared page cache instead of private copies.
+MMAP_MODE = "r"
+
+
+def _resident_bytes():
+    """Current resident set size of this process, or None if unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _artifact_version(paths):
+    """Short content-independent version id from file sizes and mtimes."""
+    digest = hashlib.sha1()
+    for path in paths:
+        st = os.stat(path)
+        digest.update(f"{os.path.basename(path)}:{st.st_size}:{st.st_mtime_ns}".encode())
+    return digest.hexdigest()[:12]
+
+
+class ModelBundle:
+    """One loaded model version: forest, transformer, feature names, encoder, engine.
+
+    Predictions go through ``engine``. ``model`` and ``transformer`` are only
+    kept when the registry was created with ``keep_forest=True`` (they are
+    None otherwise, and always for compact bundles).
+    """
+
+    def __init__(self, version, model_dir, model, transformer, feature_names, encoder, engine, stats,
+                 compact=False):
+        self.version = version
+        self.compact = compact
+        self.model_dir = model_dir
+        self.model = model
+        self.transformer = transformer
+        self.engine = engine
+        self.feature_names = feature_names
+        self.encoder = encoder
+        self.stats = stats
+
+
+class ModelRegistry:
+    """Lazily loaded, atomically swappable model artifacts.
+
+    ``current()`` loads the artifacts on first use (or returns the bundle
+    already loaded by ``warm_up()``). ``swap()`` loads a new version
+    completely before replacing the active bundle in one assignment, so
+    in-flight requests keep the bundle they started with and new requests
+    never see a half-loaded model.
+
+    With ``compact=True`` a model directory containing ``COMPACT_FILE`` is
+    served from that engine alone, without loading the sklearn artifacts.
+
+    Full models are compiled once per version into ``ENGINE_CACHE_DIR`` and
+    then memory-mapped; the sklearn forest is only loaded to compile (or,
+    with ``keep_forest=True``, kept for scoring batches above
+    ``FLAT_MAX_ROWS``).
+    """
+
+    def __init__(self, model_dir=MODEL_DIR, mmap_mode=MMAP_MODE, encoder_factory=None, compact=False,
+                 keep_forest=False):
+        self.model_dir = model_dir
+        self.mmap_mode = mmap_mode
+        self.encoder_factory = encoder_factory
+        self.compact = compact
+        self.keep_forest = keep_forest
+        self._bundle = None
+        self._lock = threading.Lock()
+        self._listeners = []
+
+    def add_listener(self, callback):
+        """Call ``callback(bundle)`` after every swap to a new model version."""
+        self._listeners.append(callback)
+
+    def _load_artifact(self, path, stats, mmap_mode=None):
+        rss_before = _resident_bytes()
+        start = time.perf_counter()
+        obj = joblib.load(path, mmap_mode=mmap_mode)
+        rss_after = _resident_bytes()
+        stats[os.path.basename(path)] = {
+            "load_seconds": round(time.perf_counter() - start, 4),
+            "file_bytes": os.path.getsize(path),
+            "resident_bytes": None if rss_before is None else max(rss_after - rss_before, 0),
+        }
+        return obj
+
+    def _load_compact(self, model_dir, path):
+        stats = {}
+        start = time.perf_counter()
+        engine = InferenceEngine.load(path)
+        stats[COMPACT_FILE] = {
+            "load_seconds": round(time.perf_counter() - start, 4),
+            "file_bytes": os.path.getsize(path),
+            "array_bytes": engine.nbytes,
+        }
+        feature_names = engine.feature_names
+        if feature_names is None:
+            feature_names = list(self._load_artifact(os.path.join(model_dir, FEATURES_FILE), stats))
+        encoder = self.encoder_factory(feature_names) if self.encoder_factory else None
+        bundle = ModelBundle(
+            version=_artifact_version([path]),
+            model_dir=model_dir,
+            model=None,
+            transformer=None,
+            feature_names=feature_names,
+            encoder=encoder,
+            engine=engine,
+            stats=stats,
+            compact=True
+        )
+        print(f"DEBUG: Loaded compact model version {bundle.version} from {model_dir}: {stats}")
+        return bundle
+
+    def _load_cached_engine(self, model_dir, version, stats):
+        cache_dir = os.path.join(model_dir, ENGINE_CACHE_DIR, version)
+        if not os.path.isdir(cache_dir):
+            return None
+        start = time.perf_counter()
+        try:
+            engine = InferenceEngine.load_mapped(cache_dir)
+        except (OSError, ValueError) as e:
+            print(f"DEBUG: Ignoring unreadable engine cache {cache_dir}: {e}")
+            return None
+        stats["inference_engine"] = {
+            "load_seconds": round(time.perf_counter() - start, 4),
+            "array_bytes": engine.nbytes,
+            "mapped": True,
+        }
+        return engine
+
+    def _compile_engine(self, model_dir, version, transformer, model, stats):
+        """Compile the forest, cache it for ``version`` and return the mapped copy."""
+        start = time.perf_counter()
+        engine = InferenceEngine.compile(transformer, model)
+        stats["inference_engine"] = {
+            "compile_seconds": round(time.perf_counter() - start, 4),
+            "array_bytes": engine.nbytes,
+            "mapped": False,
+        }
+        cache_root = os.path.join(model_dir, ENGINE_CACHE_DIR)
+        try:
+            os.makedirs(cache_root, exist_ok=True)
+            engine.save_mapped(os.path.join(cache_root, version))
+            mapped = InferenceEngine.load_mapped(os.path.join(cache_root, version))
+        except OSError as e:
+            # e.g. a read-only model directory: serve the private copy
+            print(f"DEBUG: Could not cache the compiled engine in {cache_root}: {e}")
+            return engine
+        for name in os.listdir(cache_root):
+            # Older versions only; other workers' in-progress writes end in .tmp<pid>
+            if name != version and ".tmp" not in name:
+                shutil.rmtree(os.path.join(cache_root, name), ignore_errors=True)
+        stats["inference_engine"]["mapped"] = True
+        return mapped
+
+    def load(self, model_dir=None):
+        """Load a bundle from ``model_dir`` without activating it."""
+        model_dir = model_dir or self.model_dir
+        if self.compact:
+            compact_path = os.path.join(model_dir, COMPACT_FILE)
+            if os.path.exists(compact_path):
+                return self._load_compact(model_dir, compact_path)
+            print(f"DEBUG: No {COMPACT_FILE} in {model_dir}, loading the full model")
+        paths = [os.path.join(model_dir, name) for name in (MODEL_FILE, TRANSFORMER_FILE, FEATURES_FILE)]
+        version = _artifact_version(paths)
+        stats = {}
+
+        model = transformer = None
+        engine = self._load_cached_engine(model_dir, version, stats)
+        if engine is None or self.keep_forest:
+            model = self._load_artifact(paths[0], stats, self.mmap_mode)
+            transformer = self._load_artifact(paths[1], stats, self.mmap_mode)
+        if engine is None:
+            engine = self._compile_engine(model_dir, version, transformer, model, stats)
+        if self.keep_forest:
+            engine.forest = model
+        else:
+            # The engine replaces the forest; don't keep a second copy of every node
+            model = transformer = None
+        feature_names = list(self._load_artifact(paths[2], stats))
+        encoder = self.encoder_factory(feature_names) if self.encoder_factory else None
+
+        bundle = ModelBundle(
+            version=version,
+            model_dir=model_dir,
+            model=model,
+            transformer=transformer,
+            feature_names=feature_names,
+            encoder=encoder,
+            engine=engine,
+            stats=stats
+        )
+        print(f"DEBUG: Loaded model version {bundle.version} from {model_dir}: {stats}")
+        return bundle
+
+    def current(self):
+        """Active bundle, loading it on first use."""
+        bundle = self._bundle
+        if bundle is None:
+            with self._lock:
+                if self._bundle is None:
+                    self._bundle = self.load()
+                bundle = self._bundle
+        return bundle
+
+    def warm_up(self):
+        """Eagerly load (e.g. before forking workers) and touch the model once."""
+        bundle = self.current()
+        bundle.engine.predict(np.zeros((1, len(bundle.feature_names))))
+        return bundle
+
+    def swap(self, model_dir=None):
+        """Load the artifacts in ``model_dir`` and make them the active version."""
+        bundle = self.load(model_dir)
+        with self._lock:
+            self._bundle = bundle
+            self.model_dir = bundle.model_dir
+        for callback in self._listeners:
+            callback(bundle)
+        return bundle
+
+    def info(self):
+        """Version and per-artifact load statistics of the active bundle."""
+        bundle = self._bundle
+        if bundle is None:
+            return {"loaded": False, "model_dir": self.model_dir}
+        return {
+            "loaded": True,
+            "version": bundle.version,
+            "model_dir": bundle.model_dir,
+            "compact": bundle.compact,
+            "artifacts": bundle.stats,
+        }
@@ -0,0 +1,238 @@
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+# ---------- IQR OUTLIER FILTER ----------
+# Rows are kept when every filtered column lies inside
+# [Q1 - factor * IQR, Q3 + factor * IQR]. By default all bounds come from
+# one quantile call on the full frame and are applied as a single boolean
+# mask. sequential=True reproduces the notebook's handle_outliers_iqr loop,
+# where each column's quartiles are taken over the rows that survived the
+# previous columns.
+#
+# For data that does not fit in memory, chunked_iqr_bounds() computes the
+# same (exact) quartiles from repeated passes over an iterator of chunks,
+# keeping only a fixed-size histogram per quantile between passes.
+
+# Columns the notebook filtered, in its order
+IQR_COLUMNS = ["Production", "Fertilizer", "Annual_Rainfall", "Area", "Pesticide"]
+IQR_FACTOR = 1.5
+
+# Histogram bins per quantile and pass when narrowing chunked quantiles
+HISTOGRAM_BINS = 4096
+
+# Once the range holding an order statistic has at most this many values,
+# the next pass collects and sorts them
+COLLECT_ROWS = 1 << 16
+
+CHUNK_ROWS = 100_000
+
+
+def _bounds_from_quartiles(q1, q3, factor):
+    iqr = q3 - q1
+    return q1 - factor * iqr, q3 + factor * iqr
+
+
+def iqr_bounds(df, columns=IQR_COLUMNS, factor=IQR_FACTOR):
+    """{column: (lower, upper)} from one vectorized quantile call."""
+    quartiles = df[list(columns)].quantile([0.25, 0.75])
+    return {
+        column: _bounds_from_quartiles(quartiles.at[0.25, column], quartiles.at[0.75, column], factor)
+        for column in columns
+    }
+
+
+def iqr_mask(df, bounds):
+    """Boolean array: True for rows inside every column's bounds (NaN is outside)."""
+    columns = list(bounds)
+    values = df[columns].to_numpy(dtype=np.float64)
+    lower = np.array([bounds[c][0] for c in columns])
+    upper = np.array([bounds[c][1] for c in columns])
+    return ((values >= lower) & (values <= upper)).all(axis=1)
+
+
+def sequential_iqr_bounds(df, columns=IQR_COLUMNS, factor=IQR_FACTOR):
+    """Bounds with the notebook's semantics, without copying the frame per column."""
+    bounds = {}
+    keep = np.ones(len(df), dtype=bool)
+    for column in columns:
+        values = df[column].to_numpy(dtype=np.float64)
+        q1, q3 = pd.Series(values[keep]).quantile([0.25, 0.75])
+        bounds[column] = _bounds_from_quartiles(q1, q3, factor)
+        low, high = bounds[column]
+        keep &= (values >= low) & (values <= high)
+    return bounds
+
+
+def filter_outliers(df, columns=IQR_COLUMNS, factor=IQR_FACTOR, sequential=False):
+    """``(filtered frame, bounds)``; the frame is indexed once with a single mask."""
+    if sequential:
+        bounds = sequential_iqr_bounds(df, columns, factor)
+    else:
+        bounds = iqr_bounds(df, columns, factor)
+    return df[iqr_mask(df, bounds)], bounds
+
+# ---------- CHUNKED (BOUNDED MEMORY) ----------
+def _lerp(a, b, t):
+    # numpy's linear interpolation, so results match DataFrame.quantile exactly
+    diff = b - a
+    return b - diff * (1 - t) if t >= 0.5 else a + diff * t
+
+
+class _OrderStatistic:
+    """Search state for the k-th smallest (0-based) value of one column."""
+
+    def __init__(self, column, k, low, high):
+        self.column = column
+        self.k = k
+        self.low = low          # every candidate lies in [low, high]
+        self.high = high
+        self.below = 0          # values smaller than low
+        self.count = None       # values in [low, high], known after a pass
+        self.value = None if low != high else low
+
+    def observe(self, values, counts, mins, maxs):
+        """Accumulate one chunk's in-range values into the histogram."""
+        values = values[(values >= self.low) & (values <= self.high)]
+        if self.count is not None and self.count <= COLLECT_ROWS:
+            counts.append(values)
+            return
+        edges = np.linspace(self.low, self.high, HISTOGRAM_BINS + 1)
+        bins = np.clip(np.searchsorted(edges, values, side="right") - 1, 0, HISTOGRAM_BINS - 1)
+        counts += np.bincount(bins, minlength=HISTOGRAM_BINS)
+        np.minimum.at(mins, bins, values)
+        np.maximum.at(maxs, bins, values)
+
+    def narrow(self, counts, mins, maxs):
+        """Move [low, high] to the bin that holds the k-th value."""
+        if isinstance(counts, list):
+            values = np.sort(np.concatenate(counts)) if counts else np.empty(0)
+            self.value = values[self.k - self.below]
+            return
+        cumulative = np.cumsum(counts)
+        target = np.searchsorted(cumulative, self.k - self.below, side="right")
+        self.below += int(cumulative[target - 1]) if target else 0
+        self.low, self.high = mins[target], maxs[target]
+        self.count = int(counts[target])
+        if self.low == self.high:
+            self.value = self.low
+
+    def new_state(self):
+        if self.count is not None and self.count <= COLLECT_ROWS:
+            return [], None, None
+        return (np.zeros(HISTOGRAM_BINS, dtype=np.int64),
+                np.full(HISTOGRAM_BINS, np.inf), np.full(HISTOGRAM_BINS, -np.inf))
+
+
+def _column_values(chunk, column, row_filter):
+    values = chunk[column].to_numpy(dtype=np.float64)
+    if row_filter is not None:
+        values = values[iqr_mask(chunk, row_filter)]
+    return values[~np.isnan(values)]
+
+
+def chunked_quantiles(chunk_source, columns, quantiles=(0.25, 0.75), row_filter=None):
+    """Exact linear-interpolation quantiles over chunks, in bounded memory.
+
+    ``chunk_source()`` must return a fresh iterable of DataFrames each time
+    it is called (e.g. ``lambda: pd.read_csv(path, chunksize=n)``); the data
+    is read once for counts and ranges, then once per narrowing pass.
+    ``row_filter`` is an optional bounds dict rows must satisfy to count.
+    Returns ``{column: [value per quantile]}``.
+    """
+    n = dict.fromkeys(columns, 0)
+    low = dict.fromkeys(columns, np.inf)
+    high = dict.fromkeys(columns, -np.inf)
+    for chunk in chunk_source():
+        for column in columns:
+            values = _column_values(chunk, column, row_filter)
+            if len(values):
+                n[column] += len(values)
+                low[column] = min(low[column], values.min())
+                high[column] = max(high[column], values.max())
+
+    # Each quantile interpolates between two neighbouring order statistics
+    positions = {}
+    searches = {}
+    for column in columns:
+        if n[column] == 0:
+            continue
+        for q in quantiles:
+            h = (n[column] - 1) * q
+            k = int(np.floor(h))
+            positions[column, q] = (k, min(k + 1, n[column] - 1), h - k)
+            for rank in positions[column, q][:2]:
+                if (column, rank) not in searches:
+                    searches[column, rank] = _OrderStatistic(column, rank, low[column], high[column])
+
+    pending = [s for s in searches.values() if s.value is None]
+    while pending:
+        states = [s.new_state() for s in pending]
+        for chunk in chunk_source():
+            cache = {}
+            for search, state in zip(pending, states):
+                if search.column not in cache:
+                    cache[search.column] = _column_values(chunk, search.column, row_filter)
+                search.observe(cache[search.column], *state)
+        for search, state in zip(pending, states):
+            search.narrow(*state)
+        pending = [s for s in pending if s.value is None]
+
+    result = {}
+    for column in columns:
+        result[column] = [
+            np.nan if n[column] == 0 else
+            _lerp(searches[column, positions[column, q][0]].value,
+                  searches[column, positions[column, q][1]].value,
+                  positions[column, q][2])
+            for q in quantiles
+        ]
+    return result
+
+
+def chunked_iqr_bounds(chunk_source, columns=IQR_COLUMNS, factor=IQR_FACTOR, sequential=False):
+    """Same bounds as iqr_bounds()/sequential_iqr_bounds(), from chunks."""
+    if not sequential:
+        quartiles = chunked_quantiles(chunk_source, list(columns))
+        return {c: _bounds_from_quartiles(*quartiles[c], factor) for c in columns}
+    bounds = {}
+    for column in columns:
+        q1, q3 = chunked_quantiles(chunk_source, [column], row_filter=dict(bounds) or None)[column]
+        bounds[column] = _bounds_from_quartiles(q1, q3, factor)
+    return bounds
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Remove IQR outliers from a CSV in bounded memory.")
+    parser.add_argument("input")
+    parser.add_argument("-o", "--output", required=True)
+    parser.add_argument("--columns", nargs="+", default=IQR_COLUMNS)
+    parser.add_argument("--factor", type=float, default=IQR_FACTOR)
+    parser.add_argument("--sequential", action="store_true",
+                        help="notebook semantics: each column's quartiles after filtering the previous ones")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    args = parser.parse_args(argv)
+
+    def chunk_source():
+        for chunk in pd.read_csv(args.input, chunksize=args.chunk_rows):
+            chunk.columns = chunk.columns.str.strip()
+            yield chunk
+
+    bounds = chunked_iqr_bounds(chunk_source, args.columns, args.factor, args.sequential)
+    kept = total = 0
+    with open(args.output, "w", newline="") as out:
+        for i, chunk in enumerate(chunk_source()):
+            filtered = chunk[iqr_mask(chunk, bounds)]
+            filtered.to_csv(out, header=(i == 0), index=False)
+            kept += len(filtered)
+            total += len(chunk)
+    for column, (low, high) in bounds.items():
+        print(f"{column}: [{low:.6g}, {high:.6g}]")
+    print(f"Kept {kept} of {total} rows")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+from collections import namedtuple
+
+# ---------- KEYSET PAGINATION ----------
+# Pages are addressed by the sort key of their first/last row instead of an
+# OFFSET, so fetching page N costs the same as page 1 when the sort key is
+# indexed.
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+Page = namedtuple("Page", ["rows", "next_cursor", "prev_cursor"])
+
+EMPTY_PAGE = Page(rows=[], next_cursor=None, prev_cursor=None)
+
+
+def encode_cursor(row, key_fields):
+    """Cursor string for ``row`` (values of ``key_fields`` joined by '|')."""
+    return "|".join("" if row[field] is None else str(row[field]) for field in key_fields)
+
+
+def decode_cursor(raw, key_types):
+    """Parse a cursor string back into typed key values, or None if invalid."""
+    if not raw:
+        return None
+    parts = raw.split("|", len(key_types) - 1)
+    if len(parts) != len(key_types):
+        return None
+    try:
+        return [cast(part) for cast, part in zip(key_types, parts)]
+    except ValueError:
+        return None
+
+
+def page_size(raw, default=PAGE_SIZE):
+    try:
+        return max(1, min(int(raw), MAX_PAGE_SIZE))
+    except (TypeError, ValueError):
+        return default
+
+
+class KeysetQuery:
+    """A paged SELECT with optional equality filters, compiled once per shape.
+
+    ``select_sql`` is a SELECT ... FROM ... JOIN ... without WHERE/ORDER BY,
+    ``key_columns`` the SQL expressions of the (indexed) sort key and
+    ``key_fields`` the matching result column names. ``filters`` maps a
+    filter name to a WHERE clause with one ``?`` placeholder.
+
+    The SQL text for each combination of active filters and paging
+    direction is built on first use and reused afterwards, so repeated
+    requests hit sqlite3's per-connection prepared statement cache.
+    """
+
+    def __init__(self, select_sql, key_columns, key_fields, key_types,
+                 filters=None, where=(), count_sql=None, descending=True):
+        self.select_sql = select_sql
+        self.key_columns = list(key_columns)
+        self.key_fields = list(key_fields)
+        self.key_types = list(key_types)
+        self.filters = dict(filters or {})
+        self.where = list(where)
+        self.count_sql = count_sql
+        self.descending = descending
+        self._compiled = {}
+
+    def _active(self, values):
+        values = values or {}
+        names = tuple(name for name in self.filters if values.get(name))
+        return names, [values[name] for name in names]
+
+    def _where_sql(self, names, extra=()):
+        clauses = self.where + [self.filters[name] for name in names] + list(extra)
+        return " WHERE " + " AND ".join(clauses) if clauses else ""
+
+    def _page_sql(self, names, mode):
+        key = ("page", names, mode)
+        sql = self._compiled.get(key)
+        if sql is None:
+            columns = ", ".join(self.key_columns)
+            placeholders = ", ".join("?" for _ in self.key_columns)
+            older, newer = ("<", ">") if self.descending else (">", "<")
+            extra = []
+            if mode == "after":
+                extra.append(f"({columns}) {older} ({placeholders})")
+            elif mode == "before":
+                extra.append(f"({columns}) {newer} ({placeholders})")
+
+            direction = "DESC" if self.descending != (mode == "before") else "ASC"
+            order_by = ", ".join(f"{col} {direction}" for col in self.key_columns)
+            sql = f"{self.select_sql}{self._where_sql(names, extra)} ORDER BY {order_by} LIMIT ?"
+            self._compiled[key] = sql
+        return sql
+
+    def page(self, conn, filters=None, after=None, before=None, limit=PAGE_SIZE):
+        """Fetch one page. ``after`` pages forward, ``before`` pages backward."""
+        names, params = self._active(filters)
+        after_key = decode_cursor(after, self.key_types)
+        before_key = decode_cursor(before, self.key_types)
+
+        if after_key is not None:
+            mode, params = "after", params + after_key
+        elif before_key is not None:
+            mode, params = "before", params + before_key
+        else:
+            mode = None
+
+        rows = conn.execute(self._page_sql(names, mode), params + [limit + 1]).fetchall()
+        more = len(rows) > limit
+        rows = rows[:limit]
+        if mode == "before":
+            rows.reverse()
+
+        if not rows:
+            return EMPTY_PAGE
+
+        has_next = more if mode != "before" else True
+        has_prev = (mode == "after") if mode != "before" else more
+        return Page(
+            rows=rows,
+            next_cursor=encode_cursor(rows[-1], self.key_fields) if has_next else None,
+            prev_cursor=encode_cursor(rows[0], self.key_fields) if has_prev else None
+        )
+
+    def count(self, conn, filters=None):
+        """Total rows matching ``filters`` (uses ``count_sql`` as the base)."""
+        names, params = self._active(filters)
+        key = ("count", names)
+        sql = self._compiled.get(key)
+        if sql is None:
+            sql = self._compiled[key] = self.count_sql + self._where_sql(names)
+        return conn.execute(sql, params).fetchone()[0]
+
+    def select(self, filters=None, extra=(), extra_params=(), after=None):
+        """Unpaged, filtered SQL in key order plus its parameters.
+
+        ``extra`` adds WHERE clauses (e.g. date ranges) whose values are
+        ``extra_params``; ``after`` starts past a cursor. Meant for
+        streaming every matching row.
+        """
+        names, params = self._active(filters)
+        extra, extra_params = list(extra), list(extra_params)
+        after_key = decode_cursor(after, self.key_types)
+        if after_key is not None:
+            columns = ", ".join(self.key_columns)
+            placeholders = ", ".join("?" for _ in self.key_columns)
+            extra.append(f"({columns}) {'<' if self.descending else '>'} ({placeholders})")
+            extra_params += after_key
+        direction = "DESC" if self.descending else "ASC"
+        order_by = ", ".join(f"{col} {direction}" for col in self.key_columns)
+        sql = f"{self.select_sql}{self._where_sql(names, extra)} ORDER BY {order_by}"
+        return sql, params + extra_params
+
@@ -0,0 +1,55 @@
+import io
+
+import matplotlib
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+
+# Every chart is built on its own Figure with an Agg canvas, never through
+# pyplot, so concurrent requests in threads or worker processes share no
+# global plotting state and never write to a common file.
+
+def render_png(fig, **savefig_kwargs):
+    """Render a Figure to PNG bytes in memory."""
+    FigureCanvasAgg(fig)
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", **savefig_kwargs)
+    return buffer.getvalue()
+
+
+def feature_graph_png(x, y, labels, means, y_min, y_max, background=None):
+    """Bar chart of mean ``y`` per ``x`` category (the /prediction feature graph)."""
+    fig = Figure(figsize=(10, 6))
+    ax = fig.add_subplot()
+    if background is not None:
+        ax.imshow(background, extent=[-0.5, len(labels) - 0.5, y_min * 0.9, y_max * 1.1],
+                  aspect='auto', alpha=0.2)
+
+    ax.bar(labels, means, color='green')
+    ax.tick_params(axis='x', labelrotation=45)
+    for label in ax.get_xticklabels():
+        label.set_horizontalalignment('right')
+    ax.set_xlabel(x)
+    ax.set_ylabel(y)
+    ax.set_title(f"{y} vs {x}")
+    fig.tight_layout()
+    return render_png(fig)
+
+
+def crop_counts_png(crops, counts):
+    """Horizontal bar chart of the most predicted crops (admin dashboard)."""
+    fig = Figure(figsize=(12, 6))
+    ax = fig.add_subplot()
+    colors = matplotlib.colormaps["Set3"](range(len(crops)))
+    ax.barh(crops, counts, color=colors)
+
+    # Add value labels on bars
+    for i, count in enumerate(counts):
+        ax.text(count, i, f' {count}', va='center', fontweight='bold')
+
+    ax.set_xlabel('Number of Predictions', fontsize=12, fontweight='bold')
+    ax.set_ylabel('Crop', fontsize=12, fontweight='bold')
+    ax.set_title('Most Predicted Crops (Top 10)', fontsize=14, fontweight='bold', pad=20)
+    ax.invert_yaxis()  # Show highest at top
+    fig.tight_layout()
+    return render_png(fig, dpi=100, bbox_inches='tight')
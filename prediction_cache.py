@@ -0,0 +1,238 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from db import get_db_connection
+from inference_engine import BoundedPrediction, CI_Z
+from metrics import metrics
+
+# ---------- PREDICTION CACHE ----------
+# Results are keyed by (model version, encoded feature row). The encoded row
+# is the normalized input: "100" and "100.0", or a category typed with the
+# same spelling, produce the same bytes and therefore the same key.
+
+PREDICTION_CACHE_SIZE = 4096
+SHARED_CACHE_MAX_ROWS = 100_000
+SHARED_CACHE_PRUNE_EVERY = 1000
+
+# SQLite limits the number of host parameters per statement
+_SQL_CHUNK = 500
+
+
+def _row_key(row):
+    return np.ascontiguousarray(row, dtype=np.float64).tobytes()
+
+
+def _shared_key(key):
+    """Fixed-size digest of a row key for the shared table."""
+    return hashlib.blake2b(key, digest_size=16).digest()
+
+
+class SQLiteCacheBackend:
+    """Prediction results shared between worker processes via SQLite.
+
+    Rows live in the ``prediction_cache`` table (migration 5). The table is
+    pruned to roughly ``max_rows`` newest entries every ``prune_every``
+    inserts. Database errors are reported and treated as cache misses.
+    """
+
+    def __init__(self, max_rows=SHARED_CACHE_MAX_ROWS, prune_every=SHARED_CACHE_PRUNE_EVERY):
+        self.max_rows = max_rows
+        self.prune_every = prune_every
+        self._inserts = 0
+        self._lock = threading.Lock()
+
+    def get_many(self, version, keys):
+        """Return ``{key: yield_value}`` for the keys present in the table."""
+        digests = {_shared_key(key): key for key in keys}
+        found = {}
+        try:
+            conn = get_db_connection()
+            items = list(digests)
+            for start in range(0, len(items), _SQL_CHUNK):
+                chunk = items[start:start + _SQL_CHUNK]
+                placeholders = ", ".join("?" for _ in chunk)
+                rows = conn.execute(
+                    f"SELECT feature_key, yield_value FROM prediction_cache "
+                    f"WHERE model_version = ? AND feature_key IN ({placeholders})",
+                    [version] + chunk
+                )
+                for digest, value in rows:
+                    found[digests[digest]] = value
+        except sqlite3.Error as e:
+            print(f"DEBUG: Shared prediction cache read failed: {e}")
+        return found
+
+    def put_many(self, version, items):
+        """Store ``(key, yield_value)`` pairs for ``version``."""
+        records = [(version, _shared_key(key), float(value)) for key, value in items]
+        if not records:
+            return
+        try:
+            conn = get_db_connection()
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO prediction_cache (model_version, feature_key, yield_value) VALUES (?, ?, ?)",
+                    records
+                )
+            with self._lock:
+                self._inserts += len(records)
+                prune = self._inserts >= self.prune_every
+                if prune:
+                    self._inserts = 0
+            if prune:
+                self.prune(conn)
+        except sqlite3.Error as e:
+            print(f"DEBUG: Shared prediction cache write failed: {e}")
+
+    def prune(self, conn=None):
+        """Keep only the ``max_rows`` most recently written entries."""
+        conn = conn or get_db_connection()
+        with conn:
+            conn.execute(
+                "DELETE FROM prediction_cache WHERE rowid <= (SELECT MAX(rowid) FROM prediction_cache) - ?",
+                (self.max_rows,)
+            )
+
+    def clear(self, keep_version=None):
+        """Drop every entry not produced by ``keep_version``."""
+        try:
+            conn = get_db_connection()
+            with conn:
+                if keep_version is None:
+                    conn.execute("DELETE FROM prediction_cache")
+                else:
+                    conn.execute("DELETE FROM prediction_cache WHERE model_version != ?", (keep_version,))
+        except sqlite3.Error as e:
+            print(f"DEBUG: Shared prediction cache clear failed: {e}")
+
+
+class PredictionCache:
+    """Bounded LRU of model outputs in front of the inference engine.
+
+    ``predict(bundle, matrix)`` answers every encoded row it has seen for
+    the bundle's model version from memory (then from the optional shared
+    ``backend``) and runs the inference engine once for the rest, within
+    an optional latency budget.
+    Register ``on_model_swapped`` with the model registry so a new model
+    version starts from an empty cache.
+    """
+
+    def __init__(self, max_entries=PREDICTION_CACHE_SIZE, backend=None):
+        self.max_entries = max_entries
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def predict(self, bundle, matrix, budget_ms=None, max_stderr_ratio=0.0):
+        """BoundedPrediction for each row of the encoded feature ``matrix``.
+
+        Misses are scored with ``engine.predict_bounded`` and only results
+        that used the whole forest are cached, so a cache hit is always the
+        full-forest answer. Rows answered from the shared backend have no
+        standard error (NaN).
+        """
+        matrix = np.atleast_2d(matrix)
+        version = bundle.version
+        n_trees = bundle.engine.n_trees
+        means = np.empty(len(matrix), dtype=np.float64)
+        stderrs = np.full(len(matrix), np.nan)
+        trees_used = np.full(len(matrix), n_trees)
+        start = time.perf_counter()
+
+        # Row indices per distinct key still to be answered
+        pending = OrderedDict()
+        with self._lock:
+            for i, row in enumerate(matrix):
+                key = _row_key(row)
+                entry = self._entries.get((version, key))
+                if entry is None:
+                    pending.setdefault(key, []).append(i)
+                else:
+                    self._entries.move_to_end((version, key))
+                    means[i], stderrs[i] = entry
+                    self.hits += 1
+
+        found = {}
+        if pending and self.backend is not None:
+            with metrics.stage("shared_cache"):
+                found = self.backend.get_many(version, list(pending))
+
+        computed = {}
+        missing = [key for key in pending if key not in found]
+        if missing:
+            rows = [pending[key][0] for key in missing]
+            bounded = bundle.engine.predict_bounded(matrix[rows], budget_ms=budget_ms,
+                                                    max_stderr_ratio=max_stderr_ratio)
+            computed = {
+                key: (mean, stderr, used)
+                for key, mean, stderr, used in zip(missing, bounded.mean.tolist(), bounded.stderr.tolist(),
+                                                   bounded.trees_used.tolist())
+            }
+            if self.backend is not None:
+                with metrics.stage("shared_cache"):
+                    self.backend.put_many(version, [(key, mean) for key, (mean, _, used) in computed.items()
+                                                    if used == n_trees])
+
+        with self._lock:
+            for key, indices in pending.items():
+                if key in found:
+                    means[indices] = found[key]
+                    self.shared_hits += len(indices)
+                    entry = (found[key], np.nan)
+                else:
+                    mean, stderr, used = computed[key]
+                    means[indices], stderrs[indices], trees_used[indices] = mean, stderr, used
+                    self.misses += 1
+                    self.hits += len(indices) - 1
+                    if used < n_trees:
+                        continue
+                    entry = (mean, stderr)
+                self._entries[(version, key)] = entry
+                self._entries.move_to_end((version, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+        return BoundedPrediction(
+            mean=means,
+            stderr=stderrs,
+            ci_low=means - CI_Z * stderrs,
+            ci_high=means + CI_Z * stderrs,
+            trees_used=trees_used,
+            n_trees=n_trees,
+            elapsed_ms=(time.perf_counter() - start) * 1000
+        )
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def on_model_swapped(self, bundle):
+        """Model registry listener: forget results of the previous version."""
+        self.clear()
+        if self.backend is not None:
+            self.backend.clear(keep_version=bundle.version)
+        print(f"DEBUG: Prediction cache cleared for model version {bundle.version}")
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round((self.hits + self.shared_hits) / lookups, 4) if lookups else None,
+                "shared_backend": self.backend is not None,
+            }
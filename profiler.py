@@ -0,0 +1,254 @@
+import cProfile
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+# ---------- REQUEST PROFILER ----------
+# Off unless an admin turns it on. When a request is selected (the next N
+# requests, a random fraction, or one admin request with ?profile=1) its
+# view runs under either
+#   * "sample":   a helper thread records the request thread's stack every
+#                 SAMPLE_INTERVAL seconds; saved as collapsed stacks
+#                 ("outer;inner count" lines) for flamegraph.pl/speedscope
+#   * "cprofile": cProfile on the request thread; saved as a .prof file
+#                 for pstats/snakeviz
+# Each capture is a data file plus a JSON sidecar in PROFILES_DIR; only the
+# newest MAX_PROFILES are kept. The sampler can only look while it holds the
+# GIL, so on CPU-bound code it sees roughly one stack per switch interval
+# (5 ms); requests of a few milliseconds are better profiled with cprofile.
+
+PROFILES_DIR = "profiles"
+MAX_PROFILES = 50
+MODES = ("sample", "cprofile")
+
+SAMPLE_INTERVAL = 0.002
+
+# Frames of this module are left out of sampled stacks
+_OWN_FILE = os.path.abspath(__file__)
+
+
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class _Sampler:
+    """Collects the stacks of one thread until stopped."""
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                if os.path.abspath(frame.f_code.co_filename) != _OWN_FILE:
+                    stack.append(_frame_label(frame.f_code).replace(";", ":"))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+
+class _Capture:
+    def __init__(self, mode, route, method, path):
+        self.id = uuid.uuid4().hex[:12]
+        self.mode = mode
+        self.route = route
+        self.method = method
+        self.path = path
+        self.created = time.time()
+        self.sampler = None
+        self.profile = None
+        self.start = time.perf_counter()
+
+
+class Profiler:
+    """Decides which requests to profile and stores the captures.
+
+    ``enable(count=N)`` profiles the next N requests, ``enable(fraction=f)``
+    a random share of requests until disabled; ``routes`` optionally limits
+    either to some endpoints.
+    """
+
+    def __init__(self, profiles_dir=PROFILES_DIR, max_profiles=MAX_PROFILES):
+        self.profiles_dir = profiles_dir
+        self.max_profiles = max_profiles
+        self._lock = threading.Lock()
+        self.mode = "sample"
+        self.remaining = 0
+        self.fraction = 0.0
+        self.routes = None
+
+    def enable(self, count=0, fraction=0.0, mode="sample", routes=None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiler mode: {mode}")
+        with self._lock:
+            self.remaining = max(0, int(count))
+            self.fraction = min(max(float(fraction), 0.0), 1.0)
+            self.mode = mode
+            self.routes = set(routes) if routes else None
+
+    def disable(self):
+        self.enable(count=0, fraction=0.0, mode=self.mode)
+
+    def settings(self):
+        return {"mode": self.mode, "remaining": self.remaining, "fraction": self.fraction,
+                "routes": sorted(self.routes) if self.routes else []}
+
+    def should_profile(self, route):
+        """True if this request is selected; counts it against ``remaining``."""
+        if not self.remaining and not self.fraction:
+            return False
+        with self._lock:
+            if self.routes is not None and route not in self.routes:
+                return False
+            if self.remaining:
+                self.remaining -= 1
+                return True
+            return random.random() < self.fraction
+
+    def start(self, route, method, path, mode=None):
+        """Begin profiling the current thread; returns a capture (or None if unavailable)."""
+        capture = _Capture(mode or self.mode, route, method, path)
+        if capture.mode == "cprofile":
+            capture.profile = cProfile.Profile()
+            try:
+                capture.profile.enable()
+            except ValueError:
+                # Another profiler is active on this interpreter
+                return None
+        else:
+            capture.sampler = _Sampler(threading.get_ident())
+            capture.sampler.start()
+        return capture
+
+    def finish(self, capture, status):
+        """Stop profiling and write the capture to the profiles directory."""
+        if capture.profile is not None:
+            capture.profile.disable()
+        else:
+            capture.sampler.stop()
+        duration_ms = (time.perf_counter() - capture.start) * 1000
+
+        os.makedirs(self.profiles_dir, exist_ok=True)
+        if capture.profile is not None:
+            data_file = f"{capture.id}.prof"
+            capture.profile.dump_stats(os.path.join(self.profiles_dir, data_file))
+            samples = None
+        else:
+            data_file = f"{capture.id}.collapsed"
+            with open(os.path.join(self.profiles_dir, data_file), "w") as f:
+                for stack, count in capture.sampler.stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+            samples = sum(capture.sampler.stacks.values())
+
+        meta = {
+            "id": capture.id,
+            "mode": capture.mode,
+            "route": capture.route,
+            "method": capture.method,
+            "path": capture.path,
+            "status": status,
+            "duration_ms": round(duration_ms, 3),
+            "samples": samples,
+            "created": capture.created,
+            "file": data_file,
+        }
+        with open(os.path.join(self.profiles_dir, f"{capture.id}.json"), "w") as f:
+            json.dump(meta, f)
+        print(f"DEBUG: Profiled {capture.method} {capture.path} ({duration_ms:.1f} ms) -> {data_file}")
+        self._rotate()
+        return meta
+
+    def _rotate(self):
+        entries = self.list()
+        for meta in sorted(entries, key=lambda m: m["created"])[:max(0, len(entries) - self.max_profiles)]:
+            for name in (meta["file"], f"{meta['id']}.json"):
+                try:
+                    os.remove(os.path.join(self.profiles_dir, name))
+                except FileNotFoundError:
+                    pass
+
+    def list(self):
+        """Metadata of every stored capture, slowest first."""
+        entries = []
+        try:
+            names = os.listdir(self.profiles_dir)
+        except FileNotFoundError:
+            return entries
+        for name in names:
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.profiles_dir, name)) as f:
+                    entries.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        entries.sort(key=lambda m: m["duration_ms"], reverse=True)
+        return entries
+
+    def get(self, capture_id):
+        """(metadata, absolute data file path) for a capture id, or None."""
+        if not capture_id.isalnum():
+            return None
+        try:
+            with open(os.path.join(self.profiles_dir, f"{capture_id}.json")) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        path = os.path.abspath(os.path.join(self.profiles_dir, meta["file"]))
+        return (meta, path) if os.path.exists(path) else None
+
+
+def collapse_pstats(path):
+    """Collapsed stacks approximated from a cProfile file.
+
+    cProfile keeps caller -> callee edges rather than whole stacks, so each
+    function's own time is attributed to its heaviest caller chain.
+    Good enough for a flame graph of where time goes; exact stacks need
+    sample mode.
+    """
+    import pstats
+
+    stats = pstats.Stats(path).stats
+    label = lambda func: f"{func[2]} ({os.path.basename(func[0])}:{func[1]})".replace(";", ":")
+    lines = []
+    for func, (_, _, own_time, _, callers) in stats.items():
+        if own_time <= 0:
+            continue
+        chain = [func]
+        seen = {func}
+        current = func
+        while True:
+            parents = stats.get(current, (0, 0, 0, 0, {}))[4]
+            if not parents:
+                break
+            parent = max(parents, key=lambda caller: parents[caller][3])
+            if parent in seen:
+                break
+            chain.append(parent)
+            seen.add(parent)
+            current = parent
+        stack = ";".join(label(f) for f in reversed(chain))
+        lines.append(f"{stack} {max(1, int(own_time * 1e6))}")
+    return "\n".join(lines) + "\n"
+
+
+# Shared instance used by the Flask hooks
+profiler = Profiler()
@@ -0,0 +1,201 @@
+import threading
+from collections import namedtuple
+
+from db import get_db_connection
+from pagination import KeysetQuery
+
+# ---------- REPOSITORY ----------
+# Schema capabilities are detected once (at startup or right after the
+# migrations run) and every admin / view_db query is compiled from them a
+# single time, so requests never run PRAGMA table_info or assemble SQL.
+
+SchemaCapabilities = namedtuple(
+    "SchemaCapabilities", ["version", "has_year", "has_timestamp", "has_summary_tables"]
+)
+
+
+def detect_capabilities(conn):
+    """Inspect the schema once and record optional columns and tables."""
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(predictions)")]
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    return SchemaCapabilities(
+        version=version,
+        has_year="year" in columns,
+        has_timestamp="timestamp" in columns,
+        has_summary_tables={"user_stats", "crop_prediction_counts"} <= tables
+    )
+
+
+class Repository:
+    """Prepared queries for predictions, sessions and user statistics."""
+
+    def __init__(self, capabilities):
+        self.capabilities = capabilities
+
+        year = "p.year" if capabilities.has_year else "NULL as year"
+        timestamp = "p.timestamp" if capabilities.has_timestamp else "NULL as timestamp"
+        if capabilities.has_timestamp:
+            prediction_key = (["p.timestamp", "p.id"], ["timestamp", "id"], [str, int])
+        else:
+            prediction_key = (["p.id"], ["id"], [int])
+
+        self.predictions = KeysetQuery(f"""
+            SELECT
+                p.id,
+                u.firstname || ' ' || u.lastname as user_name,
+                u.email,
+                {year},
+                p.crop, p.season, p.state, p.area, p.production,
+                p.annual_rainfall, p.fertilizer, p.pesticide, p.yield_value,
+                {timestamp}
+            FROM predictions p
+            LEFT JOIN users u ON p.user_id = u.id
+        """, *prediction_key,
+            filters={
+                "crop": "p.crop = ?",
+                "state": "p.state = ?",
+                "season": "p.season = ?",
+                "user": "p.user_id = (SELECT id FROM users WHERE email = ?)",
+            },
+            count_sql="SELECT COUNT(*) FROM predictions p")
+
+        self.sessions = KeysetQuery("""
+            SELECT
+                us.id,
+                u.firstname || ' ' || u.lastname as user_name,
+                u.email,
+                us.login_time,
+                us.logout_time,
+                CASE
+                    WHEN us.logout_time IS NULL THEN 'Active'
+                    ELSE 'Completed'
+                END as status
+            FROM user_sessions us
+            LEFT JOIN users u ON us.user_id = u.id
+        """, ["us.login_time", "us.id"], ["login_time", "id"], [str, int],
+            filters={"user": "us.user_id = (SELECT id FROM users WHERE email = ?)"},
+            count_sql="SELECT COUNT(*) FROM user_sessions us")
+
+        if capabilities.has_summary_tables:
+            # Trigger-maintained summary rows: O(users) reads, no history scan
+            stats_sql = """
+                SELECT
+                    u.id,
+                    u.firstname,
+                    u.lastname,
+                    u.email,
+                    COALESCE(s.visit_count, 0) as visit_count,
+                    s.last_login,
+                    COALESCE(s.prediction_count, 0) as prediction_count
+                FROM users u
+                LEFT JOIN user_stats s ON s.user_id = u.id
+            """
+            self.users_with_predictions = KeysetQuery("""
+                SELECT
+                    u.id,
+                    u.firstname,
+                    u.lastname,
+                    u.email,
+                    s.visit_count,
+                    s.last_login,
+                    s.prediction_count
+                FROM user_stats s
+                JOIN users u ON u.id = s.user_id
+            """, ["s.user_id"], ["id"], [int],
+                filters={"user": "u.email = ?"},
+                where=["s.prediction_count > 0"],
+                count_sql="SELECT COUNT(*) FROM user_stats s JOIN users u ON u.id = s.user_id",
+                descending=False)
+            self.crop_counts_sql = """
+                SELECT crop, prediction_count as count
+                FROM crop_prediction_counts
+                WHERE prediction_count > 0
+                ORDER BY prediction_count DESC
+                LIMIT ?
+            """
+            self.total_predictions_sql = "SELECT COALESCE(SUM(prediction_count), 0) FROM crop_prediction_counts"
+            self.total_sessions_sql = "SELECT COALESCE(SUM(visit_count), 0) FROM user_stats"
+        else:
+            # Older schema: per-user counts are correlated index lookups
+            # rather than a predictions x sessions join + COUNT(DISTINCT ...)
+            stats_sql = """
+                SELECT
+                    u.id,
+                    u.firstname,
+                    u.lastname,
+                    u.email,
+                    (SELECT COUNT(*) FROM user_sessions us WHERE us.user_id = u.id) as visit_count,
+                    (SELECT MAX(us.login_time) FROM user_sessions us WHERE us.user_id = u.id) as last_login,
+                    (SELECT COUNT(*) FROM predictions p WHERE p.user_id = u.id) as prediction_count
+                FROM users u
+            """
+            self.users_with_predictions = KeysetQuery(
+                stats_sql, ["u.id"], ["id"], [int],
+                filters={"user": "u.email = ?"},
+                where=["EXISTS (SELECT 1 FROM predictions p WHERE p.user_id = u.id)"],
+                count_sql="SELECT COUNT(*) FROM users u",
+                descending=False)
+            self.crop_counts_sql = """
+                SELECT crop, COUNT(*) as count
+                FROM predictions
+                GROUP BY crop
+                ORDER BY count DESC
+                LIMIT ?
+            """
+            self.total_predictions_sql = "SELECT COUNT(*) FROM predictions"
+            self.total_sessions_sql = "SELECT COUNT(*) FROM user_sessions"
+
+        self.user_stats = KeysetQuery(
+            stats_sql, ["u.id"], ["id"], [int],
+            filters={"user": "u.email = ?"},
+            count_sql="SELECT COUNT(*) FROM users u",
+            descending=False)
+
+        self.users = KeysetQuery(
+            "SELECT u.id, u.firstname, u.lastname, u.email FROM users u",
+            ["u.id"], ["id"], [int],
+            filters={"user": "u.email = ?"},
+            count_sql="SELECT COUNT(*) FROM users u",
+            descending=False)
+
+        self.has_predictions_sql = "SELECT EXISTS (SELECT 1 FROM predictions)"
+
+    def crop_counts(self, conn, limit=10):
+        return conn.execute(self.crop_counts_sql, (limit,)).fetchall()
+
+    def has_predictions(self, conn):
+        return bool(conn.execute(self.has_predictions_sql).fetchone()[0])
+
+    def count_predictions(self, conn, filters=None):
+        """Total predictions; unfiltered totals come from the summary table."""
+        if not any((filters or {}).values()):
+            return conn.execute(self.total_predictions_sql).fetchone()[0]
+        return self.predictions.count(conn, filters)
+
+    def count_sessions(self, conn, filters=None):
+        """Total sessions; unfiltered totals come from the summary table."""
+        if not any((filters or {}).values()):
+            return conn.execute(self.total_sessions_sql).fetchone()[0]
+        return self.sessions.count(conn, filters)
+
+
+_repository = None
+_repository_lock = threading.Lock()
+
+
+def refresh_repository(conn=None):
+    """Re-detect schema capabilities (e.g. after migrations) and rebuild queries."""
+    global _repository
+    conn = conn or get_db_connection()
+    with _repository_lock:
+        _repository = Repository(detect_capabilities(conn))
+    return _repository
+
+
+def get_repository():
+    """Shared Repository, built on first use."""
+    repository = _repository
+    if repository is None:
+        repository = refresh_repository()
+    return repository
@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+# ---------- COLUMNAR DATASET SNAPSHOT ----------
+# A typed copy of a CSV as one .npy file per column plus a manifest.json.
+# Categorical columns are dictionary encoded: the codes are stored as the
+# smallest integer type that fits and the categories live in the manifest.
+# Loading memory-maps the column files, so there is no text parsing at
+# startup. The manifest records the sha256 of the source CSV; a snapshot
+# whose checksum no longer matches is ignored and callers fall back to
+# parsing the CSV.
+
+MANIFEST_FILE = "manifest.json"
+SNAPSHOT_FORMAT = 1
+
+
+def file_sha256(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _code_dtype(n_categories):
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_categories < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def _save(path, array):
+    # Written under a temporary name, so readers never see a partial file
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, np.ascontiguousarray(array))
+    os.replace(tmp, path)
+
+
+def write_snapshot(df, source_path, snapshot_dir):
+    """Store ``df`` (parsed from ``source_path``) as a columnar snapshot."""
+    os.makedirs(snapshot_dir, exist_ok=True)
+    columns = []
+    for i, name in enumerate(df.columns):
+        series = df[name]
+        entry = {"name": name, "file": f"col{i:03d}.npy"}
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            categories = [str(c) for c in series.cat.categories]
+            codes = series.cat.codes.to_numpy().astype(_code_dtype(len(categories)))
+            entry.update(kind="category", categories=categories)
+            _save(os.path.join(snapshot_dir, entry["file"]), codes)
+        else:
+            values = series.to_numpy()
+            if values.dtype.kind not in "iuf":
+                raise ValueError(f"Column {name!r} has unsupported dtype {series.dtype}")
+            entry.update(kind="numeric")
+            _save(os.path.join(snapshot_dir, entry["file"]), values)
+        columns.append(entry)
+
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "source": os.path.basename(source_path),
+        "source_size": os.path.getsize(source_path),
+        "source_sha256": file_sha256(source_path),
+        "rows": len(df),
+        "columns": columns,
+    }
+    # The manifest goes last: it is what makes the new columns visible
+    tmp = os.path.join(snapshot_dir, MANIFEST_FILE + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp, os.path.join(snapshot_dir, MANIFEST_FILE))
+    return manifest
+
+
+def read_manifest(snapshot_dir):
+    try:
+        with open(os.path.join(snapshot_dir, MANIFEST_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def is_fresh(manifest, source_path):
+    """True if ``manifest`` was built from the current contents of ``source_path``."""
+    if manifest is None or manifest.get("format") != SNAPSHOT_FORMAT:
+        return False
+    try:
+        if os.path.getsize(source_path) != manifest["source_size"]:
+            return False
+        return file_sha256(source_path) == manifest["source_sha256"]
+    except (OSError, KeyError):
+        return False
+
+
+def read_snapshot(source_path, snapshot_dir, mmap_mode="r"):
+    """DataFrame from the snapshot of ``source_path``, or None if missing or stale."""
+    manifest = read_manifest(snapshot_dir)
+    if not is_fresh(manifest, source_path):
+        return None
+    data = {}
+    try:
+        for entry in manifest["columns"]:
+            values = np.load(os.path.join(snapshot_dir, entry["file"]), mmap_mode=mmap_mode)
+            if len(values) != manifest["rows"]:
+                return None
+            if entry["kind"] == "category":
+                data[entry["name"]] = pd.Categorical.from_codes(values, entry["categories"])
+            else:
+                data[entry["name"]] = values
+    except (OSError, ValueError, KeyError) as e:
+        print(f"DEBUG: Ignoring unreadable snapshot {snapshot_dir}: {e}")
+        return None
+    return pd.DataFrame(data)
+
+
+def main(argv=None):
+    # Imported here: dataset_store imports this module
+    from dataset_store import DATASET_PATH, SNAPSHOT_DIR, build_snapshot
+
+    args = sys.argv[1:] if argv is None else argv
+    source = args[0] if args else DATASET_PATH
+    snapshot_dir = args[1] if len(args) > 1 else SNAPSHOT_DIR
+    manifest = build_snapshot(source, snapshot_dir)
+    print(f"Wrote {manifest['rows']} rows x {len(manifest['columns'])} columns to {snapshot_dir}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
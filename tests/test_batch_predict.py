@@ -0,0 +1,24 @@
+import pytest
+from flask import Flask, request
+
+from batch_predict import BatchError, read_batch
+
+app = Flask(__name__)
+
+
+def read_json(payload):
+    with app.test_request_context(json=payload):
+        return read_batch(request)
+
+
+@pytest.mark.parametrize("payload", [[1, 2], ["a"], {"rows": [{"year": 2000}, None]}])
+def test_json_rows_must_be_objects(payload):
+    with pytest.raises(BatchError) as err:
+        read_json(payload)
+    assert err.value.errors
+
+
+def test_json_rows_of_objects_are_read():
+    frame, fmt = read_json({"rows": [{"Year": 2000, "crop": "Rice"}]})
+    assert fmt == "json"
+    assert list(frame.columns) == ["year", "crop"]
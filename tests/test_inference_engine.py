@@ -0,0 +1,38 @@
+import numpy as np
+
+from inference_engine import InferenceEngine, MIN_TREES
+
+
+def stump_engine(leaf_values):
+    """Engine of single-leaf trees, one per value, over one untransformed feature."""
+    n = len(leaf_values)
+    nodes = np.arange(n)
+    return InferenceEngine(
+        lambdas=[1.0], mean=None, scale=None,
+        feature=np.zeros(n), threshold=np.zeros(n),
+        left=nodes, right=nodes, value=leaf_values,
+        roots=nodes, max_depth=1
+    )
+
+
+def test_no_budget_scores_every_tree_when_first_trees_agree():
+    # The first MIN_TREES trees agree exactly (stderr 0); the rest do not
+    values = np.r_[np.full(MIN_TREES, 12.0), np.linspace(10.0, 14.0, 12)]
+    engine = stump_engine(values)
+    X = np.ones((3, 1))
+
+    bounded = engine.predict_bounded(X, budget_ms=None, max_stderr_ratio=0.0)
+
+    assert (bounded.trees_used == engine.n_trees).all()
+    np.testing.assert_array_equal(bounded.mean, engine.predict(X))
+    assert np.isfinite(bounded.stderr).all()
+
+
+def test_stderr_rule_still_stops_early_when_enabled():
+    values = np.r_[np.full(MIN_TREES, 12.0), np.linspace(10.0, 14.0, 12)]
+    engine = stump_engine(values)
+
+    bounded = engine.predict_bounded(np.ones((1, 1)), max_stderr_ratio=0.01)
+
+    assert bounded.trees_used[0] == MIN_TREES
+    assert bounded.mean[0] == 12.0
@@ -0,0 +1,30 @@
+from db import connect
+from migrations import run_migrations
+from repository import Repository, detect_capabilities
+
+
+def test_prediction_pages_include_null_timestamps(tmp_path):
+    conn = connect(str(tmp_path / "pages.db"))
+    run_migrations(conn, target=7)
+    conn.execute("INSERT INTO users (firstname, lastname, email, password) VALUES ('A', 'B', 'a@b.c', 'x')")
+    for i in range(7):
+        # Legacy rows without a timestamp, interleaved with stamped ones
+        timestamp = None if i % 2 else f"2024-01-0{i + 1} 10:00:00"
+        conn.execute("INSERT INTO predictions (user_id, crop, timestamp) VALUES (1, 'Rice', ?)", (timestamp,))
+    conn.commit()
+    run_migrations(conn)
+
+    query = Repository(detect_capabilities(conn)).predictions
+    seen, cursor = [], None
+    while True:
+        page = query.page(conn, after=cursor, limit=2)
+        seen += [row["id"] for row in page.rows]
+        cursor = page.next_cursor
+        if cursor is None:
+            break
+
+    assert sorted(seen) == list(range(1, 8))
+    assert len(seen) == len(set(seen))
+    # New rows inserted with an explicit NULL are stamped by the trigger
+    conn.execute("INSERT INTO predictions (user_id, crop, timestamp) VALUES (1, 'Rice', NULL)")
+    assert conn.execute("SELECT timestamp FROM predictions WHERE id = 8").fetchone()[0]
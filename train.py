@@ -0,0 +1,224 @@
+import argparse
+import datetime
+import json
+import os
+import sys
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import PowerTransformer
+
+from dataset_store import DATASET_PATH, SNAPSHOT_DIR, load_dataset
+from model_registry import MODEL_DIR, MODEL_FILE, TRANSFORMER_FILE, FEATURES_FILE, _artifact_version
+from outliers import IQR_COLUMNS, IQR_FACTOR, filter_outliers as iqr_filter_outliers
+from snapshot import file_sha256
+
+# ---------- TRAINING PIPELINE ----------
+# The modelling steps of Crop_Yield_Regression_Updated.ipynb without the
+# plotting cells: optional IQR outlier filter (outliers.py),
+# get_dummies(drop_first=True), 80/20 split, Yeo-Johnson PowerTransformer
+# fitted on the training rows, RandomForestRegressor. Writes the three joblib artifacts the app loads
+# plus a metadata JSON with metrics, timings and the dataset checksum.
+
+METADATA_FILE = "training_metadata.json"
+
+TARGET = "Yield"
+CATEGORICAL_FEATURES = ["Crop", "Season", "State"]
+
+# Columns left out of the model's inputs (as in the notebook's df1)
+DROP_COLUMNS = ["Crop_Year", "Pesticide"]
+
+TEST_SIZE = 0.2
+SPLIT_SEED = 42
+N_ESTIMATORS = 100
+
+
+def build_features(df, drop_columns=DROP_COLUMNS):
+    """(x, y) with one-hot categoricals; column order matches the notebook."""
+    df = df.drop(columns=[c for c in drop_columns if c in df.columns])
+    for column in CATEGORICAL_FEATURES:
+        # Categories filtered away must not become all-zero dummy columns
+        if isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].cat.remove_unused_categories()
+    df = pd.get_dummies(df, columns=CATEGORICAL_FEATURES, drop_first=True)
+    return df.drop(columns=[TARGET]), df[TARGET].to_numpy()
+
+
+def _regression_metrics(y_true, y_pred):
+    return {
+        "r2": float(r2_score(y_true, y_pred)),
+        "mae": float(mean_absolute_error(y_true, y_pred)),
+        "rmse": float(np.sqrt(mean_squared_error(y_true, y_pred))),
+    }
+
+
+def _dump(obj, path):
+    # Uncompressed so the registry can memory-map the arrays; renamed into
+    # place so a running app never reads a half-written file
+    tmp = path + ".tmp"
+    joblib.dump(obj, tmp)
+    os.replace(tmp, path)
+
+
+def prepare(data_path=DATASET_PATH, snapshot_dir=SNAPSHOT_DIR, filter_outliers=False, iqr_columns=IQR_COLUMNS,
+            iqr_factor=IQR_FACTOR, sequential_outliers=False, drop_columns=DROP_COLUMNS,
+            test_size=TEST_SIZE, split_seed=SPLIT_SEED):
+    """Load, filter, encode and split the dataset.
+
+    Returns ``(x_train, x_test, y_train, y_test, data)`` where ``data``
+    describes the input (checksum, row counts, outlier bounds).
+    """
+    df, source = load_dataset(data_path, snapshot_dir, mmap_mode=None)
+    rows_loaded = len(df)
+    bounds = {}
+    if filter_outliers:
+        df, bounds = iqr_filter_outliers(df, iqr_columns, iqr_factor, sequential=sequential_outliers)
+    x, y = build_features(df, drop_columns)
+    x_train, x_test, y_train, y_test = train_test_split(x, y, test_size=test_size, random_state=split_seed)
+    data = {
+        "path": os.path.basename(data_path),
+        "sha256": file_sha256(data_path),
+        "loaded_from": source,
+        "rows": rows_loaded,
+        "rows_after_filter": len(df),
+        "train_rows": len(x_train),
+        "test_rows": len(x_test),
+        "iqr_bounds": {c: [float(low), float(high)] for c, (low, high) in bounds.items()},
+    }
+    return x_train, x_test, y_train, y_test, data
+
+
+def train(data_path=DATASET_PATH, output_dir=MODEL_DIR, snapshot_dir=SNAPSHOT_DIR, filter_outliers=False,
+          iqr_columns=IQR_COLUMNS, iqr_factor=IQR_FACTOR, sequential_outliers=False,
+          drop_columns=DROP_COLUMNS, test_size=TEST_SIZE, split_seed=SPLIT_SEED, n_estimators=N_ESTIMATORS,
+          max_depth=None, min_samples_leaf=1, max_features=1.0, random_state=None, n_jobs=-1):
+    """Train the transformer and forest and write the artifacts; returns the metadata dict."""
+    timings = {}
+    started = time.perf_counter()
+
+    step = time.perf_counter()
+    x_train, x_test, y_train, y_test, data = prepare(
+        data_path, snapshot_dir, filter_outliers, iqr_columns, iqr_factor, sequential_outliers,
+        drop_columns, test_size, split_seed
+    )
+    timings["prepare"] = time.perf_counter() - step
+
+    step = time.perf_counter()
+    pt = PowerTransformer(method="yeo-johnson")
+    x_train_transformed = pt.fit_transform(x_train)
+    x_test_transformed = pt.transform(x_test)
+    timings["transform"] = time.perf_counter() - step
+
+    step = time.perf_counter()
+    model = RandomForestRegressor(n_estimators=n_estimators, max_depth=max_depth,
+                                  min_samples_leaf=min_samples_leaf, max_features=max_features,
+                                  random_state=random_state, n_jobs=n_jobs)
+    model.fit(x_train_transformed, y_train)
+    timings["fit"] = time.perf_counter() - step
+
+    step = time.perf_counter()
+    metrics = {
+        "train": _regression_metrics(y_train, model.predict(x_train_transformed)),
+        "test": _regression_metrics(y_test, model.predict(x_test_transformed)),
+    }
+    timings["evaluate"] = time.perf_counter() - step
+
+    step = time.perf_counter()
+    os.makedirs(output_dir, exist_ok=True)
+    paths = [os.path.join(output_dir, name) for name in (MODEL_FILE, TRANSFORMER_FILE, FEATURES_FILE)]
+    _dump(model, paths[0])
+    _dump(pt, paths[1])
+    _dump(list(x_train.columns), paths[2])
+    timings["save"] = time.perf_counter() - step
+    timings["total"] = time.perf_counter() - started
+
+    metadata = {
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "model_version": _artifact_version(paths),
+        "data": data,
+        "features": x_train.shape[1],
+        "params": {
+            "filter_outliers": filter_outliers,
+            "iqr_columns": list(iqr_columns),
+            "iqr_factor": iqr_factor,
+            "sequential_outliers": sequential_outliers,
+            "drop_columns": list(drop_columns),
+            "test_size": test_size,
+            "split_seed": split_seed,
+            "n_estimators": n_estimators,
+            "max_depth": max_depth,
+            "min_samples_leaf": min_samples_leaf,
+            "max_features": max_features,
+            "random_state": random_state,
+            "n_jobs": n_jobs,
+        },
+        "metrics": metrics,
+        "timings_seconds": {name: round(seconds, 4) for name, seconds in timings.items()},
+        "artifact_bytes": {os.path.basename(p): os.path.getsize(p) for p in paths},
+        "versions": {"python": sys.version.split()[0], "sklearn": sklearn.__version__,
+                     "numpy": np.__version__, "pandas": pd.__version__},
+    }
+    with open(os.path.join(output_dir, METADATA_FILE), "w") as f:
+        json.dump(metadata, f, indent=2)
+    return metadata
+
+
+def max_features_arg(value):
+    """argparse type for max_features: 'sqrt', 'log2' or a number."""
+    if value in ("sqrt", "log2"):
+        return value
+    number = float(value)
+    return int(number) if number > 1 else number
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Train the crop yield model without the notebook.")
+    parser.add_argument("--data", default=DATASET_PATH, help="training CSV")
+    parser.add_argument("--output-dir", default=MODEL_DIR, help="where to write the joblib artifacts")
+    parser.add_argument("--filter-outliers", action="store_true",
+                        help="drop IQR outliers first (the shipped model was trained without)")
+    parser.add_argument("--iqr-columns", nargs="+", default=IQR_COLUMNS)
+    parser.add_argument("--iqr-factor", type=float, default=IQR_FACTOR)
+    parser.add_argument("--sequential-outliers", action="store_true",
+                        help="notebook semantics: quartiles of each column after filtering the previous ones")
+    parser.add_argument("--drop-columns", nargs="*", default=DROP_COLUMNS)
+    parser.add_argument("--test-size", type=float, default=TEST_SIZE)
+    parser.add_argument("--split-seed", type=int, default=SPLIT_SEED)
+    parser.add_argument("--n-estimators", type=int, default=N_ESTIMATORS)
+    parser.add_argument("--max-depth", type=int)
+    parser.add_argument("--min-samples-leaf", type=int, default=1)
+    parser.add_argument("--max-features", type=max_features_arg, default=1.0,
+                        help="fraction of features per split, or sqrt/log2")
+    parser.add_argument("--random-state", type=int, help="forest seed (unset, as in the notebook)")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="forest fitting processes (-1 = all cores)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    metadata = train(
+        data_path=args.data, output_dir=args.output_dir, filter_outliers=args.filter_outliers,
+        iqr_columns=args.iqr_columns, iqr_factor=args.iqr_factor,
+        sequential_outliers=args.sequential_outliers, drop_columns=args.drop_columns, test_size=args.test_size,
+        split_seed=args.split_seed, n_estimators=args.n_estimators, max_depth=args.max_depth,
+        min_samples_leaf=args.min_samples_leaf, max_features=args.max_features,
+        random_state=args.random_state, n_jobs=args.n_jobs
+    )
+    data, metrics, timings = metadata["data"], metadata["metrics"], metadata["timings_seconds"]
+    print(f"Trained on {data['train_rows']} rows ({data['rows_after_filter']} of {data['rows']} kept), "
+          f"{metadata['features']} features")
+    print(f"Train R2: {metrics['train']['r2']:.4f}  Test R2: {metrics['test']['r2']:.4f}  "
+          f"Test RMSE: {metrics['test']['rmse']:.4f}")
+    print(f"Fit {timings['fit']:.2f}s, total {timings['total']:.2f}s")
+    print(f"Wrote model version {metadata['model_version']} to {args.output_dir}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+import argparse
+import itertools
+import json
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import joblib
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import r2_score
+from sklearn.preprocessing import PowerTransformer
+
+from inference_engine import InferenceEngine
+from train import DATASET_PATH, SPLIT_SEED, TEST_SIZE, max_features_arg, prepare
+
+# ---------- HYPERPARAMETER SEARCH ----------
+# Preprocessing (get_dummies + PowerTransformer) runs once; the transformed
+# train/test matrices are written to .npy files that every worker process
+# memory-maps, so candidates share one copy of the data through the page
+# cache. X is stored as float32 because that is what sklearn's trees
+# convert it to, so fit() uses the mapped array without a private copy.
+
+GRID = {
+    "n_estimators": [50, 100, 200],
+    "max_depth": [None, 20],
+    "min_samples_leaf": [1, 3],
+    "max_features": [1.0, 0.5],
+}
+
+# Single-row predictions timed per candidate
+LATENCY_REPEAT = 50
+
+TRANSFORMER_FILE = "power_transformer.joblib"
+
+
+def prepare_matrices(work_dir, **prepare_args):
+    """Fit the transformer once and write X/y train/test arrays to ``work_dir``."""
+    x_train, x_test, y_train, y_test, data = prepare(**prepare_args)
+    pt = PowerTransformer(method="yeo-johnson")
+    arrays = {
+        "x_train": pt.fit_transform(x_train).astype(np.float32),
+        "x_test": pt.transform(x_test).astype(np.float32),
+        "y_train": np.asarray(y_train, dtype=np.float64),
+        "y_test": np.asarray(y_test, dtype=np.float64),
+    }
+    for name, array in arrays.items():
+        np.save(os.path.join(work_dir, f"{name}.npy"), np.ascontiguousarray(array))
+    joblib.dump(pt, os.path.join(work_dir, TRANSFORMER_FILE))
+    return data, x_train.shape[1]
+
+
+def _load(work_dir, name):
+    return np.load(os.path.join(work_dir, f"{name}.npy"), mmap_mode="r")
+
+
+def _median_ms(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return float(np.median(samples) * 1000)
+
+
+def evaluate(params, work_dir, random_state=0, n_jobs=1, latency_repeat=LATENCY_REPEAT):
+    """Fit one candidate on the shared matrices and measure it (runs in a worker)."""
+    x_train, x_test = _load(work_dir, "x_train"), _load(work_dir, "x_test")
+    y_train, y_test = _load(work_dir, "y_train"), _load(work_dir, "y_test")
+
+    model = RandomForestRegressor(random_state=random_state, n_jobs=n_jobs, **params)
+    start = time.perf_counter()
+    model.fit(x_train, y_train)
+    fit_seconds = time.perf_counter() - start
+
+    engine = InferenceEngine.compile(joblib.load(os.path.join(work_dir, TRANSFORMER_FILE)), model)
+    row = np.array(x_test[:1])
+    return {
+        "params": params,
+        "train_r2": float(r2_score(y_train, model.predict(x_train))),
+        "test_r2": float(r2_score(y_test, model.predict(x_test))),
+        "fit_seconds": fit_seconds,
+        "model_bytes": len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)),
+        "nodes": int(sum(tree.tree_.node_count for tree in model.estimators_)),
+        "sklearn_row_ms": _median_ms(lambda: model.predict(row), latency_repeat),
+        "engine_row_ms": _median_ms(lambda: engine.predict_transformed(row), latency_repeat),
+    }
+
+
+def candidates(grid):
+    names = list(grid)
+    for values in itertools.product(*(grid[name] for name in names)):
+        yield dict(zip(names, values))
+
+
+def pareto_front(results):
+    """Indices of results no other result beats on both test R² and engine latency."""
+    front = set()
+    for i, r in enumerate(results):
+        dominated = any(
+            o["test_r2"] >= r["test_r2"] and o["engine_row_ms"] <= r["engine_row_ms"]
+            and (o["test_r2"] > r["test_r2"] or o["engine_row_ms"] < r["engine_row_ms"])
+            for o in results
+        )
+        if not dominated:
+            front.add(i)
+    return front
+
+
+def _depth_arg(value):
+    return None if value.lower() == "none" else int(value)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Grid-search RandomForestRegressor settings in parallel.")
+    parser.add_argument("--data", default=DATASET_PATH)
+    parser.add_argument("--filter-outliers", action="store_true")
+    parser.add_argument("--test-size", type=float, default=TEST_SIZE)
+    parser.add_argument("--split-seed", type=int, default=SPLIT_SEED)
+    parser.add_argument("--n-estimators", type=int, nargs="+", default=GRID["n_estimators"])
+    parser.add_argument("--max-depth", type=_depth_arg, nargs="+", default=GRID["max_depth"],
+                        help="depths to try; 'none' for unlimited")
+    parser.add_argument("--min-samples-leaf", type=int, nargs="+", default=GRID["min_samples_leaf"])
+    parser.add_argument("--max-features", type=max_features_arg, nargs="+", default=GRID["max_features"])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="candidates fitted at once")
+    parser.add_argument("--n-jobs", type=int, default=1, help="threads per candidate fit")
+    parser.add_argument("--random-state", type=int, default=0)
+    parser.add_argument("--latency-repeat", type=int, default=LATENCY_REPEAT)
+    parser.add_argument("--work-dir", help="where to keep the shared matrices (default: a temp dir)")
+    parser.add_argument("--json", help="also write all results to this file")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    grid = {
+        "n_estimators": args.n_estimators,
+        "max_depth": args.max_depth,
+        "min_samples_leaf": args.min_samples_leaf,
+        "max_features": args.max_features,
+    }
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="tune_")
+    os.makedirs(work_dir, exist_ok=True)
+    try:
+        start = time.perf_counter()
+        data, n_features = prepare_matrices(
+            work_dir, data_path=args.data, filter_outliers=args.filter_outliers,
+            test_size=args.test_size, split_seed=args.split_seed
+        )
+        print(f"Prepared {data['train_rows']} x {n_features} training matrix in "
+              f"{time.perf_counter() - start:.2f}s ({work_dir})")
+
+        configs = list(candidates(grid))
+        print(f"Fitting {len(configs)} candidates on {args.workers} worker(s)")
+        results = []
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            futures = [pool.submit(evaluate, params, work_dir, args.random_state, args.n_jobs,
+                                   args.latency_repeat) for params in configs]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                print(f"  done {len(results)}/{len(configs)}: {result['params']} "
+                      f"test R2 {result['test_r2']:.4f}")
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    results.sort(key=lambda r: r["test_r2"], reverse=True)
+    front = pareto_front(results)
+    print(f"\n{'':1} {'trees':>5} {'depth':>5} {'leaf':>4} {'feat':>5} {'test R2':>8} {'train R2':>8} "
+          f"{'fit s':>7} {'size MB':>8} {'sklearn ms':>10} {'engine ms':>9}")
+    for i, r in enumerate(results):
+        p = r["params"]
+        print(f"{'*' if i in front else '':1} {p['n_estimators']:>5} {str(p['max_depth']):>5} "
+              f"{p['min_samples_leaf']:>4} {str(p['max_features']):>5} {r['test_r2']:8.4f} {r['train_r2']:8.4f} "
+              f"{r['fit_seconds']:7.2f} {r['model_bytes'] / 1e6:8.1f} {r['sklearn_row_ms']:10.3f} "
+              f"{r['engine_row_ms']:9.3f}")
+    print("* = no other candidate is both more accurate and faster per row")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"data": data, "grid": grid, "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
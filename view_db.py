@@ -1,156 +1,187 @@
+import argparse
+import csv
+import json
 import sqlite3
+import sys
 from tabulate import tabulate  # Optional: to display data nicely in table format
 
-# ---------------------------
-# Function to view users
-# ---------------------------
-def view_users():
-    conn = sqlite3.connect("database.db")
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    
-    c.execute("SELECT id, firstname, lastname, email FROM users")
-    users = c.fetchall()
-    
-    if users:
-        print("\n===== Users Table =====\n")
-        print(tabulate([tuple(u) for u in users], headers=users[0].keys(), tablefmt="grid"))
-    else:
-        print("No users found in the database.")
-    
-    conn.close()
+from db import get_db_connection
+from exporter import (EXPORT_DATASETS, EXPORT_FORMATS, EXPORT_CHUNK_ROWS, ExportError,
+                      filtered_query, iter_chunks, write_export)
+from pagination import encode_cursor
+from repository import get_repository
+
+# Rows per rendered table block; large results print block by block
+PAGE_ROWS = 100
+
+# View -> (repository query attribute, date column for from/to, title)
+VIEWS = {
+    "users": ("users", None, "Users Table"),
+    "stats": ("user_stats", None, "Users with Statistics"),
+    "predictions": ("predictions", "p.timestamp", "Predictions Table"),
+    "sessions": ("sessions", "us.login_time", "User Sessions Table"),
+}
+
+WHERE_KEYS = ("crop", "state", "season", "user", "from", "to")
 
 # ---------------------------
-# Helper function to check if column exists
+# Query building
 # ---------------------------
-def column_exists(cursor, table_name, column_name):
-    """Check if a column exists in a table"""
-    cursor.execute(f"PRAGMA table_info({table_name})")
-    columns = [row[1] for row in cursor.fetchall()]
-    return column_name in columns
+def parse_where(items):
+    """Turn ['crop=Rice', 'from=2024-01-01'] into a dict, validating keys."""
+    where = {}
+    for item in items or ():
+        key, sep, value = item.partition("=")
+        key = key.strip().lower()
+        if not sep or key not in WHERE_KEYS:
+            raise ExportError(f"Invalid --where '{item}'. Use KEY=VALUE with KEY in {', '.join(WHERE_KEYS)}.")
+        where[key] = value.strip().lower() if key == "user" else value.strip()
+    return where
+
+
+def view_query(view, where=None, after=None):
+    """(query, sql, params) for a view with --where filters and an optional cursor."""
+    repo = get_repository()
+    attribute, date_column, _ = VIEWS[view]
+    if view == "predictions" and not repo.capabilities.has_timestamp:
+        date_column = None
+    query = getattr(repo, attribute)
+
+    where = dict(where or {})
+    date_from, date_to = where.pop("from", None), where.pop("to", None)
+    unsupported = [key for key in where if key not in query.filters]
+    if unsupported:
+        raise ExportError(f"{view} cannot be filtered by {', '.join(unsupported)}.")
+
+    sql, params = filtered_query(query, date_column, where, date_from, date_to, after=after)
+    return query, sql, params
+
+
+def count_rows(view, where=None, after=None):
+    """Matching row count; unfiltered totals come from the summary tables."""
+    repo = get_repository()
+    conn = get_db_connection()
+    if not where and not after and view in ("predictions", "sessions"):
+        return repo.count_predictions(conn) if view == "predictions" else repo.count_sessions(conn)
+    _, sql, params = view_query(view, where, after)
+    return conn.execute(f"SELECT COUNT(*) FROM ({sql})", params).fetchone()[0]
 
 # ---------------------------
-# Function to view predictions
+# Incremental output
 # ---------------------------
-def view_predictions():
-    conn = sqlite3.connect("database.db")
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    
-    # Check which columns exist
-    has_year = column_exists(c, "predictions", "year")
-    has_timestamp = column_exists(c, "predictions", "timestamp")
-    
-    # Build query based on available columns
-    select_fields = ["p.id", "u.email"]
-    
-    if has_year:
-        select_fields.append("p.year")
-    else:
-        print("Note: Year column not found in database.")
-    
-    select_fields.extend([
-        "p.crop", "p.season", "p.state", "p.area", "p.production",
-        "p.annual_rainfall", "p.fertilizer", "p.pesticide", "p.yield_value"
-    ])
-    
-    if has_timestamp:
-        select_fields.append("p.timestamp")
-    else:
-        print("Note: Timestamp column not found in database.")
-    
-    # Build the query
-    query = f"""
-    SELECT {', '.join(select_fields)}
-    FROM predictions p
-    JOIN users u ON p.user_id = u.id
-    """
-    
-    # Add ORDER BY only if timestamp exists
-    if has_timestamp:
-        query += "ORDER BY p.timestamp DESC"
-    else:
-        query += "ORDER BY p.id DESC"
-    
+def _limited(chunks, limit):
+    """Cut a stream of (columns, rows) blocks off after ``limit`` rows."""
+    remaining = limit
+    for columns, rows in chunks:
+        if remaining is not None:
+            rows = rows[:remaining]
+            remaining -= len(rows)
+        yield columns, rows
+        if remaining == 0:
+            return
+
+
+def render(chunks, fmt, out):
+    """Write row blocks as table/jsonl/csv as they arrive; returns (count, last row)."""
+    count = 0
+    last = None
+    writer = csv.writer(out) if fmt == "csv" else None
+    for columns, rows in chunks:
+        if not rows:
+            continue
+        if fmt == "table":
+            out.write(tabulate([tuple(r) for r in rows], headers=columns, tablefmt="grid") + "\n")
+        elif fmt == "jsonl":
+            out.write("".join(json.dumps(dict(zip(columns, r))) + "\n" for r in rows))
+        else:
+            if count == 0:
+                writer.writerow(columns)
+            writer.writerows(rows)
+        out.flush()
+        count += len(rows)
+        last = rows[-1]
+    return count, last
+
+
+def run_view(view, limit=None, offset=0, after=None, where=None, fmt="table",
+             count_only=False, page_rows=PAGE_ROWS, out=sys.stdout):
+    """Print (or count) the rows of a view. Returns the next cursor, if any."""
+    if count_only:
+        out.write(f"{count_rows(view, where, after)}\n")
+        return None
+
+    query, sql, params = view_query(view, where, after)
+    if offset:
+        sql, params = f"{sql} LIMIT -1 OFFSET ?", params + [offset]
+
+    if fmt == "table":
+        repo = get_repository()
+        # Optional columns were detected once when the repository was built
+        if view == "predictions" and not repo.capabilities.has_year:
+            print("Note: Year column not found in database.")
+        if view == "predictions" and not repo.capabilities.has_timestamp:
+            print("Note: Timestamp column not found in database.")
+        print(f"\n===== {VIEWS[view][2]} =====\n")
+
+    chunk_rows = page_rows if fmt == "table" else EXPORT_CHUNK_ROWS
+    if limit is not None:
+        chunk_rows = max(1, min(chunk_rows, limit))
     try:
-        c.execute(query)
-        predictions = c.fetchall()
+        count, last = render(_limited(iter_chunks(sql, params, chunk_rows), limit), fmt, out)
     except sqlite3.OperationalError as e:
-        print(f"Error querying predictions: {e}")
-        predictions = []
-    
-    if predictions:
-        print("\n===== Predictions Table =====\n")
-        print(tabulate([tuple(p) for p in predictions], headers=predictions[0].keys(), tablefmt="grid"))
-    else:
-        print("No predictions found in the database.")
-    
-    conn.close()
+        print(f"Error querying {view}: {e}", file=sys.stderr)
+        return None
+
+    if count == 0 and fmt == "table":
+        print(f"No {view} found in the database.")
+    if limit is not None and count == limit and last is not None:
+        cursor = encode_cursor(last, query.key_fields)
+        print(f"Next cursor: {cursor}", file=sys.stderr)
+        return cursor
+    return None
 
 # ---------------------------
-# Function to view user sessions
+# Menu views (whole table, rendered page by page)
 # ---------------------------
+def view_users():
+    run_view("users")
+
+
+def view_predictions():
+    run_view("predictions")
+
+
 def view_sessions():
-    conn = sqlite3.connect("database.db")
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    
-    query = """
-    SELECT us.id, u.firstname || ' ' || u.lastname as user_name, u.email, 
-           us.login_time, us.logout_time,
-           CASE WHEN us.logout_time IS NULL THEN 'Active' ELSE 'Completed' END as status
-    FROM user_sessions us
-    JOIN users u ON us.user_id = u.id
-    ORDER BY us.login_time DESC
-    """
-    c.execute(query)
-    sessions = c.fetchall()
-    
-    if sessions:
-        print("\n===== User Sessions Table =====\n")
-        print(tabulate([tuple(s) for s in sessions], headers=sessions[0].keys(), tablefmt="grid"))
-    else:
-        print("No sessions found in the database.")
-    
-    conn.close()
+    run_view("sessions")
+
+
+def view_users_with_stats():
+    run_view("stats")
 
 # ---------------------------
-# Function to view users with statistics
+# Function to export a table (streamed, constant memory)
 # ---------------------------
-def view_users_with_stats():
-    conn = sqlite3.connect("database.db")
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    
-    query = """
-    SELECT 
-        u.id,
-        u.firstname || ' ' || u.lastname as name,
-        u.email,
-        COUNT(DISTINCT us.id) as visit_count,
-        COUNT(DISTINCT p.id) as prediction_count,
-        MAX(us.login_time) as last_login
-    FROM users u
-    LEFT JOIN user_sessions us ON u.id = us.user_id
-    LEFT JOIN predictions p ON u.id = p.user_id
-    GROUP BY u.id, u.firstname, u.lastname, u.email
-    ORDER BY u.id
-    """
-    c.execute(query)
-    users = c.fetchall()
-    
-    if users:
-        print("\n===== Users with Statistics =====\n")
-        print(tabulate([tuple(u) for u in users], headers=users[0].keys(), tablefmt="grid"))
-    else:
-        print("No users found in the database.")
-    
-    conn.close()
+def export_table(args):
+    filters = {"crop": args.crop, "state": args.state, "season": args.season,
+               "user": args.user.lower() if args.user else None}
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        written = write_export(out, get_repository(), args.dataset, args.format, filters,
+                               args.date_from, args.date_to, chunk_rows=args.chunk_rows)
+    except ExportError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    finally:
+        if args.output:
+            out.close()
+    if args.output:
+        print(f"Exported {args.dataset} to {args.output} ({written} bytes)", file=sys.stderr)
+    return 0
 
 # ---------------------------
-# Main Function
+# Interactive menu
 # ---------------------------
-def main():
+def interactive_menu():
     while True:
         print("\n===== DATABASE VIEWER =====")
         print("1. View Users")
@@ -159,7 +190,7 @@ def main():
         print("4. View User Sessions")
         print("5. Exit")
         choice = input("Enter your choice (1/2/3/4/5): ").strip()
-        
+
         if choice == "1":
             view_users()
         elif choice == "2":
@@ -174,5 +205,59 @@ def main():
         else:
             print("Invalid choice. Please select 1, 2, 3, 4, or 5.")
 
+# ---------------------------
+# Main Function
+# ---------------------------
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="View or export the crop prediction database. Without a command, opens the menu.")
+    commands = parser.add_subparsers(dest="command")
+
+    for view, (_, _, title) in VIEWS.items():
+        command = commands.add_parser(view, help=f"print the {title.lower()}")
+        command.add_argument("--limit", type=int, help="print at most this many rows")
+        command.add_argument("--offset", type=int, default=0, help="skip this many rows first")
+        command.add_argument("--after", help="continue after a cursor printed by a previous --limit run")
+        command.add_argument("--where", action="append", metavar="KEY=VALUE",
+                             help=f"filter, repeatable; KEY is one of {', '.join(WHERE_KEYS)} "
+                                  "(from/to are inclusive YYYY-MM-DD dates)")
+        command.add_argument("--format", choices=["table", "jsonl", "csv"], default="table")
+        command.add_argument("--count-only", action="store_true", help="print the number of matching rows")
+        command.add_argument("--page-rows", type=int, default=PAGE_ROWS,
+                             help="rows per table block in table format")
+
+    export = commands.add_parser("export", help="stream a table to CSV or Parquet")
+    export.add_argument("dataset", choices=list(EXPORT_DATASETS))
+    export.add_argument("--format", choices=list(EXPORT_FORMATS), default="csv")
+    export.add_argument("-o", "--output", help="output file (default: stdout)")
+    export.add_argument("--crop")
+    export.add_argument("--state")
+    export.add_argument("--season")
+    export.add_argument("--user", help="user email")
+    export.add_argument("--from", dest="date_from", help="first date, YYYY-MM-DD (inclusive)")
+    export.add_argument("--to", dest="date_to", help="last date, YYYY-MM-DD (inclusive)")
+    export.add_argument("--chunk-rows", type=int, default=EXPORT_CHUNK_ROWS)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command == "export":
+        return export_table(args)
+    if args.command in VIEWS:
+        try:
+            run_view(args.command, limit=args.limit, offset=args.offset, after=args.after,
+                     where=parse_where(args.where), fmt=args.format, count_only=args.count_only,
+                     page_rows=args.page_rows)
+        except ExportError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 2
+        except BrokenPipeError:
+            # e.g. piped into head
+            sys.stderr.close()
+        return 0
+    interactive_menu()
+    return 0
+
 if __name__ == "__main__":
-    main()
+    sys.exit(main())